@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import os
+import re
 
 from sqlalchemy import pool
 from sqlalchemy.ext.asyncio import async_engine_from_config
@@ -12,6 +13,15 @@ from app.models import Base
 config = context.config
 target_metadata = Base.metadata
 
+# Monthly utterance partitions are managed by `app.partitions`, not the models.
+_UTTERANCE_PARTITION = re.compile(r"^utterances_(p\d{4}_\d{2}|default)$")
+
+
+def _include_name(name, type_, parent_names) -> bool:
+    if type_ == "table":
+        return not _UTTERANCE_PARTITION.match(name or "")
+    return True
+
 
 def _get_database_url() -> str:
     url = os.getenv("DATABASE_URL")
@@ -27,6 +37,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         compare_type=True,
+        include_name=_include_name,
     )
 
     with context.begin_transaction():
@@ -38,6 +49,7 @@ def do_run_migrations(connection) -> None:
         connection=connection,
         target_metadata=target_metadata,
         compare_type=True,
+        include_name=_include_name,
     )
 
     with context.begin_transaction():
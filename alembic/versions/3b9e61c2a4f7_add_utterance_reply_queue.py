@@ -0,0 +1,37 @@
+"""add_utterance_reply_queue
+
+Revision ID: 3b9e61c2a4f7
+Revises: d24f6d70fabd
+Create Date: 2026-10-17 09:12:40.118204
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = '3b9e61c2a4f7'
+down_revision = 'd24f6d70fabd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'utterances',
+        sa.Column(
+            'attempts',
+            sa.Integer(),
+            nullable=False,
+            server_default=sa.text('0'),
+        ),
+    )
+    op.add_column(
+        'utterances',
+        sa.Column('available_at', sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('utterances', 'available_at')
+    op.drop_column('utterances', 'attempts')
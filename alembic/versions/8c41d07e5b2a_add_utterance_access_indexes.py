@@ -0,0 +1,61 @@
+"""add_utterance_access_indexes
+
+Revision ID: 8c41d07e5b2a
+Revises: 3b9e61c2a4f7
+Create Date: 2026-10-17 10:41:08.552930
+
+Indexes are built CONCURRENTLY so the migration can run against a live
+database. CONCURRENTLY cannot run inside a transaction, hence the autocommit
+block. A build that fails part-way leaves an INVALID index behind; drop it
+and re-run the migration.
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = '8c41d07e5b2a'
+down_revision = '3b9e61c2a4f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_utterances_conversation_timestamp',
+            'utterances',
+            ['conversation_id', 'timestamp'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_utterances_speaker_timestamp',
+            'utterances',
+            ['speaker_id', 'timestamp'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_utterances_reply_to_id',
+            'utterances',
+            ['reply_to_id'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_utterances_pending',
+            'utterances',
+            ['status', 'timestamp'],
+            postgresql_where=sa.text("status IN ('queued', 'failed')"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in (
+            'ix_utterances_pending',
+            'ix_utterances_reply_to_id',
+            'ix_utterances_speaker_timestamp',
+            'ix_utterances_conversation_timestamp',
+        ):
+            op.drop_index(name, table_name='utterances', postgresql_concurrently=True)
@@ -0,0 +1,130 @@
+"""partition_utterances_by_month
+
+Revision ID: a7d3c9e4f210
+Revises: e5a0f3b19c68
+Create Date: 2026-10-17 13:05:17.640281
+
+Rebuilds `utterances` as a table range-partitioned by month on `timestamp`.
+The rows are copied inside the migration transaction, so writes to
+`utterances` block until it commits; schedule it in a quiet window.
+
+- The primary key becomes `(id, timestamp)` because Postgres requires the
+  partition key in every unique constraint.
+- The `reply_to_id -> utterances.id` foreign key is dropped; it cannot
+  reference `id` alone on a partitioned table. Replies are written in the
+  same statement as the utterance they answer.
+- Monthly partitions cover the existing rows through three months ahead. A
+  DEFAULT partition catches anything outside them. `app.partitions` creates
+  later months.
+"""
+from __future__ import annotations
+
+import datetime
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = 'a7d3c9e4f210'
+down_revision = 'e5a0f3b19c68'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+COLUMNS = (
+    "id, conversation_id, speaker_id, reply_to_id, timestamp, text, meta, "
+    "created_at, status, error, attempts, available_at"
+)
+
+TABLE_BODY = """
+    id VARCHAR(32) NOT NULL,
+    conversation_id VARCHAR(32) NOT NULL,
+    speaker_id VARCHAR(128) NOT NULL,
+    reply_to_id VARCHAR(32),
+    timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+    text TEXT,
+    meta JSONB,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    status VARCHAR(16) NOT NULL,
+    error TEXT,
+    attempts INTEGER DEFAULT 0 NOT NULL,
+    available_at TIMESTAMP WITH TIME ZONE,
+    CONSTRAINT ck_utterances_status
+        CHECK (status in ('received', 'queued', 'sent', 'failed')),
+    CONSTRAINT utterances_conversation_id_fkey
+        FOREIGN KEY (conversation_id) REFERENCES conversations (id),
+    CONSTRAINT utterances_speaker_id_fkey
+        FOREIGN KEY (speaker_id) REFERENCES speakers (id)
+"""
+
+
+def _month_start(value: datetime.datetime) -> datetime.date:
+    return datetime.date(value.year, value.month, 1)
+
+
+def _next_month(value: datetime.date) -> datetime.date:
+    return datetime.date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _create_indexes() -> None:
+    op.create_index(
+        'ix_utterances_conversation_timestamp',
+        'utterances',
+        ['conversation_id', 'timestamp'],
+    )
+    op.create_index(
+        'ix_utterances_speaker_timestamp', 'utterances', ['speaker_id', 'timestamp']
+    )
+    op.create_index('ix_utterances_reply_to_id', 'utterances', ['reply_to_id'])
+    op.create_index(
+        'ix_utterances_pending',
+        'utterances',
+        ['status', 'timestamp'],
+        postgresql_where=sa.text("status IN ('queued', 'failed')"),
+    )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text("SELECT min(timestamp) FROM utterances")).scalar()
+    now = datetime.datetime.now(datetime.UTC)
+
+    op.execute(
+        f"CREATE TABLE utterances_partitioned ({TABLE_BODY}) PARTITION BY RANGE (timestamp)"
+    )
+    month = _month_start(min(oldest, now) if oldest else now)
+    last = _month_start(now)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        upper = _next_month(month)
+        op.execute(
+            f"CREATE TABLE utterances_p{month:%Y_%m} PARTITION OF utterances_partitioned "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+            f"TO ('{upper.isoformat()} 00:00:00+00')"
+        )
+        month = upper
+    op.execute("CREATE TABLE utterances_default PARTITION OF utterances_partitioned DEFAULT")
+
+    op.execute(
+        f"INSERT INTO utterances_partitioned ({COLUMNS}) SELECT {COLUMNS} FROM utterances"
+    )
+    op.drop_table('utterances')
+    op.rename_table('utterances_partitioned', 'utterances')
+    op.create_primary_key('utterances_pkey', 'utterances', ['id', 'timestamp'])
+    _create_indexes()
+
+
+def downgrade() -> None:
+    op.execute(f"CREATE TABLE utterances_unpartitioned ({TABLE_BODY})")
+    op.execute(
+        f"INSERT INTO utterances_unpartitioned ({COLUMNS}) SELECT {COLUMNS} FROM utterances"
+    )
+    op.drop_table('utterances')
+    op.rename_table('utterances_unpartitioned', 'utterances')
+    op.create_primary_key('utterances_pkey', 'utterances', ['id'])
+    op.create_foreign_key(
+        'utterances_reply_to_id_fkey', 'utterances', 'utterances', ['reply_to_id'], ['id']
+    )
+    _create_indexes()
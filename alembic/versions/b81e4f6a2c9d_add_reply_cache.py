@@ -0,0 +1,35 @@
+"""add_reply_cache
+
+Revision ID: b81e4f6a2c9d
+Revises: a7d3c9e4f210
+Create Date: 2026-10-17 16:05:12.427310
+
+Shared tier of the exact-match reply cache, keyed by a SHA-256 of the
+cache version and the normalized ingested message.
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = 'b81e4f6a2c9d'
+down_revision = 'a7d3c9e4f210'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('reply_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('reply', sa.Text(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_reply_cache_expires_at', 'reply_cache', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reply_cache_expires_at', table_name='reply_cache')
+    op.drop_table('reply_cache')
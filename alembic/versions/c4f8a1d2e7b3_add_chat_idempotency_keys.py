@@ -0,0 +1,39 @@
+"""add_chat_idempotency_keys
+
+Revision ID: c4f8a1d2e7b3
+Revises: b81e4f6a2c9d
+Create Date: 2026-10-17 17:12:40.118204
+
+Idempotency keys for `/chat`, unique per user, holding the response of the
+request that claimed them until they expire.
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = 'c4f8a1d2e7b3'
+down_revision = 'b81e4f6a2c9d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('chat_idempotency_keys',
+    sa.Column('user_id', sa.String(length=128), nullable=False),
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('conversation_id', sa.String(length=32), nullable=False),
+    sa.Column('reply_utterance_id', sa.String(length=32), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'key')
+    )
+    op.create_index(
+        'ix_chat_idempotency_keys_expires_at', 'chat_idempotency_keys', ['expires_at']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_idempotency_keys_expires_at', table_name='chat_idempotency_keys')
+    op.drop_table('chat_idempotency_keys')
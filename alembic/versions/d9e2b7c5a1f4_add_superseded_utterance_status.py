@@ -0,0 +1,39 @@
+"""add_superseded_utterance_status
+
+Revision ID: d9e2b7c5a1f4
+Revises: c4f8a1d2e7b3
+Create Date: 2026-10-17 18:02:51.640927
+
+Pending replies merged into a later reply by message coalescing are marked
+`superseded`. Re-adding the check validates every partition once.
+"""
+from __future__ import annotations
+
+from alembic import op
+
+revision = 'd9e2b7c5a1f4'
+down_revision = 'c4f8a1d2e7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_constraint('ck_utterances_status', 'utterances', type_='check')
+    op.create_check_constraint(
+        'ck_utterances_status',
+        'utterances',
+        "status in ('received', 'queued', 'sent', 'failed', 'superseded')",
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "UPDATE utterances SET status = 'failed', error = 'Superseded by a later reply.' "
+        "WHERE status = 'superseded'"
+    )
+    op.drop_constraint('ck_utterances_status', 'utterances', type_='check')
+    op.create_check_constraint(
+        'ck_utterances_status',
+        'utterances',
+        "status in ('received', 'queued', 'sent', 'failed')",
+    )
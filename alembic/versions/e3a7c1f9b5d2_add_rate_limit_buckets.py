@@ -0,0 +1,36 @@
+"""add_rate_limit_buckets
+
+Revision ID: e3a7c1f9b5d2
+Revises: d9e2b7c5a1f4
+Create Date: 2026-10-17 19:41:08.552173
+
+Shared token buckets for `/chat` rate limiting, one row per user plus one
+global row. Unlogged, since losing them only resets the limits.
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = 'e3a7c1f9b5d2'
+down_revision = 'd9e2b7c5a1f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('rate_limit_buckets',
+    sa.Column('key', sa.String(length=160), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('rate', sa.Float(), nullable=False),
+    sa.Column('burst', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key'),
+    prefixes=['UNLOGGED'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rate_limit_buckets')
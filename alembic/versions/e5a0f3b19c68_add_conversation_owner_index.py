@@ -0,0 +1,36 @@
+"""add_conversation_owner_index
+
+Revision ID: e5a0f3b19c68
+Revises: 8c41d07e5b2a
+Create Date: 2026-10-17 11:26:52.304117
+
+Backs keyset pagination of a speaker's conversations. Built CONCURRENTLY
+so it can run against a live database.
+"""
+from __future__ import annotations
+
+from alembic import op
+
+revision = 'e5a0f3b19c68'
+down_revision = '8c41d07e5b2a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_conversations_owner_created',
+            'conversations',
+            ['owner_speaker_id', 'created_at', 'id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_conversations_owner_created',
+            table_name='conversations',
+            postgresql_concurrently=True,
+        )
@@ -20,6 +20,13 @@ def _get_int_env(name: str, default: int, minimum: int | None = None) -> int:
     return parsed
 
 
+def _get_bool_env(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
 def _get_float_env(name: str, default: float, minimum: float | None = None) -> float:
     value = os.getenv(name)
     if value is None or value == "":
@@ -48,22 +55,326 @@ def get_sms_timeout_seconds() -> float:
     return _get_float_env("SMS_TIMEOUT_SECONDS", 10.0, minimum=0.1)
 
 
+# SMS_BULK_URL: optional bulk webhook; when set, replies are batched into one POST.
+def get_sms_bulk_url() -> str:
+    return _get_env("SMS_BULK_URL", "")
+
+
+# SMS_BATCH_MAX_MESSAGES: most replies sent in one bulk POST.
+def get_sms_batch_max_messages() -> int:
+    return _get_int_env("SMS_BATCH_MAX_MESSAGES", 100, minimum=1)
+
+
+# SMS_BATCH_LINGER_MS: how long a batch waits for more replies before sending.
+def get_sms_batch_linger_ms() -> float:
+    return _get_float_env("SMS_BATCH_LINGER_MS", 50.0, minimum=0.0)
+
+
+# SMS_MAX_CONNECTIONS: connection pool size for the shared outbound SMS client.
+def get_sms_max_connections() -> int:
+    return _get_int_env("SMS_MAX_CONNECTIONS", 100, minimum=1)
+
+
+# SMS_MAX_KEEPALIVE_CONNECTIONS: idle connections kept open for reuse.
+def get_sms_max_keepalive_connections() -> int:
+    return _get_int_env("SMS_MAX_KEEPALIVE_CONNECTIONS", 20, minimum=0)
+
+
+# SMS_KEEPALIVE_EXPIRY_SECONDS: how long an idle keep-alive connection is kept.
+def get_sms_keepalive_expiry_seconds() -> float:
+    return _get_float_env("SMS_KEEPALIVE_EXPIRY_SECONDS", 30.0, minimum=0.0)
+
+
+# SMS_HTTP2: enable HTTP/2 for outbound SMS (requires `httpx[http2]`).
+def get_sms_http2_enabled() -> bool:
+    return _get_bool_env("SMS_HTTP2", False)
+
+
+# SMS_RETRY_ATTEMPTS: tries per reply on timeouts, connection errors and retryable
+# status codes (408, 425, 429, 5xx gateway errors), including the first.
+def get_sms_retry_attempts() -> int:
+    return _get_int_env("SMS_RETRY_ATTEMPTS", 3, minimum=1)
+
+
+# SMS_RETRY_BASE_MS: first retry delay cap; it doubles per retry, with full jitter.
+def get_sms_retry_base_ms() -> float:
+    return _get_float_env("SMS_RETRY_BASE_MS", 200.0, minimum=0.0)
+
+
+# SMS_RETRY_MAX_MS: longest delay between two tries, including a gateway's Retry-After.
+def get_sms_retry_max_ms() -> float:
+    return _get_float_env("SMS_RETRY_MAX_MS", 5000.0, minimum=0.0)
+
+
+# SMS_CIRCUIT_FAILURE_THRESHOLD: consecutive failed tries that open the SMS circuit.
+def get_sms_circuit_failure_threshold() -> int:
+    return _get_int_env("SMS_CIRCUIT_FAILURE_THRESHOLD", 5, minimum=1)
+
+
+# SMS_CIRCUIT_RESET_SECONDS: how long an open circuit parks replies before one probe send.
+def get_sms_circuit_reset_seconds() -> float:
+    return _get_float_env("SMS_CIRCUIT_RESET_SECONDS", 30.0, minimum=0.1)
+
+
+# REPLY_DISPATCH_MODE: "background" runs replies in the API process, "worker" leaves
+# them queued for `python -m app.worker`.
+def get_reply_dispatch_mode() -> Literal["background", "worker"]:
+    value = _get_env("REPLY_DISPATCH_MODE", "background").strip().lower()
+    return "worker" if value == "worker" else "background"
+
+
+# REPLY_LEASE_SECONDS: how long a claimed reply stays invisible to other workers.
+def get_reply_lease_seconds() -> float:
+    return _get_float_env("REPLY_LEASE_SECONDS", 300.0, minimum=1.0)
+
+
+# REPLY_MAX_ATTEMPTS: claims allowed per reply before it is marked failed.
+def get_reply_max_attempts() -> int:
+    return _get_int_env("REPLY_MAX_ATTEMPTS", 5, minimum=1)
+
+
+# REPLY_STUCK_AFTER_SECONDS: age at which a queued reply whose lease has run out is
+# treated as abandoned and run again by the in-process reaper.
+def get_reply_stuck_after_seconds() -> float:
+    return _get_float_env("REPLY_STUCK_AFTER_SECONDS", 600.0, minimum=1.0)
+
+
+# REPLY_REAPER_INTERVAL_SECONDS: how often the API sweeps for stuck replies; 0 disables.
+def get_reply_reaper_interval_seconds() -> float:
+    return _get_float_env("REPLY_REAPER_INTERVAL_SECONDS", 60.0, minimum=0.0)
+
+
+# REPLY_REAPER_BATCH_SIZE: most stuck replies claimed per sweep.
+def get_reply_reaper_batch_size() -> int:
+    return _get_int_env("REPLY_REAPER_BATCH_SIZE", 100, minimum=1)
+
+
+# REPLY_MAX_CONCURRENCY: in-process deferred replies allowed to run at once.
+def get_reply_max_concurrency() -> int:
+    return _get_int_env("REPLY_MAX_CONCURRENCY", 32, minimum=1)
+
+
+# REPLY_MAX_BACKLOG: running plus waiting in-process replies before /chat sheds load.
+def get_reply_max_backlog() -> int:
+    return _get_int_env("REPLY_MAX_BACKLOG", 1000, minimum=1)
+
+
+# REPLY_RETRY_AFTER_SECONDS: Retry-After sent when the reply backlog is full.
+def get_reply_retry_after_seconds() -> int:
+    return _get_int_env("REPLY_RETRY_AFTER_SECONDS", 5, minimum=1)
+
+
+# WORKER_CONCURRENCY: replies a worker process runs at once.
+def get_worker_concurrency() -> int:
+    return _get_int_env("WORKER_CONCURRENCY", 8, minimum=1)
+
+
+# WORKER_POLL_INTERVAL_SECONDS: idle delay between queue polls.
+def get_worker_poll_interval_seconds() -> float:
+    return _get_float_env("WORKER_POLL_INTERVAL_SECONDS", 1.0, minimum=0.01)
+
+
+# EXPORT_CHUNK_ROWS: rows fetched per server-side cursor round-trip during exports.
+def get_export_chunk_rows() -> int:
+    return _get_int_env("EXPORT_CHUNK_ROWS", 1000, minimum=1)
+
+
+# PIPELINE_STAGE_TIMEOUT_SECONDS: default per-stage reply pipeline timeout; 0 disables.
+# PIPELINE_<STAGE>_TIMEOUT_SECONDS: override for one stage, e.g. PIPELINE_GENERATE_TIMEOUT_SECONDS.
+def get_pipeline_stage_timeout_seconds(stage: str) -> float:
+    default = _get_float_env("PIPELINE_STAGE_TIMEOUT_SECONDS", 30.0, minimum=0.0)
+    return _get_float_env(f"PIPELINE_{stage.upper()}_TIMEOUT_SECONDS", default, minimum=0.0)
+
+
+# PIPELINE_PROCESS_WORKERS: processes for CPU-bound pipeline stages; 0 uses the CPU count.
+def get_pipeline_process_workers() -> int | None:
+    return _get_int_env("PIPELINE_PROCESS_WORKERS", 0, minimum=0) or None
+
+
+# LLM_STREAM_URL: streaming reply model endpoint (server-sent events); when set, replies are
+# generated token by token and sent segment by segment.
+def get_llm_stream_url() -> str:
+    return _get_env("LLM_STREAM_URL", "")
+
+
+# SMS_SEGMENT_MAX_CHARS: longest streamed reply segment sent as one SMS.
+def get_sms_segment_max_chars() -> int:
+    return _get_int_env("SMS_SEGMENT_MAX_CHARS", 160, minimum=20)
+
+
+# REPLY_CACHE_ENABLED: reuse generated replies for identical ingested messages.
+def get_reply_cache_enabled() -> bool:
+    return _get_bool_env("REPLY_CACHE_ENABLED", False)
+
+
+# REPLY_CACHE_VERSION: part of every cache key; bump when prompts or the model change.
+def get_reply_cache_version() -> str:
+    return _get_env("REPLY_CACHE_VERSION", "1")
+
+
+# REPLY_CACHE_TTL_SECONDS: how long a cached reply stays valid.
+def get_reply_cache_ttl_seconds() -> float:
+    return _get_float_env("REPLY_CACHE_TTL_SECONDS", 3600.0, minimum=1.0)
+
+
+# REPLY_CACHE_MAX_ENTRIES: replies kept in the per-process LRU.
+def get_reply_cache_max_entries() -> int:
+    return _get_int_env("REPLY_CACHE_MAX_ENTRIES", 10000, minimum=1)
+
+
+# REPLY_CACHE_MAX_BYTES: size cap of the per-process LRU (keys plus UTF-8 replies).
+def get_reply_cache_max_bytes() -> int:
+    return _get_int_env("REPLY_CACHE_MAX_BYTES", 16 * 1024 * 1024, minimum=1024)
+
+
+# REPLY_CACHE_SHARED: also read and write the Postgres `reply_cache` table.
+def get_reply_cache_shared_enabled() -> bool:
+    return _get_bool_env("REPLY_CACHE_SHARED", False)
+
+
+# SEMANTIC_CACHE_ENABLED: also reuse replies of near-duplicate messages (requires numpy).
+def get_semantic_cache_enabled() -> bool:
+    return _get_bool_env("SEMANTIC_CACHE_ENABLED", False)
+
+
+# SEMANTIC_CACHE_THRESHOLD: minimum cosine similarity for a semantic cache hit.
+def get_semantic_cache_threshold() -> float:
+    return min(_get_float_env("SEMANTIC_CACHE_THRESHOLD", 0.9, minimum=0.0), 1.0)
+
+
+# SEMANTIC_CACHE_MAX_ENTRIES: rows in the semantic cache matrix; the LRU row is replaced.
+def get_semantic_cache_max_entries() -> int:
+    return _get_int_env("SEMANTIC_CACHE_MAX_ENTRIES", 10000, minimum=1)
+
+
+# SEMANTIC_CACHE_DIMENSIONS: hashed n-gram vector size; larger is more precise and slower.
+def get_semantic_cache_dimensions() -> int:
+    return _get_int_env("SEMANTIC_CACHE_DIMENSIONS", 64, minimum=16)
+
+
+# REPLY_COALESCE_WINDOW_MS: wait this long after a message for more from the same
+# conversation and answer them all with one reply; 0 replies to each message.
+def get_reply_coalesce_window_ms() -> int:
+    return _get_int_env("REPLY_COALESCE_WINDOW_MS", 0, minimum=0)
+
+
+# REPLY_ORDERING_ADVISORY_LOCKS: also serialize replies per conversation across processes
+# with Postgres advisory locks (pins one connection per running reply).
+def get_reply_ordering_advisory_locks() -> bool:
+    return _get_bool_env("REPLY_ORDERING_ADVISORY_LOCKS", False)
+
+
+# IDEMPOTENCY_KEY_TTL_SECONDS: how long a /chat idempotency key replays its first response.
+def get_idempotency_key_ttl_seconds() -> float:
+    return _get_float_env("IDEMPOTENCY_KEY_TTL_SECONDS", 86400.0, minimum=1.0)
+
+
+# RATE_LIMIT_USER_PER_MINUTE: /chat requests per minute allowed for one user_id; 0 disables.
+def get_rate_limit_user_per_minute() -> float:
+    return _get_float_env("RATE_LIMIT_USER_PER_MINUTE", 0.0, minimum=0.0)
+
+
+# RATE_LIMIT_USER_BURST: requests one user_id may send at once before the rate applies.
+def get_rate_limit_user_burst() -> int:
+    return _get_int_env("RATE_LIMIT_USER_BURST", 10, minimum=1)
+
+
+# RATE_LIMIT_GLOBAL_PER_SECOND: /chat requests per second allowed across all users; 0 disables.
+def get_rate_limit_global_per_second() -> float:
+    return _get_float_env("RATE_LIMIT_GLOBAL_PER_SECOND", 0.0, minimum=0.0)
+
+
+# RATE_LIMIT_GLOBAL_BURST: requests accepted at once across all users before the rate applies.
+def get_rate_limit_global_burst() -> int:
+    return _get_int_env("RATE_LIMIT_GLOBAL_BURST", 100, minimum=1)
+
+
+# RATE_LIMIT_SHARED: also enforce the limits through the Postgres `rate_limit_buckets`
+# table so they hold across API replicas.
+def get_rate_limit_shared_enabled() -> bool:
+    return _get_bool_env("RATE_LIMIT_SHARED", False)
+
+
+# RATE_LIMIT_MAX_TRACKED_USERS: per-user buckets kept in memory; the least recent is dropped.
+def get_rate_limit_max_tracked_users() -> int:
+    return _get_int_env("RATE_LIMIT_MAX_TRACKED_USERS", 100000, minimum=1)
+
+
+# CONTEXT_MAX_TURNS: most recent turns of a conversation given to reply generation.
+def get_context_max_turns() -> int:
+    return _get_int_env("CONTEXT_MAX_TURNS", 20, minimum=1)
+
+
+# CONTEXT_MAX_CHARS: character budget for those turns; the oldest are dropped first.
+def get_context_max_chars() -> int:
+    return _get_int_env("CONTEXT_MAX_CHARS", 4000, minimum=1)
+
+
+# CONTEXT_CACHE_MAX_CONVERSATIONS: conversations whose recent turns stay in memory; 0 disables.
+def get_context_cache_max_conversations() -> int:
+    return _get_int_env("CONTEXT_CACHE_MAX_CONVERSATIONS", 10000, minimum=0)
+
+
+# DB_QUERY_WARN_STATEMENTS: log requests and reply jobs that run more SQL statements.
+def get_db_query_warn_statements() -> int:
+    return _get_int_env("DB_QUERY_WARN_STATEMENTS", 20, minimum=1)
+
+
+# DB_QUERY_WARN_REPEATS: log when one statement repeats this often in a scope (likely N+1).
+def get_db_query_warn_repeats() -> int:
+    return _get_int_env("DB_QUERY_WARN_REPEATS", 5, minimum=2)
+
+
+# DB_QUERY_DEBUG_HEADERS: add X-DB-Statements / X-DB-Time-Ms headers to responses.
+def get_db_query_debug_headers_enabled() -> bool:
+    return _get_bool_env("DB_QUERY_DEBUG_HEADERS", False)
+
+
+# UTTERANCE_PARTITION_MONTHS_AHEAD: future monthly utterance partitions to keep created.
+def get_utterance_partition_months_ahead() -> int:
+    return _get_int_env("UTTERANCE_PARTITION_MONTHS_AHEAD", 3, minimum=0)
+
+
+# UTTERANCE_PARTITION_CHECK_SECONDS: how often the API and worker ensure partitions exist.
+def get_utterance_partition_check_seconds() -> float:
+    return _get_float_env("UTTERANCE_PARTITION_CHECK_SECONDS", 3600.0, minimum=1.0)
+
+
+# UTTERANCE_RETENTION_MONTHS: full months kept by `app.partitions prune`; 0 keeps everything.
+def get_utterance_retention_months() -> int:
+    return _get_int_env("UTTERANCE_RETENTION_MONTHS", 0, minimum=0)
+
+
 # MESSAGE_MIN_LENGTH: minimum characters for inbound/outbound messages.
 MESSAGE_MIN_LENGTH = _get_int_env("MESSAGE_MIN_LENGTH", 1, minimum=1)
 
 # MESSAGE_MAX_LENGTH: maximum characters for inbound/outbound messages.
 MESSAGE_MAX_LENGTH = _get_int_env("MESSAGE_MAX_LENGTH", 4000, minimum=MESSAGE_MIN_LENGTH)
 
+# CHAT_BATCH_MAX_ITEMS: maximum messages accepted by POST /chat/batch.
+CHAT_BATCH_MAX_ITEMS = _get_int_env("CHAT_BATCH_MAX_ITEMS", 500, minimum=1)
+
+# HISTORY_PAGE_DEFAULT_LIMIT / HISTORY_PAGE_MAX_LIMIT: page sizes for history endpoints.
+HISTORY_PAGE_MAX_LIMIT = _get_int_env("HISTORY_PAGE_MAX_LIMIT", 200, minimum=1)
+HISTORY_PAGE_DEFAULT_LIMIT = min(
+    _get_int_env("HISTORY_PAGE_DEFAULT_LIMIT", 50, minimum=1), HISTORY_PAGE_MAX_LIMIT
+)
+
+CONVERSATION_STATUS_OPEN: Final[Literal["open"]] = "open"
+CONVERSATION_STATUS_CLOSED: Final[Literal["closed"]] = "closed"
+
 UTTERANCE_STATUS_RECEIVED: Final[Literal["received"]] = "received"
 UTTERANCE_STATUS_QUEUED: Final[Literal["queued"]] = "queued"
 UTTERANCE_STATUS_SENT: Final[Literal["sent"]] = "sent"
 UTTERANCE_STATUS_FAILED: Final[Literal["failed"]] = "failed"
+UTTERANCE_STATUS_SUPERSEDED: Final[Literal["superseded"]] = "superseded"
 
 UTTERANCE_STATUSES = (
     UTTERANCE_STATUS_RECEIVED,
     UTTERANCE_STATUS_QUEUED,
     UTTERANCE_STATUS_SENT,
     UTTERANCE_STATUS_FAILED,
+    UTTERANCE_STATUS_SUPERSEDED,
 )
 
 UTTERANCE_STATUSES_SQL = ", ".join(f"'{status}'" for status in UTTERANCE_STATUSES)
@@ -4,11 +4,55 @@ from functools import lru_cache
 
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
     AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+
+from app import metrics
+
+_pool_wait_seconds = metrics.histogram(
+    "texet_db_pool_wait_seconds",
+    "Time to check a connection out of the SQLAlchemy pool.",
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waits."""
+
+    def connect(self) -> PoolProxiedConnection:
+        with _pool_wait_seconds.time():
+            return super().connect()
+
+
+def _register_pool_gauges(engine: AsyncEngine) -> None:
+    # Read `engine.pool` at scrape time: `dispose()` swaps in a fresh pool.
+    def _pool() -> AsyncAdaptedQueuePool | None:
+        pool = engine.pool
+        return pool if isinstance(pool, AsyncAdaptedQueuePool) else None
+
+    def _checked_out() -> float:
+        pool = _pool()
+        return pool.checkedout() if pool else 0
+
+    def _overflow() -> float:
+        pool = _pool()
+        return max(pool.overflow(), 0) if pool else 0
+
+    def _size() -> float:
+        pool = _pool()
+        return pool.size() if pool else 0
+
+    metrics.gauge(
+        "texet_db_pool_checked_out", "Connections currently checked out.", _checked_out
+    )
+    metrics.gauge(
+        "texet_db_pool_overflow", "Connections open beyond the pool size.", _overflow
+    )
+    metrics.gauge("texet_db_pool_size", "Configured pool size.", _size)
 
 
 def _get_database_url() -> str:
@@ -20,13 +64,28 @@ def _get_database_url() -> str:
 
 @lru_cache
 def get_engine() -> AsyncEngine:
-    return create_async_engine(_get_database_url(), pool_pre_ping=True)
+    engine = create_async_engine(
+        _get_database_url(), pool_pre_ping=True, poolclass=TimedQueuePool
+    )
+    _register_pool_gauges(engine)
+    return engine
 
 
 def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
     return async_sessionmaker(get_engine(), expire_on_commit=False)
 
 
+def get_session_engine(session: AsyncSession) -> AsyncEngine:
+    """Engine behind `session`, for work that outlives the request's session."""
+    bind = session.bind
+    if bind is None:
+        return get_engine()
+    engine = bind.engine if isinstance(bind, AsyncConnection) else bind
+    if not isinstance(engine, AsyncEngine):
+        return get_engine()
+    return engine
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     sessionmaker = get_sessionmaker()
     async with sessionmaker() as session:
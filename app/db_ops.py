@@ -1,24 +1,144 @@
 from __future__ import annotations
 
 import datetime
+import uuid
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
 from typing import Any
 
-from sqlalchemy import select
+from sqlalchemy import (
+    Boolean,
+    Float,
+    Insert,
+    Row,
+    and_,
+    case,
+    cast,
+    delete,
+    exists,
+    func,
+    insert,
+    literal,
+    literal_column,
+    or_,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import (
+    CONVERSATION_STATUS_CLOSED,
+    CONVERSATION_STATUS_OPEN,
+    UTTERANCE_STATUS_FAILED,
     UTTERANCE_STATUS_QUEUED,
     UTTERANCE_STATUS_RECEIVED,
+    UTTERANCE_STATUS_SENT,
+    UTTERANCE_STATUS_SUPERSEDED,
     UTTERANCE_STATUSES,
 )
-from app.models import Conversation, Speaker, Utterance
+from app.models import (
+    ChatIdempotencyKey,
+    Conversation,
+    RateLimitBucket,
+    ReplyCacheEntry,
+    Speaker,
+    Utterance,
+)
+
+# `session.info` key for context changes applied when the session commits.
+CONTEXT_WRITES_KEY = "texet_context_writes"
+
+# Rows per multi-row INSERT; keeps bind parameters well under asyncpg's 32767 cap.
+INSERT_CHUNK_ROWS = 1000
+
+# Keys of the per-reply timing trace stored in `Utterance.meta["timing"]`.
+REPLY_TIMING_KEYS = (
+    "queue_wait_ms",
+    "ingest_ms",
+    "generate_ms",
+    "contribute_ms",
+    "qa_ms",
+    "db_commit_ms",
+    "sms_ms",
+    # Streamed replies only: time until the first segment was sent.
+    "first_segment_ms",
+    "total_ms",
+)
+
+# Widest window `list_slowest_replies` takes: it reads every reply in it.
+SLOWEST_REPLIES_MAX_WINDOW = datetime.timedelta(days=1)
+
+
+@dataclass(frozen=True)
+class ChatIngest:
+    conversation_id: str
+    user_utterance_id: str
+    bot_utterance_id: str
+
+
+@dataclass(frozen=True)
+class ContextTurn:
+    utterance_id: str
+    speaker_id: str
+    text: str
+    timestamp: datetime.datetime
+
+
+@dataclass(frozen=True)
+class ContextWrite:
+    """A change to a conversation's recent turns, made visible on commit.
+
+    `created` means the conversation started in this transaction, so `turn`
+    (if any) is its whole history; `closed` drops what is buffered.
+    """
+
+    conversation_id: str
+    turn: ContextTurn | None = None
+    created: bool = False
+    closed: bool = False
+
+
+@dataclass(frozen=True)
+class CoalescedReply:
+    """Messages a reply answers (none if it is superseded) and replies it superseded."""
+
+    messages: list[str]
+    superseded: int
+
+
+@dataclass(frozen=True)
+class ReplyJob:
+    user_id: str
+    conversation_id: str
+    user_utterance_id: str
+    bot_utterance_id: str
+    attempts: int
+    # The reply text was already stored: only delivery is left.
+    generated: bool = False
 
 
 def bot_speaker_id(user_id: str) -> str:
     return f"bot:{user_id}"
 
 
+def stage_context_write(session: AsyncSession, write: ContextWrite) -> None:
+    """Queue `write` for the in-process context buffers; dropped on rollback."""
+    session.info.setdefault(CONTEXT_WRITES_KEY, []).append(write)
+
+
+def _utterance_turn(utterance: Utterance) -> ContextTurn | None:
+    if utterance.text is None or utterance.status not in (
+        UTTERANCE_STATUS_RECEIVED,
+        UTTERANCE_STATUS_SENT,
+    ):
+        return None
+    return ContextTurn(utterance.id, utterance.speaker_id, utterance.text, utterance.timestamp)
+
+
 def _validate_utterance_status(status: str) -> None:
     if status not in UTTERANCE_STATUSES:
         raise ValueError(f"Invalid utterance status: {status}")
@@ -67,6 +187,7 @@ async def create_conversation(
     )
     session.add(conversation)
     await session.flush()
+    stage_context_write(session, ContextWrite(conversation.id, created=True))
     return conversation
 
 
@@ -95,7 +216,8 @@ async def get_or_create_conversation(
             )
             session.add(conversation)
             await session.flush()
-            return conversation
+        stage_context_write(session, ContextWrite(conversation.id, created=True))
+        return conversation
     except IntegrityError:
         pass
 
@@ -141,6 +263,9 @@ async def create_utterance(
     conversation.last_activity_at = now
 
     await session.flush()
+    turn = _utterance_turn(utterance)
+    if turn is not None:
+        stage_context_write(session, ContextWrite(conversation_id, turn))
     return utterance
 
 
@@ -170,3 +295,626 @@ async def create_pending_utterance(
 
     await session.flush()
     return utterance
+
+
+def _upsert_speakers_and_conversations(
+    user_ids: Sequence[str], now: datetime.datetime
+) -> Insert:
+    """One statement upserting users, their bots, and each user's open conversation."""
+    speaker_rows: list[dict[str, Any]] = []
+    for user_id in user_ids:
+        speaker_rows.append({"id": user_id, "meta": {"type": "user"}, "created_at": now})
+        speaker_rows.append(
+            {"id": bot_speaker_id(user_id), "meta": {"type": "bot"}, "created_at": now}
+        )
+    speakers = (
+        pg_insert(Speaker)
+        .values(speaker_rows)
+        .on_conflict_do_nothing(index_elements=[Speaker.id])
+        .cte("upserted_speakers")
+    )
+    conversation_insert = pg_insert(Conversation).values(
+        [
+            {
+                "id": uuid.uuid4().hex,
+                "owner_speaker_id": user_id,
+                "status": "open",
+                "last_activity_at": now,
+                "created_at": now,
+            }
+            for user_id in user_ids
+        ]
+    )
+    return (
+        conversation_insert.on_conflict_do_update(
+            index_elements=[Conversation.owner_speaker_id],
+            index_where=text("status = 'open'"),
+            set_={"last_activity_at": conversation_insert.excluded.last_activity_at},
+        )
+        # xmax is 0 only on rows this statement inserted rather than updated.
+        .returning(
+            Conversation.owner_speaker_id, Conversation.id, literal_column("xmax = 0", Boolean)
+        )
+        .add_cte(speakers)
+    )
+
+
+async def ingest_chat_messages(
+    session: AsyncSession,
+    messages: Sequence[tuple[str, str]],
+    reply_lease_until: datetime.datetime | None = None,
+) -> list[ChatIngest]:
+    """Persist inbound `(user_id, message)` pairs and their pending replies.
+
+    Two statements for up to `INSERT_CHUNK_ROWS // 2` messages, and one more
+    per further `INSERT_CHUNK_ROWS // 2` distinct users or messages, so no
+    statement nears Postgres's bind parameter limit. The first upserts each
+    chunk of users and their bot speakers (as a data-modifying CTE) and
+    resolves each user's open conversation through `ux_conversations_owner_open`
+    with ON CONFLICT, bumping `last_activity_at` either way. The second inserts
+    the user utterances and queued bot utterances as multi-row inserts.
+
+    Timestamps step by a microsecond per utterance in input order, so messages
+    from the same user keep their order and each reply sorts after its message.
+
+    Passing `reply_lease_until` claims the replies for the calling process (one
+    attempt, hidden from workers until the lease expires).
+    """
+    if not messages:
+        return []
+    now = datetime.datetime.now(datetime.UTC)
+    user_ids = sorted({user_id for user_id, _ in messages})
+
+    conversation_ids: dict[str, str] = {}
+    created_ids: set[str] = set()
+    # Each user binds 11 parameters across its two speakers and conversation.
+    for start in range(0, len(user_ids), INSERT_CHUNK_ROWS // 2):
+        user_chunk = user_ids[start : start + INSERT_CHUNK_ROWS // 2]
+        result = await session.execute(_upsert_speakers_and_conversations(user_chunk, now))
+        for owner_speaker_id, conversation_id, created in result.all():
+            conversation_ids[owner_speaker_id] = conversation_id
+            if created:
+                created_ids.add(conversation_id)
+
+    ingests: list[ChatIngest] = []
+    utterance_rows: list[dict[str, Any]] = []
+    for index, (user_id, message) in enumerate(messages):
+        received_at = now + datetime.timedelta(microseconds=2 * index)
+        replied_at = received_at + datetime.timedelta(microseconds=1)
+        ingest = ChatIngest(
+            conversation_id=conversation_ids[user_id],
+            user_utterance_id=uuid.uuid4().hex,
+            bot_utterance_id=uuid.uuid4().hex,
+        )
+        ingests.append(ingest)
+        utterance_rows.append(
+            {
+                "id": ingest.user_utterance_id,
+                "conversation_id": ingest.conversation_id,
+                "speaker_id": user_id,
+                "reply_to_id": None,
+                "text": message,
+                "meta": None,
+                "timestamp": received_at,
+                "status": UTTERANCE_STATUS_RECEIVED,
+                "error": None,
+                "attempts": 0,
+                "available_at": None,
+                "created_at": received_at,
+            }
+        )
+        utterance_rows.append(
+            {
+                "id": ingest.bot_utterance_id,
+                "conversation_id": ingest.conversation_id,
+                "speaker_id": bot_speaker_id(user_id),
+                "reply_to_id": ingest.user_utterance_id,
+                "text": None,
+                "meta": None,
+                "timestamp": replied_at,
+                "status": UTTERANCE_STATUS_QUEUED,
+                "error": None,
+                "attempts": 0 if reply_lease_until is None else 1,
+                "available_at": reply_lease_until,
+                "created_at": replied_at,
+            }
+        )
+        turn = ContextTurn(ingest.user_utterance_id, user_id, message, received_at)
+        created = ingest.conversation_id in created_ids
+        created_ids.discard(ingest.conversation_id)
+        stage_context_write(session, ContextWrite(ingest.conversation_id, turn, created=created))
+    for start in range(0, len(utterance_rows), INSERT_CHUNK_ROWS):
+        chunk = utterance_rows[start : start + INSERT_CHUNK_ROWS]
+        await session.execute(insert(Utterance).values(chunk))
+    return ingests
+
+
+async def ingest_chat_message(
+    session: AsyncSession,
+    user_id: str,
+    message: str,
+    reply_lease_until: datetime.datetime | None = None,
+) -> ChatIngest:
+    [ingest] = await ingest_chat_messages(
+        session, [(user_id, message)], reply_lease_until=reply_lease_until
+    )
+    return ingest
+
+
+async def claim_reply_jobs(
+    session: AsyncSession,
+    limit: int,
+    lease_seconds: float,
+    parked: bool | None = None,
+    received_before: datetime.datetime | None = None,
+    exclude_ids: Sequence[str] = (),
+) -> list[ReplyJob]:
+    """Lease up to `limit` queued replies, oldest first.
+
+    Rows are picked with `FOR UPDATE SKIP LOCKED` so concurrent workers never
+    claim the same reply. A claim pushes `available_at` past the lease; a
+    worker that dies mid-reply releases it simply by letting the lease expire.
+    `parked` limits the claim to (True) or excludes (False) replies parked
+    while SMS was down; `received_before` to replies older than that.
+    `exclude_ids` are never claimed.
+    """
+    if limit < 1:
+        return []
+    now = datetime.datetime.now(datetime.UTC)
+    is_parked = Utterance.meta.contains({"sms": {"parked": True}})
+    conditions = [
+        Utterance.status == UTTERANCE_STATUS_QUEUED,
+        Utterance.reply_to_id.is_not(None),
+        or_(Utterance.available_at.is_(None), Utterance.available_at <= now),
+    ]
+    if parked is not None:
+        conditions.append(
+            is_parked if parked else or_(Utterance.meta.is_(None), ~is_parked)
+        )
+    if received_before is not None:
+        conditions.append(Utterance.timestamp <= received_before)
+    if exclude_ids:
+        conditions.append(Utterance.id.not_in(exclude_ids))
+    claimable = (
+        select(Utterance.id)
+        .where(*conditions)
+        .order_by(Utterance.timestamp)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    result = await session.execute(
+        update(Utterance)
+        .where(
+            Utterance.id.in_(claimable),
+            Utterance.conversation_id == Conversation.id,
+        )
+        .values(
+            available_at=now + datetime.timedelta(seconds=lease_seconds),
+            attempts=Utterance.attempts + 1,
+        )
+        .returning(
+            Conversation.owner_speaker_id,
+            Utterance.conversation_id,
+            Utterance.reply_to_id,
+            Utterance.id,
+            Utterance.attempts,
+            Utterance.timestamp,
+            Utterance.text.is_not(None).label("generated"),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    rows = sorted(result.all(), key=lambda row: row.timestamp)
+    return [
+        ReplyJob(
+            user_id=row.owner_speaker_id,
+            conversation_id=row.conversation_id,
+            user_utterance_id=row.reply_to_id,
+            bot_utterance_id=row.id,
+            attempts=row.attempts,
+            generated=row.generated,
+        )
+        for row in rows
+    ]
+
+
+async def conversation_exists(session: AsyncSession, conversation_id: str) -> bool:
+    result = await session.execute(
+        select(Conversation.id).where(Conversation.id == conversation_id)
+    )
+    return result.scalar_one_or_none() is not None
+
+
+async def speaker_exists(session: AsyncSession, speaker_id: str) -> bool:
+    result = await session.execute(select(Speaker.id).where(Speaker.id == speaker_id))
+    return result.scalar_one_or_none() is not None
+
+
+async def list_conversation_utterances(
+    session: AsyncSession,
+    conversation_id: str,
+    limit: int,
+    after: tuple[datetime.datetime, str] | None = None,
+    descending: bool = False,
+) -> Sequence[Row[Any]]:
+    """Page a conversation's utterances by `(timestamp, id)` keyset.
+
+    Selects only the columns the history API returns and seeks past `after`
+    instead of using OFFSET, so every page costs one index range scan.
+    """
+    key = tuple_(Utterance.timestamp, Utterance.id)
+    query = select(
+        Utterance.id,
+        Utterance.speaker_id,
+        Utterance.reply_to_id,
+        Utterance.timestamp,
+        Utterance.status,
+        Utterance.text,
+        Utterance.error,
+    ).where(Utterance.conversation_id == conversation_id)
+    if after is not None:
+        bound = tuple_(literal(after[0]), literal(after[1]))
+        query = query.where(key < bound if descending else key > bound)
+    if descending:
+        query = query.order_by(Utterance.timestamp.desc(), Utterance.id.desc())
+    else:
+        query = query.order_by(Utterance.timestamp, Utterance.id)
+    result = await session.execute(query.limit(limit))
+    return result.all()
+
+
+async def list_recent_turns(
+    session: AsyncSession,
+    conversation_id: str,
+    limit: int,
+    until: tuple[datetime.datetime, str] | None = None,
+    after: tuple[datetime.datetime, str] | None = None,
+) -> list[ContextTurn]:
+    """The last `limit` received or sent turns of a conversation, oldest first.
+
+    One backward range scan of `ix_utterances_conversation_timestamp`,
+    optionally starting at the `(timestamp, id)` of `until` inclusive and
+    stopping before that of `after`.
+    """
+    query = select(
+        Utterance.id, Utterance.speaker_id, Utterance.text, Utterance.timestamp
+    ).where(
+        Utterance.conversation_id == conversation_id,
+        Utterance.status.in_((UTTERANCE_STATUS_RECEIVED, UTTERANCE_STATUS_SENT)),
+        Utterance.text.is_not(None),
+    )
+    if until is not None:
+        bound = tuple_(literal(until[0]), literal(until[1]))
+        query = query.where(tuple_(Utterance.timestamp, Utterance.id) <= bound)
+    if after is not None:
+        bound = tuple_(literal(after[0]), literal(after[1]))
+        query = query.where(tuple_(Utterance.timestamp, Utterance.id) > bound)
+    query = query.order_by(Utterance.timestamp.desc(), Utterance.id.desc()).limit(limit)
+    rows = (await session.execute(query)).all()
+    return [ContextTurn(row[0], row[1], row[2], row[3]) for row in reversed(rows)]
+
+
+async def close_conversation(session: AsyncSession, conversation_id: str) -> bool:
+    """Close an open conversation; the owner's next message starts a new one."""
+    result = await session.execute(
+        update(Conversation)
+        .where(
+            Conversation.id == conversation_id,
+            Conversation.status == CONVERSATION_STATUS_OPEN,
+        )
+        .values(status=CONVERSATION_STATUS_CLOSED)
+        .returning(Conversation.id)
+    )
+    if result.scalar_one_or_none() is None:
+        return False
+    stage_context_write(session, ContextWrite(conversation_id, closed=True))
+    return True
+
+
+async def coalesce_reply(
+    session: AsyncSession, user_utterance: Utterance, bot_utterance_id: str
+) -> CoalescedReply:
+    """Decide which of a conversation's pending messages a reply answers.
+
+    Runs under a transaction-level advisory lock on the conversation; the
+    caller commits. A reply is undecided while it is queued without
+    `meta.coalesced`. If an undecided reply to a later message exists, this
+    one is superseded and the later reply takes its message. Otherwise it
+    answers every message since the last decided reply, supersedes the
+    undecided replies in between, and records their ids in `meta.coalesced`.
+    """
+    conversation_id = user_utterance.conversation_id
+    await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(conversation_id))))
+    bot = (
+        await session.execute(
+            select(Utterance.status, Utterance.timestamp, Utterance.meta).where(
+                Utterance.id == bot_utterance_id
+            )
+        )
+    ).one()
+    if bot.status not in (UTTERANCE_STATUS_QUEUED, UTTERANCE_STATUS_FAILED):
+        return CoalescedReply(messages=[], superseded=0)
+
+    replies = select(Utterance.id).where(
+        Utterance.conversation_id == conversation_id, Utterance.reply_to_id.is_not(None)
+    )
+    undecided = and_(
+        Utterance.status == UTTERANCE_STATUS_QUEUED,
+        or_(Utterance.meta.is_(None), ~Utterance.meta.has_key("coalesced")),
+    )
+    newer_undecided = await session.execute(
+        select(exists(replies.where(Utterance.timestamp > bot.timestamp, undecided)))
+    )
+    if newer_undecided.scalar_one():
+        await session.execute(
+            update(Utterance)
+            .where(Utterance.id == bot_utterance_id)
+            .values(status=UTTERANCE_STATUS_SUPERSEDED)
+        )
+        return CoalescedReply(messages=[], superseded=1)
+
+    boundary = await session.execute(
+        select(func.max(Utterance.timestamp)).where(
+            Utterance.conversation_id == conversation_id,
+            Utterance.reply_to_id.is_not(None),
+            Utterance.timestamp < bot.timestamp,
+            Utterance.status != UTTERANCE_STATUS_SUPERSEDED,
+            or_(
+                Utterance.status.in_((UTTERANCE_STATUS_SENT, UTTERANCE_STATUS_FAILED)),
+                Utterance.meta.has_key("coalesced"),
+            ),
+        )
+    )
+    since = boundary.scalar_one_or_none()
+    after_boundary = [Utterance.timestamp > since] if since is not None else []
+    superseded = await session.execute(
+        update(Utterance)
+        .where(
+            Utterance.id.in_(replies.where(Utterance.timestamp < bot.timestamp)),
+            undecided,
+            *after_boundary,
+        )
+        .values(status=UTTERANCE_STATUS_SUPERSEDED)
+        .returning(Utterance.id)
+    )
+    superseded_count = len(superseded.all())
+    messages = await session.execute(
+        select(Utterance.id, Utterance.text)
+        .where(
+            Utterance.conversation_id == conversation_id,
+            Utterance.speaker_id == user_utterance.speaker_id,
+            Utterance.status == UTTERANCE_STATUS_RECEIVED,
+            Utterance.timestamp <= user_utterance.timestamp,
+            *after_boundary,
+        )
+        .order_by(Utterance.timestamp, Utterance.id)
+    )
+    rows = messages.all()
+    await session.execute(
+        update(Utterance)
+        .where(Utterance.id == bot_utterance_id)
+        .values(meta={**(bot.meta or {}), "coalesced": [row[0] for row in rows]})
+    )
+    return CoalescedReply(
+        messages=[row[1] for row in rows if row[1]], superseded=superseded_count
+    )
+
+
+async def list_speaker_conversations(
+    session: AsyncSession,
+    speaker_id: str,
+    limit: int,
+    after: tuple[datetime.datetime, str] | None = None,
+    descending: bool = False,
+) -> Sequence[Row[Any]]:
+    """Page a speaker's conversations by `(created_at, id)` keyset."""
+    key = tuple_(Conversation.created_at, Conversation.id)
+    query = select(
+        Conversation.id,
+        Conversation.status,
+        Conversation.created_at,
+        Conversation.last_activity_at,
+    ).where(Conversation.owner_speaker_id == speaker_id)
+    if after is not None:
+        bound = tuple_(literal(after[0]), literal(after[1]))
+        query = query.where(key < bound if descending else key > bound)
+    if descending:
+        query = query.order_by(Conversation.created_at.desc(), Conversation.id.desc())
+    else:
+        query = query.order_by(Conversation.created_at, Conversation.id)
+    result = await session.execute(query.limit(limit))
+    return result.all()
+
+
+async def list_slowest_replies(
+    session: AsyncSession,
+    timing_key: str,
+    since: datetime.datetime,
+    limit: int,
+) -> Sequence[Row[Any]]:
+    """Replies stored since `since`, slowest first by one timing trace key.
+
+    An offline diagnostic, not for request paths. No index orders by a
+    timing key, so every reply in the window's partitions is read and
+    sorted; `since` may be at most `SLOWEST_REPLIES_MAX_WINDOW` ago.
+    """
+    if timing_key not in REPLY_TIMING_KEYS:
+        raise ValueError(f"Unknown timing key: {timing_key}")
+    if since < datetime.datetime.now(datetime.UTC) - SLOWEST_REPLIES_MAX_WINDOW:
+        raise ValueError(f"Window too wide: at most {SLOWEST_REPLIES_MAX_WINDOW} back.")
+    duration = Utterance.meta["timing"][timing_key].as_float()
+    result = await session.execute(
+        select(
+            Utterance.id,
+            Utterance.conversation_id,
+            Utterance.timestamp,
+            Utterance.status,
+            duration.label("duration_ms"),
+            Utterance.meta["timing"].label("timing"),
+        )
+        .where(Utterance.timestamp >= since, duration.is_not(None))
+        .order_by(duration.desc())
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def get_cached_reply(
+    session: AsyncSession, key: str, now: datetime.datetime
+) -> str | None:
+    result = await session.execute(
+        select(ReplyCacheEntry.reply).where(
+            ReplyCacheEntry.key == key, ReplyCacheEntry.expires_at > now
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def put_cached_reply(
+    session: AsyncSession, key: str, reply: str, expires_at: datetime.datetime
+) -> None:
+    statement = pg_insert(ReplyCacheEntry).values(
+        key=key,
+        reply=reply,
+        expires_at=expires_at,
+        created_at=datetime.datetime.now(datetime.UTC),
+    )
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[ReplyCacheEntry.key],
+            set_={"reply": statement.excluded.reply, "expires_at": statement.excluded.expires_at},
+        )
+    )
+
+
+async def delete_expired_cached_replies(session: AsyncSession, now: datetime.datetime) -> int:
+    result = await session.execute(
+        delete(ReplyCacheEntry).where(ReplyCacheEntry.expires_at <= now)
+    )
+    return int(getattr(result, "rowcount", 0) or 0)
+
+
+async def get_chat_idempotency_key(
+    session: AsyncSession, user_id: str, key: str, now: datetime.datetime
+) -> tuple[str, str] | None:
+    """`(conversation_id, reply_utterance_id)` of an unexpired key; a primary key lookup."""
+    result = await session.execute(
+        select(ChatIdempotencyKey.conversation_id, ChatIdempotencyKey.reply_utterance_id).where(
+            ChatIdempotencyKey.user_id == user_id,
+            ChatIdempotencyKey.key == key,
+            ChatIdempotencyKey.expires_at > now,
+        )
+    )
+    row = result.one_or_none()
+    return None if row is None else (row[0], row[1])
+
+
+async def claim_chat_idempotency_key(
+    session: AsyncSession,
+    user_id: str,
+    key: str,
+    ingest: ChatIngest,
+    expires_at: datetime.datetime,
+) -> bool:
+    """Record `ingest` under the key unless an unexpired claim already holds it.
+
+    The primary key makes concurrent claims wait for each other; the loser
+    gets False once the winner commits. An expired claim is taken over.
+    """
+    now = datetime.datetime.now(datetime.UTC)
+    statement = pg_insert(ChatIdempotencyKey).values(
+        user_id=user_id,
+        key=key,
+        conversation_id=ingest.conversation_id,
+        reply_utterance_id=ingest.bot_utterance_id,
+        expires_at=expires_at,
+        created_at=now,
+    )
+    result = await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[ChatIdempotencyKey.user_id, ChatIdempotencyKey.key],
+            set_={
+                "conversation_id": statement.excluded.conversation_id,
+                "reply_utterance_id": statement.excluded.reply_utterance_id,
+                "expires_at": statement.excluded.expires_at,
+                "created_at": statement.excluded.created_at,
+            },
+            where=ChatIdempotencyKey.expires_at <= now,
+        ).returning(ChatIdempotencyKey.key)
+    )
+    return result.scalar_one_or_none() is not None
+
+
+async def delete_expired_chat_idempotency_keys(
+    session: AsyncSession, now: datetime.datetime, limit: int
+) -> int:
+    """Delete up to `limit` expired keys, oldest first, along their expiry index."""
+    expired = (
+        select(ChatIdempotencyKey.user_id, ChatIdempotencyKey.key)
+        .where(ChatIdempotencyKey.expires_at <= now)
+        .order_by(ChatIdempotencyKey.expires_at)
+        .limit(limit)
+    )
+    result = await session.execute(
+        delete(ChatIdempotencyKey).where(
+            tuple_(ChatIdempotencyKey.user_id, ChatIdempotencyKey.key).in_(expired)
+        )
+    )
+    return int(getattr(result, "rowcount", 0) or 0)
+
+
+async def take_rate_limit_tokens(
+    session: AsyncSession, buckets: Sequence[tuple[str, float, float, int]]
+) -> dict[str, float]:
+    """Take `count` tokens from each `(key, rate per second, burst, count)` bucket that has them.
+
+    Returns the tokens left in the buckets tokens were taken from; a key that
+    is missing had fewer than `count` and was left as is. One statement refills and takes
+    on the database clock, so every replica sees the same buckets. Rows are
+    locked in key order to keep concurrent callers from deadlocking.
+    """
+    now = datetime.datetime.now(datetime.UTC)
+    statement = pg_insert(RateLimitBucket).values(
+        [
+            {
+                "key": key,
+                "tokens": burst - count,
+                "rate": rate,
+                "burst": burst,
+                "updated_at": func.clock_timestamp(),
+                "created_at": now,
+            }
+            for key, rate, burst, count in sorted(buckets)
+        ]
+    )
+    # The count taken is the difference between a fresh bucket and the row inserted.
+    count = statement.excluded.burst - statement.excluded.tokens
+    elapsed = func.greatest(
+        func.extract("epoch", func.clock_timestamp() - RateLimitBucket.updated_at), 0
+    )
+    refilled = func.least(
+        statement.excluded.burst,
+        RateLimitBucket.tokens + cast(elapsed, Float) * statement.excluded.rate,
+    )
+    result = await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_={
+                "tokens": refilled - count,
+                "rate": statement.excluded.rate,
+                "burst": statement.excluded.burst,
+                "updated_at": func.clock_timestamp(),
+            },
+            where=refilled >= count,
+        ).returning(RateLimitBucket.key, RateLimitBucket.tokens)
+    )
+    return dict(result.tuples().all())
+
+
+async def refund_rate_limit_tokens(session: AsyncSession, counts: Mapping[str, int]) -> None:
+    """Give back the tokens of messages that another bucket turned away, per key."""
+    refund = case(counts, value=RateLimitBucket.key, else_=0)
+    await session.execute(
+        update(RateLimitBucket)
+        .where(RateLimitBucket.key.in_(list(counts)))
+        .values(tokens=func.least(RateLimitBucket.burst, RateLimitBucket.tokens + refund))
+    )
@@ -0,0 +1,53 @@
+"""Export utterances as NDJSON: `python -m app.export [--gzip] [--output PATH]`."""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import sys
+from typing import BinaryIO
+
+from app.config import UTTERANCE_STATUSES
+from app.db import get_engine
+from app.services.export import UtteranceExportFilter, iter_utterance_ndjson
+
+
+def _parse_timestamp(value: str) -> datetime.datetime:
+    parsed = datetime.datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.UTC)
+
+
+async def export_utterances(
+    output: BinaryIO, filters: UtteranceExportFilter, gzip: bool = False
+) -> None:
+    engine = get_engine()
+    try:
+        async for chunk in iter_utterance_ndjson(engine, filters, gzip=gzip):
+            output.write(chunk)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Export utterances as NDJSON.")
+    parser.add_argument("--since", type=_parse_timestamp, help="inclusive ISO timestamp")
+    parser.add_argument("--until", type=_parse_timestamp, help="exclusive ISO timestamp")
+    parser.add_argument("--status", choices=UTTERANCE_STATUSES)
+    parser.add_argument("--speaker-id")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("--output", default="-", help="file path, or - for stdout")
+    args = parser.parse_args(argv)
+
+    filters = UtteranceExportFilter(
+        since=args.since, until=args.until, status=args.status, speaker_id=args.speaker_id
+    )
+    if args.output == "-":
+        asyncio.run(export_utterances(sys.stdout.buffer, filters, gzip=args.gzip))
+        return
+    with open(args.output, "wb") as output:
+        asyncio.run(export_utterances(output, filters, gzip=args.gzip))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,51 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import UTC, datetime
 
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.db import ping_db
+from app.metrics import render_metrics
+from app.partitions import run_partition_maintenance
+from app.query_stats import QueryStatsMiddleware
 from app.routes import chat as chat_routes
+from app.routes import exports as export_routes
+from app.routes import history as history_routes
+from app.services.chat import run_parked_reply_drain, run_stuck_reply_reaper
+from app.services.llm import close_llm_client
+from app.services.pipeline import shutdown_process_pool
+from app.services.sms import close_sms_client, get_sms_client
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    get_sms_client()
+    stop = asyncio.Event()
+    maintenance = asyncio.create_task(run_partition_maintenance(stop))
+    drain = asyncio.create_task(run_parked_reply_drain(stop))
+    reaper = asyncio.create_task(run_stuck_reply_reaper(stop))
+    try:
+        yield
+    finally:
+        stop.set()
+        await asyncio.gather(maintenance, drain, reaper)
+        await close_sms_client()
+        await close_llm_client()
+        shutdown_process_pool()
+
 
 app = FastAPI(
     title="Texet API",
     version="0.1.0",
     description="Base API scaffold for Texet.",
+    lifespan=lifespan,
 )
+app.add_middleware(QueryStatsMiddleware)
 app.include_router(chat_routes.router)
+app.include_router(history_routes.router)
+app.include_router(export_routes.router)
 
 
 @app.get("/", response_class=JSONResponse)
@@ -37,3 +71,8 @@ async def db_health() -> dict[str, str]:
         raise HTTPException(status_code=503, detail="Database not reachable.") from exc
 
     return {"status": "ok" if ok else "error"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
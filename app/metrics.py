@@ -0,0 +1,201 @@
+"""In-process metrics rendered in the Prometheus text format at /metrics.
+
+Metrics are plain attributes updated from the event loop, so recording a
+sample never takes a lock.
+"""
+
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Sequence
+from types import TracebackType
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Labeled[ChildT]:
+    """Per-label-value children, created on first use and never removed."""
+
+    def __init__(self, labelnames: Sequence[str]) -> None:
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], ChildT] = {}
+
+    def _new_child(self) -> ChildT:
+        raise NotImplementedError
+
+    def labels(self, **values: str | int) -> ChildT:
+        key = tuple(str(values[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self, own: ChildT) -> list[tuple[list[tuple[str, str]], ChildT]]:
+        if not self.labelnames:
+            return [([], own)]
+        return [
+            (list(zip(self.labelnames, key, strict=True)), child)
+            for key, child in self._children.items()
+        ]
+
+
+class Counter(_Labeled["Counter"]):
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(labelnames)
+        self.name = name
+        self.documentation = documentation
+        self.value = 0.0
+
+    def _new_child(self) -> Counter:
+        return Counter(self.name, self.documentation)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        for labels, child in self._samples(self):
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(child.value)}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: Histogram) -> None:
+        self._histogram = histogram
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class Histogram(_Labeled["Histogram"]):
+    """Bucketed observations; counts are stored per bucket and summed at render."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(labelnames)
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self) -> Histogram:
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> _Timer:
+        """Context manager that observes the elapsed wall time of its block."""
+        return _Timer(self)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, child in self._samples(self):
+            cumulative = 0
+            for bound, count in zip(
+                (*self.buckets, float("inf")), child.bucket_counts, strict=True
+            ):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels([*labels, ("le", le)])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            suffix = _format_labels(labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{suffix} {child.count}")
+        return lines
+
+
+class Gauge:
+    """A gauge whose value is read from `source` at scrape time."""
+
+    def __init__(
+        self, name: str, documentation: str, source: Callable[[], float]
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.source = source
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(self.source())}",
+        ]
+
+
+_registry: dict[str, Counter | Gauge | Histogram] = {}
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = _registry.get(name)
+    if not isinstance(metric, Counter):
+        metric = Counter(name, documentation, labelnames)
+        _registry[name] = metric
+    return metric
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    metric = _registry.get(name)
+    if not isinstance(metric, Histogram):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        _registry[name] = metric
+    return metric
+
+
+def gauge(name: str, documentation: str, source: Callable[[], float]) -> Gauge:
+    metric = Gauge(name, documentation, source)
+    _registry[name] = metric
+    return metric
+
+
+def render_metrics() -> str:
+    lines: list[str] = []
+    for metric in _registry.values():
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -4,11 +4,26 @@ import datetime
 import uuid
 from typing import Any
 
-from sqlalchemy import CheckConstraint, DateTime, ForeignKey, Index, String, Text, text
+from sqlalchemy import (
+    CheckConstraint,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    text,
+)
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
-from app.config import UTTERANCE_STATUS_RECEIVED, UTTERANCE_STATUSES_SQL
+from app.config import (
+    UTTERANCE_STATUS_FAILED,
+    UTTERANCE_STATUS_QUEUED,
+    UTTERANCE_STATUS_RECEIVED,
+    UTTERANCE_STATUSES_SQL,
+)
 
 
 def _utcnow() -> datetime.datetime:
@@ -37,6 +52,7 @@ class Conversation(Base):
             unique=True,
             postgresql_where=text("status = 'open'"),
         ),
+        Index("ix_conversations_owner_created", "owner_speaker_id", "created_at", "id"),
     )
 
     id: Mapped[str] = mapped_column(
@@ -53,12 +69,33 @@ class Conversation(Base):
 
 
 class Utterance(Base):
+    """An utterance, stored in a table range-partitioned by month on `timestamp`.
+
+    Postgres requires the partition key in the primary key, so the table key
+    is `(id, timestamp)`; the mapper still identifies rows by `id` alone. For
+    the same reason `reply_to_id` cannot carry a foreign key: replies are
+    written in the same statement as the utterance they answer.
+    See `app.partitions` for partition upkeep and retention.
+    """
+
     __tablename__ = "utterances"
     __table_args__ = (
         CheckConstraint(
             f"status in ({UTTERANCE_STATUSES_SQL})",
             name="ck_utterances_status",
         ),
+        Index("ix_utterances_conversation_timestamp", "conversation_id", "timestamp"),
+        Index("ix_utterances_speaker_timestamp", "speaker_id", "timestamp"),
+        Index("ix_utterances_reply_to_id", "reply_to_id"),
+        Index(
+            "ix_utterances_pending",
+            "status",
+            "timestamp",
+            postgresql_where=text(
+                f"status IN ('{UTTERANCE_STATUS_QUEUED}', '{UTTERANCE_STATUS_FAILED}')"
+            ),
+        ),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
     )
 
     id: Mapped[str] = mapped_column(
@@ -70,15 +107,78 @@ class Utterance(Base):
     speaker_id: Mapped[str] = mapped_column(
         String(128), ForeignKey("speakers.id"), nullable=False
     )
-    reply_to_id: Mapped[str | None] = mapped_column(
-        String(32), ForeignKey("utterances.id"), nullable=True
-    )
+    reply_to_id: Mapped[str | None] = mapped_column(String(32), nullable=True)
     timestamp: Mapped[datetime.datetime] = mapped_column(
-        DateTime(timezone=True), default=_utcnow
+        DateTime(timezone=True), primary_key=True, default=_utcnow
     )
     status: Mapped[str] = mapped_column(
         String(16), default=UTTERANCE_STATUS_RECEIVED, nullable=False
     )
     text: Mapped[str | None] = mapped_column(Text, nullable=True)
     error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    attempts: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
+    available_at: Mapped[datetime.datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
     meta: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True)
+
+    # `attempts` fences ORM writes: a reply claimed again (attempts bumped)
+    # while an earlier run is still going makes that run's flush fail with
+    # `StaleDataError` instead of overwriting the new claim.
+    __mapper_args__ = {
+        "primary_key": [id],
+        "version_id_col": attempts,
+        "version_id_generator": False,
+    }
+
+
+class ReplyCacheEntry(Base):
+    """Shared tier of the exact-match reply cache; see `app.services.reply_cache`."""
+
+    __tablename__ = "reply_cache"
+    __table_args__ = (Index("ix_reply_cache_expires_at", "expires_at"),)
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    reply: Mapped[str] = mapped_column(Text, nullable=False)
+    expires_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+
+
+class ChatIdempotencyKey(Base):
+    """A `/chat` request's idempotency key and the response it was given."""
+
+    __tablename__ = "chat_idempotency_keys"
+    __table_args__ = (Index("ix_chat_idempotency_keys_expires_at", "expires_at"),)
+
+    user_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    conversation_id: Mapped[str] = mapped_column(String(32), nullable=False)
+    reply_utterance_id: Mapped[str] = mapped_column(String(32), nullable=False)
+    expires_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), default=_utcnow, nullable=False
+    )
+
+
+class RateLimitBucket(Base):
+    """Shared token bucket for `/chat` rate limiting; see `app.services.rate_limit`.
+
+    Unlogged: the buckets are throwaway state, and a crash that empties the
+    table only resets every bucket to full.
+    """
+
+    __tablename__ = "rate_limit_buckets"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key: Mapped[str] = mapped_column(String(160), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    rate: Mapped[float] = mapped_column(Float, nullable=False)
+    burst: Mapped[float] = mapped_column(Float, nullable=False)
+    updated_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
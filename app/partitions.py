@@ -0,0 +1,219 @@
+"""Monthly `utterances` partitions: `python -m app.partitions ensure|prune`.
+
+`ensure` creates the partitions for the current month through
+`UTTERANCE_PARTITION_MONTHS_AHEAD` months ahead. The API and the reply worker
+also run it every `UTTERANCE_PARTITION_CHECK_SECONDS`. `prune` detaches and
+drops the partitions that are older than `UTTERANCE_RETENTION_MONTHS`. It only
+runs when you invoke it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import logging
+import re
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.config import (
+    get_utterance_partition_check_seconds,
+    get_utterance_partition_months_ahead,
+    get_utterance_retention_months,
+)
+from app.db import get_engine
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "utterances"
+DEFAULT_PARTITION = "utterances_default"
+PARTITION_LOCK_KEY = 0x7465786574
+_PARTITION_NAME = re.compile(r"^utterances_p(\d{4})_(\d{2})$")
+
+
+def _month_start(value: datetime.datetime | datetime.date) -> datetime.date:
+    return datetime.date(value.year, value.month, 1)
+
+
+def _add_months(value: datetime.date, months: int) -> datetime.date:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"utterances_p{month:%Y_%m}"
+
+
+def _bound(month: datetime.date) -> str:
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+async def _lock(connection: AsyncConnection) -> None:
+    await connection.execute(
+        text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY}
+    )
+
+
+async def _partition_months(connection: AsyncConnection) -> dict[str, datetime.date]:
+    result = await connection.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :parent"
+        ),
+        {"parent": PARENT_TABLE},
+    )
+    months = {}
+    for name in result.scalars():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months[name] = datetime.date(int(match[1]), int(match[2]), 1)
+    return months
+
+
+async def _create_partition(connection: AsyncConnection, month: datetime.date) -> None:
+    name = partition_name(month)
+    lower, upper = _bound(month), _bound(_add_months(month, 1))
+    stray = await connection.execute(
+        text(
+            f"SELECT 1 FROM {DEFAULT_PARTITION} "
+            f"WHERE timestamp >= {lower} AND timestamp < {upper} LIMIT 1"
+        )
+    )
+    if stray.first() is None:
+        await connection.execute(
+            text(
+                f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ({lower}) TO ({upper})"
+            )
+        )
+        return
+
+    # Postgres refuses a new partition while the default partition holds rows
+    # in its range, so build the table, move those rows over, then attach it.
+    await connection.execute(
+        text(
+            f"CREATE TABLE {name} "
+            f"(LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+    )
+    await connection.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            f"WHERE timestamp >= {lower} AND timestamp < {upper} RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        )
+    )
+    await connection.execute(
+        text(
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ({lower}) TO ({upper})"
+        )
+    )
+
+
+async def ensure_utterance_partitions(
+    connection: AsyncConnection,
+    months_ahead: int | None = None,
+    now: datetime.datetime | None = None,
+) -> list[str]:
+    """Create missing partitions from this month through `months_ahead` months.
+
+    Runs in the caller's transaction under an advisory lock, so concurrent API
+    and worker processes do not race. Returns the partitions it created.
+    """
+    if months_ahead is None:
+        months_ahead = get_utterance_partition_months_ahead()
+    first = _month_start(now or datetime.datetime.now(datetime.UTC))
+
+    await _lock(connection)
+    existing = set((await _partition_months(connection)).values())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _add_months(first, offset)
+        if month in existing:
+            continue
+        await _create_partition(connection, month)
+        created.append(partition_name(month))
+    return created
+
+
+async def drop_expired_utterance_partitions(
+    connection: AsyncConnection,
+    retention_months: int | None = None,
+    detach_only: bool = False,
+    now: datetime.datetime | None = None,
+) -> list[str]:
+    """Detach, and unless `detach_only` drop, partitions past retention.
+
+    A partition expires once its whole month is older than `retention_months`
+    full months before the current one. A retention of 0 keeps everything.
+    The default partition is never touched. Returns the affected partitions.
+    """
+    if retention_months is None:
+        retention_months = get_utterance_retention_months()
+    if retention_months <= 0:
+        return []
+    current = _month_start(now or datetime.datetime.now(datetime.UTC))
+    cutoff = _add_months(current, -retention_months)
+
+    await _lock(connection)
+    expired = sorted(
+        name for name, month in (await _partition_months(connection)).items() if month < cutoff
+    )
+    for name in expired:
+        await connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        if not detach_only:
+            await connection.execute(text(f"DROP TABLE {name}"))
+    return expired
+
+
+async def run_partition_maintenance(
+    stop: asyncio.Event, engine: AsyncEngine | None = None
+) -> None:
+    """Keep future partitions in place until `stop` is set."""
+    interval = get_utterance_partition_check_seconds()
+    while not stop.is_set():
+        try:
+            async with (engine or get_engine()).begin() as connection:
+                created = await ensure_utterance_partitions(connection)
+            if created:
+                logger.info("Created utterance partitions: %s", ", ".join(created))
+        except Exception:
+            logger.exception("Failed to ensure utterance partitions.")
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+
+
+async def _run(command: str, detach_only: bool) -> list[str]:
+    engine = get_engine()
+    try:
+        async with engine.begin() as connection:
+            if command == "ensure":
+                return await ensure_utterance_partitions(connection)
+            return await drop_expired_utterance_partitions(connection, detach_only=detach_only)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage monthly utterance partitions.")
+    parser.add_argument("command", choices=["ensure", "prune"])
+    parser.add_argument(
+        "--detach-only",
+        action="store_true",
+        help="prune: detach expired partitions but keep their tables",
+    )
+    args = parser.parse_args(argv)
+
+    names = asyncio.run(_run(args.command, args.detach_only))
+    verb = "Created" if args.command == "ensure" else "Detached" if args.detach_only else "Dropped"
+    print(f"{verb} {len(names)} partition(s){': ' + ', '.join(names) if names else '.'}")
+
+
+if __name__ == "__main__":
+    main()
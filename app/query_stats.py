@@ -0,0 +1,172 @@
+"""Per-request and per-job SQL statement counts, hooked into SQLAlchemy engine events.
+
+`track_queries` opens a scope in the current context. Every statement any
+engine runs inside that scope is counted and timed. `QueryStatsMiddleware`
+opens one scope per HTTP request and closes it once the response is sent, so
+background tasks run after it are not counted; each deferred reply opens its
+own.
+Scopes over `DB_QUERY_WARN_STATEMENTS`, or that repeat one statement
+`DB_QUERY_WARN_REPEATS` times (the usual N+1 shape), are logged.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import (
+    get_db_query_debug_headers_enabled,
+    get_db_query_warn_repeats,
+    get_db_query_warn_statements,
+)
+
+logger = logging.getLogger(__name__)
+
+_START_TIMES_KEY = "texet_query_start_times"
+
+_current: ContextVar[QueryStats | None] = ContextVar("texet_query_stats", default=None)
+
+
+@dataclass
+class QueryStats:
+    scope: str
+    count: int = 0
+    seconds: float = 0.0
+    repeats: dict[str, int] = field(default_factory=dict)
+    statements: list[str] | None = None
+    closed: bool = False
+
+    def most_repeated(self) -> tuple[str, int] | None:
+        if not self.repeats:
+            return None
+        return max(self.repeats.items(), key=lambda item: item[1])
+
+
+def _before_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    stats = _current.get()
+    if stats is None:
+        return
+    if not stats.closed:
+        stats.count += 1
+        stats.repeats[statement] = stats.repeats.get(statement, 0) + 1
+        if stats.statements is not None:
+            stats.statements.append(statement)
+    conn.info.setdefault(_START_TIMES_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    stats = _current.get()
+    start_times = conn.info.get(_START_TIMES_KEY)
+    if stats is not None and start_times:
+        elapsed = time.perf_counter() - start_times.pop()
+        if not stats.closed:
+            stats.seconds += elapsed
+
+
+def _handle_error(exception_context: Any) -> None:
+    connection = exception_context.connection
+    start_times = connection.info.get(_START_TIMES_KEY) if connection is not None else None
+    if _current.get() is not None and start_times:
+        start_times.pop()
+
+
+def install() -> None:
+    """Attach the counters to every engine; safe to call more than once."""
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def track_queries(scope: str, record: bool = False) -> Iterator[QueryStats]:
+    """Count statements run in this context until the block exits.
+
+    Scopes do not nest: an inner scope's statements are not added to the
+    outer one. With `record`, the statement texts are kept in order.
+    """
+    stats = QueryStats(scope=scope, statements=[] if record else None)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def log_query_stats(stats: QueryStats) -> None:
+    if stats.count > get_db_query_warn_statements():
+        logger.warning(
+            "%s issued %d SQL statements (%.1f ms).",
+            stats.scope,
+            stats.count,
+            stats.seconds * 1000,
+        )
+    repeated = stats.most_repeated()
+    if repeated and repeated[1] >= get_db_query_warn_repeats():
+        statement, times = repeated
+        logger.warning(
+            "%s ran the same SQL statement %d times (possible N+1): %s",
+            stats.scope,
+            times,
+            " ".join(statement.split())[:200],
+        )
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[QueryStats]:
+    """Test helper: fail if the block runs more than `limit` SQL statements."""
+    with track_queries("assert_max_queries", record=True) as stats:
+        yield stats
+    if stats.count > limit:
+        listing = "\n".join(f"  {statement}" for statement in stats.statements or [])
+        raise AssertionError(
+            f"Expected at most {limit} SQL statements, ran {stats.count}:\n{listing}"
+        )
+
+
+class QueryStatsMiddleware:
+    """Counts statements per HTTP request; adds `X-DB-*` headers in debug mode."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        debug_headers = get_db_query_debug_headers_enabled()
+        with track_queries(f"{scope['method']} {scope['path']}") as stats:
+
+            async def _send(message: Message) -> None:
+                if debug_headers and message["type"] == "http.response.start":
+                    headers = [
+                        *message.get("headers", []),
+                        (b"x-db-statements", str(stats.count).encode()),
+                        (b"x-db-time-ms", f"{stats.seconds * 1000:.1f}".encode()),
+                    ]
+                    message = {**message, "headers": headers}
+                await send(message)
+                if message["type"] == "http.response.body" and not message.get("more_body"):
+                    # Background tasks run after this in the same context.
+                    stats.closed = True
+
+            await self.app(scope, receive, _send)
+        log_query_stats(stats)
+
+
+install()
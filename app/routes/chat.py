@@ -1,14 +1,32 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, status
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth import require_auth
 from app.db import get_async_session
-from app.schemas import ChatQueuedResponse, ChatRequest
-from app.services.chat import process_chat
+from app.schemas import ChatBatchRequest, ChatBatchResponse, ChatQueuedResponse, ChatRequest
+from app.services.backpressure import ReplyBacklogFullError
+from app.services.chat import process_chat, process_chat_batch
+from app.services.rate_limit import RateLimitedError
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
+def _backlog_full(exc: ReplyBacklogFullError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(exc),
+        headers={"Retry-After": str(exc.retry_after_seconds)},
+    )
+
+
+def _rate_limited(exc: RateLimitedError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(exc),
+        headers={"Retry-After": str(exc.retry_after_seconds)},
+    )
+
+
 @router.post(
     "",
     response_model=ChatQueuedResponse,
@@ -19,5 +37,30 @@ async def chat(
     payload: ChatRequest,
     background_tasks: BackgroundTasks,
     session: AsyncSession = Depends(get_async_session),
+    idempotency_key: str | None = Header(
+        default=None, alias="Idempotency-Key", min_length=1, max_length=255
+    ),
 ) -> ChatQueuedResponse:
-    return await process_chat(session, payload, background_tasks)
+    try:
+        return await process_chat(session, payload, background_tasks, idempotency_key)
+    except RateLimitedError as exc:
+        raise _rate_limited(exc) from exc
+    except ReplyBacklogFullError as exc:
+        raise _backlog_full(exc) from exc
+
+
+@router.post(
+    "/batch",
+    response_model=ChatBatchResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(require_auth)],
+)
+async def chat_batch(
+    payload: ChatBatchRequest,
+    background_tasks: BackgroundTasks,
+    session: AsyncSession = Depends(get_async_session),
+) -> ChatBatchResponse:
+    try:
+        return await process_chat_batch(session, payload, background_tasks)
+    except ReplyBacklogFullError as exc:
+        raise _backlog_full(exc) from exc
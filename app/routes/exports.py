@@ -0,0 +1,39 @@
+import datetime
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import require_auth
+from app.config import UTTERANCE_STATUSES
+from app.db import get_async_session, get_session_engine
+from app.services.export import UtteranceExportFilter, iter_utterance_ndjson
+
+router = APIRouter(prefix="/exports", tags=["exports"], dependencies=[Depends(require_auth)])
+
+# Any stored status, as in the CLI's `--status` choices.
+_Status = Query(None, pattern=f"^({'|'.join(UTTERANCE_STATUSES)})$")
+
+
+@router.get("/utterances", response_class=StreamingResponse)
+async def export_utterances(
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    status: str | None = _Status,
+    speaker_id: str | None = None,
+    gzip: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+) -> StreamingResponse:
+    # The stream opens its own connection: the request session is closed
+    # before the response body finishes.
+    filters = UtteranceExportFilter(
+        since=since, until=until, status=status, speaker_id=speaker_id
+    )
+    body = iter_utterance_ndjson(get_session_engine(session), filters, gzip=gzip)
+    if gzip:
+        return StreamingResponse(
+            body,
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="utterances.ndjson.gz"'},
+        )
+    return StreamingResponse(body, media_type="application/x-ndjson")
@@ -0,0 +1,58 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import require_auth
+from app.config import HISTORY_PAGE_DEFAULT_LIMIT, HISTORY_PAGE_MAX_LIMIT
+from app.db import get_async_session
+from app.schemas import ConversationPage, UtterancePage
+from app.services.history import (
+    InvalidCursorError,
+    get_conversation_page,
+    get_utterance_page,
+)
+
+router = APIRouter(tags=["history"], dependencies=[Depends(require_auth)])
+
+_Limit = Query(HISTORY_PAGE_DEFAULT_LIMIT, ge=1, le=HISTORY_PAGE_MAX_LIMIT)
+
+
+@router.get("/conversations/{conversation_id}/utterances", response_model=UtterancePage)
+async def conversation_utterances(
+    conversation_id: str,
+    limit: int = _Limit,
+    cursor: str | None = None,
+    order: Literal["asc", "desc"] = "asc",
+    session: AsyncSession = Depends(get_async_session),
+) -> UtterancePage:
+    try:
+        page = await get_utterance_page(
+            session, conversation_id, limit, cursor=cursor, descending=order == "desc"
+        )
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    if page is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Conversation not found."
+        )
+    return page
+
+
+@router.get("/speakers/{speaker_id}/conversations", response_model=ConversationPage)
+async def speaker_conversations(
+    speaker_id: str,
+    limit: int = _Limit,
+    cursor: str | None = None,
+    order: Literal["asc", "desc"] = "asc",
+    session: AsyncSession = Depends(get_async_session),
+) -> ConversationPage:
+    try:
+        page = await get_conversation_page(
+            session, speaker_id, limit, cursor=cursor, descending=order == "desc"
+        )
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+    if page is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Speaker not found.")
+    return page
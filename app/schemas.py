@@ -1,8 +1,9 @@
-from typing import Literal
+import datetime
+from typing import Any, Literal
 
 from pydantic import BaseModel, ConfigDict, Field
 
-from app.config import MESSAGE_MAX_LENGTH, MESSAGE_MIN_LENGTH
+from app.config import CHAT_BATCH_MAX_ITEMS, MESSAGE_MAX_LENGTH, MESSAGE_MIN_LENGTH
 
 
 class MessagePayload(BaseModel):
@@ -16,15 +17,76 @@ class MessagePayload(BaseModel):
 
 
 class ChatRequest(MessagePayload):
-    pass
+    # The provider's ID for the inbound message; retries of a webhook reuse it.
+    provider_message_id: str | None = Field(default=None, min_length=1, max_length=255)
+
+
+class ChatBatchRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    # Items are validated one by one so a bad message only fails its own slot.
+    messages: list[Any] = Field(min_length=1, max_length=CHAT_BATCH_MAX_ITEMS)
 
 
 class SmsOutboundRequest(MessagePayload):
     pass
 
 
+class SmsBulkOutboundRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    messages: list[SmsOutboundRequest]
+
+
+class SmsBulkResult(BaseModel):
+    status: Literal["sent", "failed"]
+    error: str | None = None
+
+
+class SmsBulkOutboundResponse(BaseModel):
+    results: list[SmsBulkResult]
+
+
 class ChatQueuedResponse(BaseModel):
     model_config = ConfigDict(extra="forbid")
     conversation_id: str
     reply_utterance_id: str
     status: Literal["queued"]
+
+
+class ChatBatchItemError(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    status: Literal["invalid", "rate_limited"]
+    errors: list[str]
+    retry_after_seconds: int | None = None
+
+
+class ChatBatchResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    results: list[ChatQueuedResponse | ChatBatchItemError]
+
+
+class UtteranceItem(BaseModel):
+    id: str
+    speaker_id: str
+    reply_to_id: str | None
+    timestamp: datetime.datetime
+    status: str
+    text: str | None
+    error: str | None
+
+
+class UtterancePage(BaseModel):
+    items: list[UtteranceItem]
+    next_cursor: str | None
+
+
+class ConversationItem(BaseModel):
+    id: str
+    status: str
+    created_at: datetime.datetime
+    last_activity_at: datetime.datetime
+
+
+class ConversationPage(BaseModel):
+    items: list[ConversationItem]
+    next_cursor: str | None
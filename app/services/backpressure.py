@@ -0,0 +1,95 @@
+"""Admission control and bounded concurrency for in-process deferred replies."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import ParamSpec
+
+from app import metrics
+from app.config import (
+    get_reply_max_backlog,
+    get_reply_max_concurrency,
+    get_reply_retry_after_seconds,
+)
+
+P = ParamSpec("P")
+
+
+class ReplyBacklogFullError(Exception):
+    def __init__(self, retry_after_seconds: int) -> None:
+        super().__init__("Reply backlog is full.")
+        self.retry_after_seconds = retry_after_seconds
+
+
+class ReplyLimiter:
+    """Caps running replies at `max_concurrency` and admitted ones at `max_backlog`.
+
+    `pending` counts admitted replies waiting for a slot; `in_flight` counts
+    running ones. Admission is checked before any DB write, so a full backlog
+    rejects the request instead of growing memory without bound.
+    """
+
+    def __init__(self, max_concurrency: int, max_backlog: int) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_backlog = max_backlog
+        self.pending = 0
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def admit(self, count: int = 1) -> None:
+        if self.pending + self.in_flight + count > self.max_backlog:
+            _rejected.inc(count)
+            raise ReplyBacklogFullError(get_reply_retry_after_seconds())
+        self.pending += count
+
+    def release(self, count: int = 1) -> None:
+        """Return admissions that will never run (e.g. the ingest failed)."""
+        self.pending -= count
+
+    async def run(
+        self,
+        reply: Callable[P, Awaitable[None]],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> None:
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.pending -= 1
+        self.in_flight += 1
+        try:
+            await reply(*args, **kwargs)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+
+_limiter: ReplyLimiter | None = None
+_limiter_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_reply_limiter() -> ReplyLimiter:
+    global _limiter, _limiter_loop
+    loop = asyncio.get_running_loop()
+    if _limiter is None or _limiter_loop is not loop:
+        _limiter = ReplyLimiter(get_reply_max_concurrency(), get_reply_max_backlog())
+        _limiter_loop = loop
+    return _limiter
+
+
+def _current(attribute: str) -> Callable[[], float]:
+    return lambda: getattr(_limiter, attribute, 0)
+
+
+_rejected = metrics.counter(
+    "texet_reply_rejected_total", "Replies rejected because the backlog was full."
+)
+metrics.gauge(
+    "texet_reply_in_flight", "Deferred replies currently running.", _current("in_flight")
+)
+metrics.gauge(
+    "texet_reply_pending",
+    "Deferred replies admitted and waiting for a slot.",
+    _current("pending"),
+)
@@ -1,11 +1,18 @@
+import asyncio
+import contextlib
+import datetime
+import logging
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from contextvars import ContextVar
+from typing import Any
+
 from fastapi import BackgroundTasks
-from sqlalchemy.ext.asyncio import (
-    AsyncConnection,
-    AsyncEngine,
-    AsyncSession,
-    async_sessionmaker,
-)
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
 
+from app import metrics
 from app.config import (
     MESSAGE_MAX_LENGTH,
     MESSAGE_MIN_LENGTH,
@@ -13,21 +20,110 @@ from app.config import (
     UTTERANCE_STATUS_QUEUED,
     UTTERANCE_STATUS_RECEIVED,
     UTTERANCE_STATUS_SENT,
+    UTTERANCE_STATUS_SUPERSEDED,
+    get_idempotency_key_ttl_seconds,
+    get_llm_stream_url,
+    get_reply_coalesce_window_ms,
+    get_reply_dispatch_mode,
+    get_reply_lease_seconds,
+    get_reply_max_attempts,
+    get_reply_max_concurrency,
+    get_reply_reaper_batch_size,
+    get_reply_reaper_interval_seconds,
+    get_reply_stuck_after_seconds,
+    get_semantic_cache_enabled,
+    get_sms_circuit_reset_seconds,
+    get_sms_segment_max_chars,
 )
-from app.db import get_sessionmaker
+from app.db import get_session_engine, get_sessionmaker
 from app.db_ops import (
-    create_pending_utterance,
-    create_utterance,
-    get_or_create_bot_speaker,
-    get_or_create_conversation,
-    get_or_create_speaker,
+    ChatIngest,
+    ContextTurn,
+    ContextWrite,
+    ReplyJob,
+    claim_chat_idempotency_key,
+    claim_reply_jobs,
+    coalesce_reply,
+    delete_expired_chat_idempotency_keys,
+    get_chat_idempotency_key,
+    ingest_chat_message,
+    ingest_chat_messages,
+    stage_context_write,
 )
 from app.models import Utterance
-from app.schemas import ChatQueuedResponse, ChatRequest, SmsOutboundRequest
-from app.services.sms import send_sms
+from app.query_stats import log_query_stats, track_queries
+from app.schemas import (
+    ChatBatchItemError,
+    ChatBatchRequest,
+    ChatBatchResponse,
+    ChatQueuedResponse,
+    ChatRequest,
+    MessagePayload,
+    SmsOutboundRequest,
+)
+from app.services.backpressure import ReplyLimiter, get_reply_limiter
+from app.services.context import load_reply_context, reset_reply_context, set_reply_context
+from app.services.llm import stream_reply
+from app.services.ordering import conversation_lock, conversation_turn, get_conversation_turns
+from app.services.pipeline import Check, ReplyPipeline, Stage
+from app.services.rate_limit import get_rate_limiter
+from app.services.reply_cache import cached_generate, cached_stream
+from app.services.sms import (
+    SmsDelivery,
+    SmsUnavailableError,
+    get_sms_circuit,
+    record_sms_delivery,
+    send_sms,
+)
+from app.services.trace import ReplyTrace
+
+logger = logging.getLogger(__name__)
 
 ERROR_MAX_CHARS = 500
 
+# Expired idempotency keys are swept at most this often per process, in batches.
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = 60.0
+IDEMPOTENCY_PURGE_BATCH = 1000
+
+_reply_seconds = metrics.histogram(
+    "texet_reply_end_to_end_seconds",
+    "Time from an inbound message being stored to its reply being sent.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+_status_transitions = metrics.counter(
+    "texet_utterance_status_transitions_total",
+    "Utterance status changes; `from_status` is `new` for inserted rows.",
+    ["from_status", "to_status"],
+)
+
+_parked = metrics.counter(
+    "texet_reply_parked_total",
+    "Generated replies left queued because the SMS gateway was unavailable.",
+)
+_reaped = metrics.counter(
+    "texet_reply_reaped_total",
+    "Stuck queued replies run again, by whether their text had been generated.",
+    ["kind"],
+)
+_idempotent_replays = metrics.counter(
+    "texet_chat_idempotent_replays_total",
+    "/chat requests answered from an existing idempotency key without new work.",
+)
+_last_idempotency_purge = 0.0
+
+
+class _IdempotencyKeyTaken(Exception):
+    """Another request claimed the key first; undoes this request's ingest."""
+
+
+def _record_transition(from_status: str, to_status: str, count: int = 1) -> None:
+    _status_transitions.labels(from_status=from_status, to_status=to_status).inc(count)
+
+
+def _record_ingest(count: int) -> None:
+    _record_transition("new", UTTERANCE_STATUS_RECEIVED, count)
+    _record_transition("new", UTTERANCE_STATUS_QUEUED, count)
+
 
 def _ingest_message(message: str) -> str:
     return message.strip()
@@ -37,6 +133,25 @@ async def _generate_reply(message: str) -> str:
     return f"echo:{message}"
 
 
+# The running reply job's sessionmaker, for stages that read shared state.
+_reply_sessionmaker: ContextVar[async_sessionmaker[AsyncSession] | None] = ContextVar(
+    "texet_reply_sessionmaker", default=None
+)
+
+
+async def _generate_semantic_reply(message: str) -> str:
+    try:
+        from app.services.semantic_cache import semantic_generate
+    except ImportError as exc:
+        raise RuntimeError("SEMANTIC_CACHE_ENABLED requires the `semantic` extra.") from exc
+    return await semantic_generate(message, _generate_reply)
+
+
+async def _generate_cached_reply(message: str) -> str:
+    generate = _generate_semantic_reply if get_semantic_cache_enabled() else _generate_reply
+    return await cached_generate(message, generate, _reply_sessionmaker.get())
+
+
 def _contribute_reply(message: str) -> str:
     return message.strip()
 
@@ -49,28 +164,57 @@ def _qa_reply(message: str) -> str:
     return message
 
 
-async def _run_pipeline(message: str) -> str:
-    try:
-        ingested = _ingest_message(message)
-    except Exception as exc:
-        raise RuntimeError(f"pipeline:ingest failed: {exc}") from exc
+_custom_pipeline: ReplyPipeline | None = None
 
-    try:
-        generated = await _generate_reply(ingested)
-    except Exception as exc:
-        raise RuntimeError(f"pipeline:generate failed: {exc}") from exc
 
-    try:
-        contributed = _contribute_reply(generated)
-    except Exception as exc:
-        raise RuntimeError(f"pipeline:contribute failed: {exc}") from exc
+def build_reply_pipeline() -> ReplyPipeline:
+    """The default ingest -> generate -> contribute -> qa pipeline."""
+    return ReplyPipeline(
+        [
+            Stage("ingest", _ingest_message),
+            Stage("generate", _generate_cached_reply, kind="async"),
+            Stage("contribute", _contribute_reply),
+            Stage("qa", checks=(Check("length", _qa_reply),)),
+        ]
+    )
 
-    try:
-        validated = _qa_reply(contributed)
-    except Exception as exc:
-        raise RuntimeError(f"pipeline:qa failed: {exc}") from exc
 
-    return validated
+def set_reply_pipeline(pipeline: ReplyPipeline | None) -> None:
+    """Replace the reply pipeline for this process; None restores the default."""
+    global _custom_pipeline
+    _custom_pipeline = pipeline
+
+
+async def _run_pipeline(message: str, trace: ReplyTrace | None = None) -> str:
+    # The default is rebuilt per call so it always uses this module's current
+    # stage functions.
+    pipeline = _custom_pipeline or build_reply_pipeline()
+    return await pipeline.run(message, trace)
+
+
+async def _stream_pipeline(
+    user_id: str, message: str, sent: list[str], trace: ReplyTrace
+) -> None:
+    """Generate from `LLM_STREAM_URL` and send each segment as soon as it passes QA.
+
+    `sent` collects the delivered segments, so a failure part-way through
+    still records what the user received.
+    """
+    pipeline = _custom_pipeline or build_reply_pipeline()
+
+    async def _send_segment(segment: str) -> None:
+        with trace.measure("sms_ms"):
+            await send_sms(SmsOutboundRequest(user_id=user_id, message=segment))
+        if not sent:
+            trace.record("first_segment_ms", trace.elapsed())
+        sent.append(segment)
+
+    def _stream(text: str) -> AsyncGenerator[str]:
+        return cached_stream(text, stream_reply, _reply_sessionmaker.get())
+
+    await pipeline.run_streaming(
+        message, _stream, _send_segment, get_sms_segment_max_chars(), trace
+    )
 
 
 def _format_error(exc: Exception) -> str:
@@ -78,6 +222,28 @@ def _format_error(exc: Exception) -> str:
     return message[:ERROR_MAX_CHARS]
 
 
+def _reply_meta(
+    meta: dict[str, Any] | None,
+    trace: ReplyTrace,
+    sent_segments: list[str],
+    delivery: SmsDelivery | None = None,
+    parked: bool = False,
+) -> dict[str, Any]:
+    meta = trace.as_meta(meta)
+    if sent_segments:
+        meta["segments_sent"] = len(sent_segments)
+    if delivery is not None and delivery.attempts:
+        # Totals across every run of this reply, parked runs included.
+        sms = {"attempts": meta.get("sms", {}).get("attempts", 0) + delivery.attempts}
+        last_error = delivery.last_error or meta.get("sms", {}).get("last_error")
+        if last_error:
+            sms["last_error"] = last_error[:ERROR_MAX_CHARS]
+        meta["sms"] = sms
+    if parked:
+        meta["sms"] = {**meta.get("sms", {}), "parked": True}
+    return meta
+
+
 async def _fetch_utterance(session: AsyncSession, utterance_id: str) -> Utterance:
     utterance = await session.get(Utterance, utterance_id)
     if not utterance:
@@ -88,13 +254,7 @@ async def _fetch_utterance(session: AsyncSession, utterance_id: str) -> Utteranc
 def _background_sessionmaker(
     session: AsyncSession,
 ) -> async_sessionmaker[AsyncSession]:
-    bind = session.bind
-    if bind is None:
-        return get_sessionmaker()
-    engine = bind.engine if isinstance(bind, AsyncConnection) else bind
-    if not isinstance(engine, AsyncEngine):
-        return get_sessionmaker()
-    return async_sessionmaker(engine, expire_on_commit=False)
+    return async_sessionmaker(get_session_engine(session), expire_on_commit=False)
 
 
 async def _run_deferred_reply(
@@ -102,75 +262,636 @@ async def _run_deferred_reply(
     user_utterance_id: str,
     bot_utterance_id: str,
     sessionmaker: async_sessionmaker[AsyncSession],
+    conversation_id: str | None = None,
+    attempts: int | None = None,
+) -> None:
+    sessionmaker_token = _reply_sessionmaker.set(sessionmaker)
+    context_token = set_reply_context(())
+    try:
+        with track_queries(f"reply {bot_utterance_id}") as query_stats:
+            if conversation_id is None:
+                await _deliver_reply(
+                    user_id, user_utterance_id, bot_utterance_id, sessionmaker, attempts
+                )
+            else:
+                async with conversation_lock(sessionmaker, conversation_id) as locked:
+                    await _deliver_reply(
+                        user_id, user_utterance_id, bot_utterance_id, locked, attempts
+                    )
+    finally:
+        reset_reply_context(context_token)
+        _reply_sessionmaker.reset(sessionmaker_token)
+    log_query_stats(query_stats)
+
+
+async def _deliver_reply(
+    user_id: str,
+    user_utterance_id: str,
+    bot_utterance_id: str,
+    sessionmaker: async_sessionmaker[AsyncSession],
+    attempts: int | None = None,
 ) -> None:
+    """Generate and send one reply, or send the text stored by an earlier run.
+
+    `attempts` is the claim this run holds (the reply's attempt count when it
+    was dispatched). A reply claimed again since then belongs to the newer
+    run: this one stops at its next write instead of sending a second time.
+    Each write before the send also renews the lease.
+    """
+    trace = ReplyTrace()
+    sent_segments: list[str] = []
     async with sessionmaker() as session:
-        try:
-            user_utterance = await _fetch_utterance(session, user_utterance_id)
-            if not user_utterance.text:
-                raise RuntimeError("User utterance text missing.")
+        with record_sms_delivery() as delivery:
+            try:
+                user_utterance = await _fetch_utterance(session, user_utterance_id)
+                message, received_at = user_utterance.text, user_utterance.timestamp
+                trace.record_queue_wait(received_at)
+                bot_utterance = await _fetch_utterance(session, bot_utterance_id)
+                if _claimed_elsewhere(bot_utterance, attempts):
+                    return
+                if attempts is not None:
+                    bot_utterance.available_at = _lease_until()
+                stored_text = bot_utterance.text
+                if stored_text is not None and bot_utterance.status == UTTERANCE_STATUS_QUEUED:
+                    # Generated earlier but never sent (parked while SMS was down,
+                    # or a crash before the send): send the stored text.
+                    outbound = SmsOutboundRequest(user_id=user_id, message=stored_text)
+                    with trace.measure("sms_ms"):
+                        await send_sms(outbound)
+                else:
+                    if not message:
+                        raise RuntimeError("User utterance text missing.")
+                    if get_reply_coalesce_window_ms():
+                        message = await _coalesce_messages(
+                            session, user_utterance, bot_utterance_id
+                        )
+                        if message is None:
+                            return
+                        await session.refresh(bot_utterance)
+                        if _claimed_elsewhere(bot_utterance, attempts):
+                            return
+                    set_reply_context(await load_reply_context(session, user_utterance))
+                    await _generate_and_send(
+                        session, user_id, message, bot_utterance, sent_segments, trace
+                    )
+
+                bot_utterance.status = UTTERANCE_STATUS_SENT
+                bot_utterance.error = None
+                bot_utterance.meta = _reply_meta(bot_utterance.meta, trace, sent_segments, delivery)
+                _stage_reply_turn(session, bot_utterance)
+                await session.commit()
+                _record_transition(UTTERANCE_STATUS_QUEUED, UTTERANCE_STATUS_SENT)
+                _reply_seconds.observe(
+                    (datetime.datetime.now(datetime.UTC) - received_at).total_seconds()
+                )
+            except Exception as exc:
+                await session.rollback()
+                if isinstance(exc, StaleDataError):
+                    logger.warning(
+                        "Reply %s was claimed again while running; leaving it to that run.",
+                        bot_utterance_id,
+                    )
+                    return
+                if isinstance(exc, SmsUnavailableError) and not sent_segments:
+                    await _park_reply(session, bot_utterance_id, exc, trace, delivery, attempts)
+                    return
+                failed_utterance = await session.get(Utterance, bot_utterance_id)
+                if failed_utterance and not _claimed_elsewhere(failed_utterance, attempts):
+                    previous_status = failed_utterance.status
+                    failed_utterance.status = UTTERANCE_STATUS_FAILED
+                    failed_utterance.error = _format_error(exc)
+                    if sent_segments:
+                        failed_utterance.text = "\n".join(sent_segments)
+                    failed_utterance.meta = _reply_meta(
+                        failed_utterance.meta, trace, sent_segments, delivery
+                    )
+                    await session.commit()
+                    _record_transition(previous_status, UTTERANCE_STATUS_FAILED)
+
+
+async def _generate_and_send(
+    session: AsyncSession,
+    user_id: str,
+    message: str,
+    bot_utterance: Utterance,
+    sent_segments: list[str],
+    trace: ReplyTrace,
+) -> None:
+    if get_llm_stream_url():
+        # Return the connection to the pool while the model streams.
+        await session.commit()
+        await _stream_pipeline(user_id, message, sent_segments, trace)
+        bot_utterance.text = "\n".join(sent_segments)
+        return
+
+    reply_text = await _run_pipeline(message, trace)
+    bot_utterance.text = reply_text
+    bot_utterance.status = UTTERANCE_STATUS_QUEUED
+    bot_utterance.error = None
+    if bot_utterance.available_at is not None:
+        bot_utterance.available_at = _lease_until()
+    # Committed before sending, so a reply the gateway cannot take yet is kept.
+    with trace.measure("db_commit_ms"):
+        await session.commit()
+
+    outbound = SmsOutboundRequest(user_id=user_id, message=reply_text)
+    with trace.measure("sms_ms"):
+        await send_sms(outbound)
+
+
+async def _park_reply(
+    session: AsyncSession,
+    bot_utterance_id: str,
+    exc: SmsUnavailableError,
+    trace: ReplyTrace,
+    delivery: SmsDelivery,
+    attempts: int | None = None,
+) -> None:
+    """Leave a reply the gateway could not take queued until it is back.
+
+    A worker, or `run_parked_reply_drain` in the API, claims it again once
+    `available_at` passes.
+    """
+    utterance = await session.get(Utterance, bot_utterance_id)
+    if not utterance or _claimed_elsewhere(utterance, attempts):
+        return
+    utterance.status = UTTERANCE_STATUS_QUEUED
+    utterance.error = _format_error(exc)
+    utterance.available_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(
+        seconds=exc.retry_after_seconds
+    )
+    if not exc.attempted:
+        # The gateway was never called: waiting out an outage uses up no attempt.
+        utterance.attempts = max(0, utterance.attempts - 1)
+    utterance.meta = _reply_meta(utterance.meta, trace, [], delivery, parked=True)
+    await session.commit()
+    _parked.inc()
+
+
+async def _coalesce_messages(
+    session: AsyncSession, user_utterance: Utterance, bot_utterance_id: str
+) -> str | None:
+    """Wait out the debounce window, then the burst this reply answers.
+
+    None when a reply to a later message covers it (it is now `superseded`)
+    or it is no longer pending.
+    """
+    # Hold no connection during the window.
+    await session.commit()
+    window = datetime.timedelta(milliseconds=get_reply_coalesce_window_ms())
+    delay = user_utterance.timestamp + window - datetime.datetime.now(datetime.UTC)
+    if delay > datetime.timedelta(0):
+        await asyncio.sleep(delay.total_seconds())
+    coalesced = await coalesce_reply(session, user_utterance, bot_utterance_id)
+    await session.commit()
+    if coalesced.superseded:
+        _record_transition(
+            UTTERANCE_STATUS_QUEUED, UTTERANCE_STATUS_SUPERSEDED, coalesced.superseded
+        )
+    if not coalesced.messages:
+        return None
+    return "\n".join(coalesced.messages)
+
+
+def _claimed_elsewhere(utterance: Utterance, attempts: int | None) -> bool:
+    if attempts is None or utterance.attempts == attempts:
+        return False
+    logger.warning(
+        "Reply %s was claimed again (attempt %s, this run holds %s); skipping it.",
+        utterance.id,
+        utterance.attempts,
+        attempts,
+    )
+    return True
 
-            reply_text = await _run_pipeline(user_utterance.text)
 
-            bot_utterance = await _fetch_utterance(session, bot_utterance_id)
-            bot_utterance.text = reply_text
-            bot_utterance.status = UTTERANCE_STATUS_QUEUED
-            bot_utterance.error = None
-            await session.commit()
+def _stage_reply_turn(session: AsyncSession, bot_utterance: Utterance) -> None:
+    if bot_utterance.text:
+        turn = ContextTurn(
+            bot_utterance.id, bot_utterance.speaker_id, bot_utterance.text, bot_utterance.timestamp
+        )
+        stage_context_write(session, ContextWrite(bot_utterance.conversation_id, turn))
 
-            outbound = SmsOutboundRequest(user_id=user_id, message=reply_text)
-            await send_sms(outbound)
 
-            bot_utterance.status = UTTERANCE_STATUS_SENT
-            bot_utterance.error = None
-            await session.commit()
-        except Exception as exc:
-            await session.rollback()
-            failed_utterance = await session.get(Utterance, bot_utterance_id)
-            if failed_utterance:
-                failed_utterance.status = UTTERANCE_STATUS_FAILED
-                failed_utterance.error = _format_error(exc)
+async def run_reply_job(
+    job: ReplyJob,
+    sessionmaker: async_sessionmaker[AsyncSession],
+) -> None:
+    """Run a claimed reply after the conversation's earlier replies in this process."""
+    async with conversation_turn(job.conversation_id, job.bot_utterance_id):
+        await _run_reply_job(job, sessionmaker)
+
+
+async def _run_reply_job(
+    job: ReplyJob,
+    sessionmaker: async_sessionmaker[AsyncSession],
+) -> None:
+    max_attempts = get_reply_max_attempts()
+    if job.attempts > max_attempts:
+        async with sessionmaker() as session:
+            utterance = await session.get(Utterance, job.bot_utterance_id)
+            if utterance and utterance.status == UTTERANCE_STATUS_QUEUED:
+                utterance.status = UTTERANCE_STATUS_FAILED
+                utterance.error = f"Reply abandoned after {max_attempts} attempts."
                 await session.commit()
+                _record_transition(UTTERANCE_STATUS_QUEUED, UTTERANCE_STATUS_FAILED)
+        return
 
+    await _run_deferred_reply(
+        job.user_id,
+        job.user_utterance_id,
+        job.bot_utterance_id,
+        sessionmaker,
+        job.conversation_id,
+        job.attempts,
+    )
 
-async def process_chat(
+
+async def _run_in_turn(
+    job: ReplyJob,
+    sessionmaker: async_sessionmaker[AsyncSession],
+    limiter: ReplyLimiter,
+) -> None:
+    """Run a dispatched reply once the conversation's earlier replies are done.
+
+    The turn is awaited before taking a limiter slot, so replies waiting on
+    each other never hold the slots the earlier ones need.
+    """
+    waiting = True
+    try:
+        async with conversation_turn(job.conversation_id, job.bot_utterance_id):
+            waiting = False
+            await limiter.run(_run_reply_job, job, sessionmaker)
+    finally:
+        if waiting:
+            limiter.release()
+
+
+def _dispatch_replies(
+    jobs: list[ReplyJob],
     session: AsyncSession,
-    payload: ChatRequest,
     background_tasks: BackgroundTasks,
-) -> ChatQueuedResponse:
-    async with session.begin():
-        speaker = await get_or_create_speaker(
-            session, payload.user_id, meta={"type": "user"}
-        )
-        bot = await get_or_create_bot_speaker(session, payload.user_id)
+    limiter: ReplyLimiter,
+) -> None:
+    # Reserve turns now, in message order; the tasks may start in any order.
+    turns = get_conversation_turns()
+    for job in jobs:
+        turns.reserve(job.conversation_id, job.bot_utterance_id)
+    background_tasks.add_task(
+        _run_deferred_replies, jobs, _background_sessionmaker(session), limiter
+    )
 
-        conversation = await get_or_create_conversation(session, speaker.id)
 
-        user_utterance = await create_utterance(
-            session,
-            conversation.id,
-            speaker.id,
-            payload.message,
-            status=UTTERANCE_STATUS_RECEIVED,
+async def _run_deferred_replies(
+    jobs: list[ReplyJob],
+    sessionmaker: async_sessionmaker[AsyncSession],
+    limiter: ReplyLimiter,
+) -> None:
+    """Run replies concurrently; each conversation's replies run in order."""
+    await asyncio.gather(*(_run_in_turn(job, sessionmaker, limiter) for job in jobs))
+
+
+async def drain_parked_replies(sessionmaker: async_sessionmaker[AsyncSession]) -> int:
+    """Claim parked replies that are due and send them; returns how many were claimed.
+
+    Nothing is claimed while the SMS circuit is open. Until it has closed
+    again, one reply at a time goes out as the probe.
+    """
+    circuit = get_sms_circuit()
+    if circuit.retry_after():
+        return 0
+    limit = get_reply_max_concurrency() if circuit.state == "closed" else 1
+    async with sessionmaker() as session, session.begin():
+        jobs = await claim_reply_jobs(
+            session, limit, get_reply_lease_seconds(), parked=True
         )
-
-        bot_utterance = await create_pending_utterance(
-            session,
-            conversation.id,
-            bot.id,
-            reply_to_id=user_utterance.id,
+    turns = get_conversation_turns()
+    for job in jobs:
+        turns.reserve(job.conversation_id, job.bot_utterance_id)
+    await asyncio.gather(*(run_reply_job(job, sessionmaker) for job in jobs))
+    return len(jobs)
+
+
+async def reap_stuck_replies(sessionmaker: async_sessionmaker[AsyncSession]) -> int:
+    """Run again the replies a dead process left `queued`; returns how many were claimed.
+
+    A reply is stuck once it is `REPLY_STUCK_AFTER_SECONDS` old and its lease
+    has run out. Parked replies are left to `drain_parked_replies`. A sweep
+    claims at most `REPLY_REAPER_BATCH_SIZE` replies, and no more than the
+    reply backlog has room for. Replies never generated run the whole
+    pipeline; generated but unsent ones are only sent. Replies this process
+    is still running or waiting to run are never claimed, whatever their
+    lease says.
+    """
+    limiter = get_reply_limiter()
+    limit = min(
+        get_reply_reaper_batch_size(),
+        limiter.max_backlog - limiter.pending - limiter.in_flight,
+    )
+    if limit < 1:
+        return 0
+    limiter.admit(limit)
+    jobs: list[ReplyJob] = []
+    try:
+        stuck_before = datetime.datetime.now(datetime.UTC) - datetime.timedelta(
+            seconds=get_reply_stuck_after_seconds()
         )
+        async with sessionmaker() as session, session.begin():
+            jobs = await claim_reply_jobs(
+                session,
+                limit,
+                get_reply_lease_seconds(),
+                parked=False,
+                received_before=stuck_before,
+                exclude_ids=get_conversation_turns().tokens(),
+            )
+    finally:
+        limiter.release(limit - len(jobs))
+    if not jobs:
+        return 0
+    generated = sum(job.generated for job in jobs)
+    _reaped.labels(kind="undelivered").inc(generated)
+    _reaped.labels(kind="ungenerated").inc(len(jobs) - generated)
+    logger.warning(
+        "Re-running %s stuck replies (%s generated but not sent).", len(jobs), generated
+    )
+    turns = get_conversation_turns()
+    for job in jobs:
+        turns.reserve(job.conversation_id, job.bot_utterance_id)
+    await _run_deferred_replies(jobs, sessionmaker, limiter)
+    return len(jobs)
+
+
+async def _sweep_until_stopped(
+    stop: asyncio.Event,
+    interval: float,
+    sweep: Callable[[], Awaitable[bool]],
+    description: str,
+) -> None:
+    """Call `sweep` every `interval` seconds, straight away again while it reports more work."""
+    while not stop.is_set():
+        try:
+            if await sweep():
+                continue
+        except Exception:
+            logger.exception("Failed to %s.", description)
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(stop.wait(), timeout=interval)
 
-    sessionmaker = _background_sessionmaker(session)
-    background_tasks.add_task(
-        _run_deferred_reply,
-        payload.user_id,
-        user_utterance.id,
-        bot_utterance.id,
-        sessionmaker,
+
+async def run_parked_reply_drain(
+    stop: asyncio.Event, sessionmaker: async_sessionmaker[AsyncSession] | None = None
+) -> None:
+    """Send parked replies once the gateway is back, until `stop` is set.
+
+    Only for in-process dispatch; workers claim parked replies like any other.
+    """
+    if get_reply_dispatch_mode() != "background":
+        return
+    drain_sessionmaker = sessionmaker or get_sessionmaker()
+
+    async def _sweep() -> bool:
+        return bool(await drain_parked_replies(drain_sessionmaker))
+
+    await _sweep_until_stopped(
+        stop, get_sms_circuit_reset_seconds(), _sweep, "drain parked replies"
+    )
+
+
+async def run_stuck_reply_reaper(
+    stop: asyncio.Event, sessionmaker: async_sessionmaker[AsyncSession] | None = None
+) -> None:
+    """Sweep for stuck replies every `REPLY_REAPER_INTERVAL_SECONDS` until `stop` is set.
+
+    Only for in-process dispatch: workers already claim any queued reply
+    whose lease has run out. Each replica can run it; claims skip rows
+    another replica has locked.
+    """
+    interval = get_reply_reaper_interval_seconds()
+    if get_reply_dispatch_mode() != "background" or not interval:
+        return
+    reap_sessionmaker = sessionmaker or get_sessionmaker()
+
+    async def _sweep() -> bool:
+        # A full batch means more may be waiting.
+        return await reap_stuck_replies(reap_sessionmaker) >= get_reply_reaper_batch_size()
+
+    await _sweep_until_stopped(stop, interval, _sweep, "reap stuck replies")
+
+
+def _lease_until() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC) + datetime.timedelta(
+        seconds=get_reply_lease_seconds()
+    )
+
+
+def _reply_lease_until() -> datetime.datetime | None:
+    # Only in-process dispatch claims the reply up front; workers claim their own.
+    if get_reply_dispatch_mode() != "background":
+        return None
+    return _lease_until()
+
+
+def _format_validation_errors(exc: ValidationError) -> list[str]:
+    errors = []
+    for error in exc.errors():
+        location = ".".join(str(part) for part in error["loc"])
+        errors.append(f"{location}: {error['msg']}" if location else error["msg"])
+    return errors
+
+
+async def _replay_chat(
+    session: AsyncSession, user_id: str, idempotency_key: str
+) -> ChatQueuedResponse | None:
+    async with session.begin():
+        claimed = await get_chat_idempotency_key(
+            session, user_id, idempotency_key, datetime.datetime.now(datetime.UTC)
+        )
+    if claimed is None:
+        return None
+    _idempotent_replays.inc()
+    return ChatQueuedResponse(
+        conversation_id=claimed[0],
+        reply_utterance_id=claimed[1],
+        status=UTTERANCE_STATUS_QUEUED,
     )
 
+
+async def _purge_idempotency_keys(sessionmaker: async_sessionmaker[AsyncSession]) -> int:
+    """Delete every expired key, one short transaction per batch; returns how many."""
+    now = datetime.datetime.now(datetime.UTC)
+    purged = 0
+    while True:
+        async with sessionmaker() as session:
+            deleted = await delete_expired_chat_idempotency_keys(
+                session, now, IDEMPOTENCY_PURGE_BATCH
+            )
+            await session.commit()
+        purged += deleted
+        if deleted < IDEMPOTENCY_PURGE_BATCH:
+            return purged
+
+
+def _schedule_idempotency_purge(
+    session: AsyncSession, background_tasks: BackgroundTasks
+) -> None:
+    global _last_idempotency_purge
+    now = time.monotonic()
+    if now - _last_idempotency_purge < IDEMPOTENCY_PURGE_INTERVAL_SECONDS:
+        return
+    _last_idempotency_purge = now
+    background_tasks.add_task(_purge_idempotency_keys, _background_sessionmaker(session))
+
+
+async def process_chat(
+    session: AsyncSession,
+    payload: ChatRequest,
+    background_tasks: BackgroundTasks,
+    idempotency_key: str | None = None,
+) -> ChatQueuedResponse:
+    """Store an inbound message and its pending reply, and schedule the reply.
+
+    With an idempotency key (`idempotency_key`, else `payload.provider_message_id`),
+    a request whose key is already claimed gets the first response back from
+    one primary key lookup, with no writes and no reply work. Other requests
+    over the rate limit raise `RateLimitedError` before anything is written.
+    """
+    idempotency_key = idempotency_key or payload.provider_message_id
+    if idempotency_key:
+        replayed = await _replay_chat(session, payload.user_id, idempotency_key)
+        if replayed is not None:
+            return replayed
+
+    rate_limiter = get_rate_limiter()
+    if rate_limiter:
+        await rate_limiter.check(session, payload.user_id)
+
+    reply_lease_until = _reply_lease_until()
+    limiter = get_reply_limiter() if reply_lease_until is not None else None
+    if limiter:
+        limiter.admit()
+
+    try:
+        async with session.begin():
+            ingest = await ingest_chat_message(
+                session,
+                payload.user_id,
+                payload.message,
+                reply_lease_until=reply_lease_until,
+            )
+            if idempotency_key and not await claim_chat_idempotency_key(
+                session,
+                payload.user_id,
+                idempotency_key,
+                ingest,
+                datetime.datetime.now(datetime.UTC)
+                + datetime.timedelta(seconds=get_idempotency_key_ttl_seconds()),
+            ):
+                raise _IdempotencyKeyTaken
+    except _IdempotencyKeyTaken:
+        if limiter:
+            limiter.release()
+        # A concurrent retry won the key; answer with its response.
+        replayed = await _replay_chat(session, payload.user_id, idempotency_key or "")
+        if replayed is None:
+            raise RuntimeError("Idempotency key was claimed but not found.") from None
+        return replayed
+    except BaseException:
+        if limiter:
+            limiter.release()
+        raise
+    _record_ingest(1)
+    if idempotency_key:
+        _schedule_idempotency_purge(session, background_tasks)
+
+    if limiter:
+        job = ReplyJob(
+            user_id=payload.user_id,
+            conversation_id=ingest.conversation_id,
+            user_utterance_id=ingest.user_utterance_id,
+            bot_utterance_id=ingest.bot_utterance_id,
+            attempts=1,
+        )
+        _dispatch_replies([job], session, background_tasks, limiter)
+
     return ChatQueuedResponse(
-        conversation_id=conversation.id,
-        reply_utterance_id=bot_utterance.id,
+        conversation_id=ingest.conversation_id,
+        reply_utterance_id=ingest.bot_utterance_id,
         status=UTTERANCE_STATUS_QUEUED,
     )
+
+
+async def process_chat_batch(
+    session: AsyncSession,
+    payload: ChatBatchRequest,
+    background_tasks: BackgroundTasks,
+) -> ChatBatchResponse:
+    items: list[MessagePayload | ChatBatchItemError] = []
+    for item in payload.messages:
+        try:
+            items.append(MessagePayload.model_validate(item))
+        except ValidationError as exc:
+            items.append(
+                ChatBatchItemError(status="invalid", errors=_format_validation_errors(exc))
+            )
+    rate_limiter = get_rate_limiter()
+    if rate_limiter:
+        valid = [
+            (index, item) for index, item in enumerate(items) if isinstance(item, MessagePayload)
+        ]
+        errors = await rate_limiter.check_batch(session, [item.user_id for _, item in valid])
+        for (index, _), error in zip(valid, errors, strict=True):
+            if error is not None:
+                items[index] = ChatBatchItemError(
+                    status="rate_limited",
+                    errors=[str(error)],
+                    retry_after_seconds=error.retry_after_seconds,
+                )
+    accepted = [item for item in items if isinstance(item, MessagePayload)]
+    reply_lease_until = _reply_lease_until()
+    limiter = get_reply_limiter() if reply_lease_until is not None else None
+    ingests: list[ChatIngest] = []
+    if accepted:
+        if limiter:
+            limiter.admit(len(accepted))
+        try:
+            async with session.begin():
+                ingests = await ingest_chat_messages(
+                    session,
+                    [(request.user_id, request.message) for request in accepted],
+                    reply_lease_until=reply_lease_until,
+                )
+        except BaseException:
+            if limiter:
+                limiter.release(len(accepted))
+            raise
+        _record_ingest(len(ingests))
+
+    if ingests and limiter:
+        jobs = [
+            ReplyJob(
+                user_id=request.user_id,
+                conversation_id=ingest.conversation_id,
+                user_utterance_id=ingest.user_utterance_id,
+                bot_utterance_id=ingest.bot_utterance_id,
+                attempts=1,
+            )
+            for request, ingest in zip(accepted, ingests, strict=True)
+        ]
+        _dispatch_replies(jobs, session, background_tasks, limiter)
+
+    queued = iter(ingests)
+    results: list[ChatQueuedResponse | ChatBatchItemError] = []
+    for item in items:
+        if isinstance(item, ChatBatchItemError):
+            results.append(item)
+            continue
+        ingest = next(queued)
+        results.append(
+            ChatQueuedResponse(
+                conversation_id=ingest.conversation_id,
+                reply_utterance_id=ingest.bot_utterance_id,
+                status=UTTERANCE_STATUS_QUEUED,
+            )
+        )
+    return ChatBatchResponse(results=results)
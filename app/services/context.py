@@ -0,0 +1,206 @@
+"""Recent conversation turns for reply generation, buffered per conversation.
+
+Each conversation's last `CONTEXT_MAX_TURNS` received or sent turns are kept
+in an in-process buffer, at most `CONTEXT_CACHE_MAX_CONVERSATIONS` buffers
+(least recently used dropped first). Writes made through `app.db_ops` stage
+a `ContextWrite` on the session; committed writes are applied here and
+rolled-back ones discarded. A buffer is only created from a full load or a
+conversation started in this process, so it never has gaps from its own
+writes.
+
+A reply reads the buffer when it already holds the message being answered.
+When the message is newer than everything buffered (it was written by
+another process, as in worker dispatch mode), only the turns after the
+newest buffered one are fetched and added. Otherwise the turns are loaded
+with one indexed query. A turn another process commits behind the newest
+buffered one is missed until the buffer is next reloaded; with several API
+replicas taking messages for one conversation, set
+`CONTEXT_CACHE_MAX_CONVERSATIONS=0`.
+"""
+
+from __future__ import annotations
+
+import bisect
+from collections import OrderedDict
+from collections.abc import Sequence
+from contextvars import ContextVar, Token
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import metrics
+from app.config import (
+    get_context_cache_max_conversations,
+    get_context_max_chars,
+    get_context_max_turns,
+)
+from app.db_ops import CONTEXT_WRITES_KEY, ContextTurn, ContextWrite, list_recent_turns
+from app.models import Utterance
+
+_lookups = metrics.counter(
+    "texet_context_lookups_total",
+    "Reply context assembly by source: buffer (no query), delta (only newer turns) or query.",
+    ["source"],
+)
+
+
+def _turn_key(turn: ContextTurn) -> tuple[Any, str]:
+    return turn.timestamp, turn.utterance_id
+
+
+def _holds(turns: Sequence[ContextTurn], utterance: Utterance) -> bool:
+    return any(turn.utterance_id == utterance.id for turn in turns)
+
+
+class ContextBuffers:
+    def __init__(self, max_turns: int, max_conversations: int) -> None:
+        self.max_turns = max_turns
+        self.max_conversations = max_conversations
+        self._turns: OrderedDict[str, list[ContextTurn]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def get(self, conversation_id: str) -> list[ContextTurn] | None:
+        turns = self._turns.get(conversation_id)
+        if turns is not None:
+            self._turns.move_to_end(conversation_id)
+        return turns
+
+    def load(self, conversation_id: str, turns: Sequence[ContextTurn]) -> None:
+        """Replace a conversation's buffer with its latest turns, oldest first."""
+        if self.max_conversations == 0:
+            return
+        self._turns[conversation_id] = list(turns[-self.max_turns :])
+        self._turns.move_to_end(conversation_id)
+        while len(self._turns) > self.max_conversations:
+            self._turns.popitem(last=False)
+
+    def invalidate(self, conversation_id: str) -> None:
+        self._turns.pop(conversation_id, None)
+
+    def apply(self, write: ContextWrite) -> None:
+        if write.closed:
+            self.invalidate(write.conversation_id)
+            return
+        if write.created:
+            self.load(write.conversation_id, [write.turn] if write.turn else [])
+            return
+        turns = self._turns.get(write.conversation_id)
+        if turns is None or write.turn is None:
+            return
+        if any(turn.utterance_id == write.turn.utterance_id for turn in turns):
+            return
+        # Replies commit after later messages can, so keep timestamp order.
+        bisect.insort(turns, write.turn, key=_turn_key)
+        del turns[: -self.max_turns]
+
+
+_buffers: ContextBuffers | None = None
+
+
+def get_context_buffers() -> ContextBuffers:
+    global _buffers
+    if _buffers is None:
+        _buffers = ContextBuffers(get_context_max_turns(), get_context_cache_max_conversations())
+    return _buffers
+
+
+def reset_context_buffers() -> None:
+    global _buffers
+    _buffers = None
+
+
+def _apply_writes(session: Session) -> None:
+    writes = session.info.pop(CONTEXT_WRITES_KEY, None)
+    if writes:
+        buffers = get_context_buffers()
+        for write in writes:
+            buffers.apply(write)
+
+
+def _discard_writes(session: Session) -> None:
+    session.info.pop(CONTEXT_WRITES_KEY, None)
+
+
+def install() -> None:
+    """Apply staged context writes on commit; safe to call more than once."""
+    if event.contains(Session, "after_commit", _apply_writes):
+        return
+    event.listen(Session, "after_commit", _apply_writes)
+    event.listen(Session, "after_rollback", _discard_writes)
+
+
+def _window(turns: Sequence[ContextTurn], max_chars: int) -> tuple[ContextTurn, ...]:
+    # Newest first until the budget is spent; the last turn is always kept.
+    kept: list[ContextTurn] = []
+    chars = 0
+    for turn in reversed(turns):
+        chars += len(turn.text)
+        if kept and chars > max_chars:
+            break
+        kept.append(turn)
+    return tuple(reversed(kept))
+
+
+async def load_reply_context(
+    session: AsyncSession, utterance: Utterance
+) -> tuple[ContextTurn, ...]:
+    """The turns up to and including `utterance`, within the configured window."""
+    buffers = get_context_buffers()
+    until = (utterance.timestamp, utterance.id)
+    turns = buffers.get(utterance.conversation_id)
+    source = "buffer"
+    if turns is not None and not _holds(turns, utterance):
+        newest = _turn_key(turns[-1]) if turns else None
+        if newest is None or newest < until:
+            source = "delta"
+            newer = await list_recent_turns(
+                session, utterance.conversation_id, buffers.max_turns, until=until, after=newest
+            )
+            for turn in newer:
+                buffers.apply(ContextWrite(utterance.conversation_id, turn))
+    if turns is None or not _holds(turns, utterance):
+        source = "query"
+        turns = await list_recent_turns(session, utterance.conversation_id, buffers.max_turns)
+        buffers.load(utterance.conversation_id, turns)
+        if not _holds(turns, utterance):
+            # Older than the latest turns: read back from the message itself.
+            turns = await list_recent_turns(
+                session, utterance.conversation_id, buffers.max_turns, until=until
+            )
+    _lookups.labels(source=source).inc()
+    return _window([turn for turn in turns if _turn_key(turn) <= until], get_context_max_chars())
+
+
+_reply_context: ContextVar[tuple[ContextTurn, ...]] = ContextVar(
+    "texet_reply_context", default=()
+)
+
+
+def get_reply_context() -> tuple[ContextTurn, ...]:
+    """Recent turns of the conversation being replied to, oldest first.
+
+    Generation that uses these should run inside `bypass_reply_cache()`: the
+    reply caches key on the message alone.
+    """
+    return _reply_context.get()
+
+
+def set_reply_context(turns: tuple[ContextTurn, ...]) -> Token[tuple[ContextTurn, ...]]:
+    return _reply_context.set(turns)
+
+
+def reset_reply_context(token: Token[tuple[ContextTurn, ...]]) -> None:
+    _reply_context.reset(token)
+
+
+install()
+
+metrics.gauge(
+    "texet_context_buffered_conversations",
+    "Conversations whose recent turns are held in memory.",
+    lambda: len(_buffers) if _buffers else 0,
+)
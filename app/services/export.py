@@ -0,0 +1,77 @@
+import datetime
+import json
+import zlib
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import get_export_chunk_rows
+from app.models import Utterance
+
+
+@dataclass(frozen=True)
+class UtteranceExportFilter:
+    since: datetime.datetime | None = None
+    until: datetime.datetime | None = None
+    status: str | None = None
+    speaker_id: str | None = None
+
+
+def _export_query(filters: UtteranceExportFilter) -> Select[Any]:
+    # No ORDER BY: sorting the whole table would have to finish before the
+    # first row streams. Rows arrive in storage order.
+    query = select(
+        Utterance.id,
+        Utterance.conversation_id,
+        Utterance.speaker_id,
+        Utterance.reply_to_id,
+        Utterance.timestamp,
+        Utterance.status,
+        Utterance.text,
+        Utterance.error,
+        Utterance.meta,
+    )
+    if filters.since is not None:
+        query = query.where(Utterance.timestamp >= filters.since)
+    if filters.until is not None:
+        query = query.where(Utterance.timestamp < filters.until)
+    if filters.status is not None:
+        query = query.where(Utterance.status == filters.status)
+    if filters.speaker_id is not None:
+        query = query.where(Utterance.speaker_id == filters.speaker_id)
+    return query
+
+
+def _ndjson_line(row: Any) -> bytes:
+    record = row._asdict()
+    record["timestamp"] = record["timestamp"].isoformat()
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+async def iter_utterance_ndjson(
+    engine: AsyncEngine,
+    filters: UtteranceExportFilter,
+    gzip: bool = False,
+) -> AsyncIterator[bytes]:
+    """Yield utterances as NDJSON (optionally gzip) one cursor chunk at a time.
+
+    Rows come from a server-side cursor (`stream` + `yield_per`), so memory
+    stays bounded by one chunk however many rows match.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if gzip else None
+    query = _export_query(filters).execution_options(yield_per=get_export_chunk_rows())
+    async with engine.connect() as connection:
+        result = await connection.stream(query)
+        async for partition in result.partitions():
+            chunk = b"".join(_ndjson_line(row) for row in partition)
+            if compressor is None:
+                yield chunk
+                continue
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+    if compressor is not None:
+        yield compressor.flush()
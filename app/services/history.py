@@ -0,0 +1,88 @@
+import base64
+import binascii
+import datetime
+import json
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db_ops import (
+    conversation_exists,
+    list_conversation_utterances,
+    list_speaker_conversations,
+    speaker_exists,
+)
+from app.schemas import ConversationItem, ConversationPage, UtteranceItem, UtterancePage
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def _order(descending: bool) -> str:
+    return "desc" if descending else "asc"
+
+
+def encode_cursor(timestamp: datetime.datetime, row_id: str, descending: bool = False) -> str:
+    raw = json.dumps([timestamp.isoformat(), row_id, _order(descending)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, descending: bool = False) -> tuple[datetime.datetime, str]:
+    """The `(timestamp, id)` to page after; the cursor must come from the same order."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id, order = json.loads(raw)
+        parsed = datetime.datetime.fromisoformat(timestamp)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise InvalidCursorError("Invalid cursor.") from exc
+    if parsed.tzinfo is None or not isinstance(row_id, str) or order not in ("asc", "desc"):
+        raise InvalidCursorError("Invalid cursor.")
+    if order != _order(descending):
+        raise InvalidCursorError(f"Cursor was issued for order={order}.")
+    return parsed, row_id
+
+
+async def get_utterance_page(
+    session: AsyncSession,
+    conversation_id: str,
+    limit: int,
+    cursor: str | None = None,
+    descending: bool = False,
+) -> UtterancePage | None:
+    after = decode_cursor(cursor, descending) if cursor else None
+    rows = await list_conversation_utterances(
+        session, conversation_id, limit + 1, after=after, descending=descending
+    )
+    if not rows and after is None and not await conversation_exists(session, conversation_id):
+        return None
+
+    items = [UtteranceItem.model_validate(row, from_attributes=True) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last.timestamp, last.id, descending)
+    return UtterancePage(items=items, next_cursor=next_cursor)
+
+
+async def get_conversation_page(
+    session: AsyncSession,
+    speaker_id: str,
+    limit: int,
+    cursor: str | None = None,
+    descending: bool = False,
+) -> ConversationPage | None:
+    after = decode_cursor(cursor, descending) if cursor else None
+    rows = await list_speaker_conversations(
+        session, speaker_id, limit + 1, after=after, descending=descending
+    )
+    if not rows and after is None and not await speaker_exists(session, speaker_id):
+        return None
+
+    items = [
+        ConversationItem.model_validate(row, from_attributes=True) for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id, descending)
+    return ConversationPage(items=items, next_cursor=next_cursor)
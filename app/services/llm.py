@@ -0,0 +1,49 @@
+"""Streaming client for the reply model at `LLM_STREAM_URL`.
+
+The endpoint takes `POST {"message": "..."}` and answers with server-sent
+events. Each event is `data: {"token": "..."}`, and the stream ends with
+`data: [DONE]`.
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import AsyncGenerator
+
+import httpx
+
+from app.config import get_llm_stream_url, get_pipeline_stage_timeout_seconds
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_llm_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        # Per-read timeout; the generate stage timeout also bounds the whole stream.
+        _client = httpx.AsyncClient(timeout=get_pipeline_stage_timeout_seconds("generate") or None)
+    return _client
+
+
+async def close_llm_client() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+async def stream_reply(message: str) -> AsyncGenerator[str]:
+    url = get_llm_stream_url()
+    if not url:
+        raise RuntimeError("LLM_STREAM_URL is not set.")
+    async with get_llm_client().stream("POST", url, json={"message": message}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line.removeprefix("data:").strip()
+            if data == "[DONE]":
+                return
+            token = json.loads(data).get("token")
+            if token:
+                yield str(token)
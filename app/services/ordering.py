@@ -0,0 +1,163 @@
+"""Per-conversation reply ordering.
+
+Replies are reserved a turn in message order when they are dispatched (after
+ingest, or after a worker claim), and each reply task waits in
+`conversation_turn` until the replies reserved before it in the same
+conversation have finished. Turns are per conversation, so unrelated
+conversations still run concurrently. A reserved reply whose task never
+starts within `REPLY_LEASE_SECONDS` loses its turn.
+
+With `REPLY_ORDERING_ADVISORY_LOCKS`, a reply also holds a Postgres
+session-level advisory lock on its conversation while it runs, so replies to
+one conversation never overlap across API replicas and workers. The lock
+needs one connection pinned for the whole reply, including while the model
+generates.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import metrics
+from app.config import get_reply_lease_seconds, get_reply_ordering_advisory_locks
+
+logger = logging.getLogger(__name__)
+
+# First key of the two-int advisory lock; keeps these locks apart from the
+# single-key transaction locks taken by message coalescing.
+ADVISORY_LOCK_NAMESPACE = 7301
+
+_turn_wait_seconds = metrics.histogram(
+    "texet_reply_turn_wait_seconds",
+    "Time a reply waited for earlier replies in its conversation.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+class ConversationTurns:
+    """FIFO turns per conversation: the earliest reserved reply runs, later ones wait."""
+
+    def __init__(self, stall_seconds: float) -> None:
+        self.stall_seconds = stall_seconds
+        self._queues: dict[str, deque[str]] = {}
+        self._keys: dict[str, str] = {}
+        self._started: set[str] = set()
+        self._wakeups: dict[str, asyncio.Future[None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+    def tokens(self) -> list[str]:
+        """The replies reserved a turn and not yet released: running or waiting."""
+        return list(self._keys)
+
+    def reserve(self, conversation_id: str, token: str) -> None:
+        """Queue `token` behind the replies already reserved; does not wait."""
+        if token in self._keys:
+            return
+        self._keys[token] = conversation_id
+        self._queues.setdefault(conversation_id, deque()).append(token)
+
+    async def acquire(self, conversation_id: str, token: str) -> None:
+        self.reserve(conversation_id, token)
+        self._started.add(token)
+        queue = self._queues[conversation_id]
+        while queue[0] != token:
+            head = queue[0]
+            wakeup = asyncio.get_running_loop().create_future()
+            self._wakeups[token] = wakeup
+            try:
+                await asyncio.wait_for(wakeup, self.stall_seconds)
+            except TimeoutError:
+                if queue[0] == head and head not in self._started:
+                    logger.warning("Reply %s never started; skipping its turn.", head)
+                    self.release(head)
+            finally:
+                self._wakeups.pop(token, None)
+
+    def release(self, token: str) -> None:
+        """Give up the turn or reservation of `token`; safe to call more than once."""
+        conversation_id = self._keys.pop(token, None)
+        if conversation_id is None:
+            return
+        self._started.discard(token)
+        queue = self._queues[conversation_id]
+        was_head = queue[0] == token
+        queue.remove(token)
+        if not queue:
+            del self._queues[conversation_id]
+            return
+        wakeup = self._wakeups.get(queue[0])
+        if was_head and wakeup is not None and not wakeup.done():
+            wakeup.set_result(None)
+
+
+_turns: ConversationTurns | None = None
+_turns_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_conversation_turns() -> ConversationTurns:
+    global _turns, _turns_loop
+    loop = asyncio.get_running_loop()
+    if _turns is None or _turns_loop is not loop:
+        _turns = ConversationTurns(get_reply_lease_seconds())
+        _turns_loop = loop
+    return _turns
+
+
+@asynccontextmanager
+async def conversation_turn(conversation_id: str, token: str) -> AsyncIterator[None]:
+    """Hold the conversation's turn for reply `token` (its bot utterance id)."""
+    turns = get_conversation_turns()
+    try:
+        with _turn_wait_seconds.time():
+            await turns.acquire(conversation_id, token)
+        yield
+    finally:
+        turns.release(token)
+
+
+@asynccontextmanager
+async def conversation_lock(
+    sessionmaker: async_sessionmaker[AsyncSession], conversation_id: str
+) -> AsyncIterator[async_sessionmaker[AsyncSession]]:
+    """A sessionmaker for the reply, holding the cross-process lock if enabled.
+
+    The yielded sessionmaker is bound to the connection holding the lock, so
+    the lock outlives the reply's commits; it is released before the
+    connection goes back to the pool.
+    """
+    if not get_reply_ordering_advisory_locks():
+        yield sessionmaker
+        return
+    async with sessionmaker.kw["bind"].connect() as connection:
+        await connection.execute(
+            select(
+                func.pg_advisory_lock(ADVISORY_LOCK_NAMESPACE, func.hashtext(conversation_id))
+            )
+        )
+        await connection.commit()
+        try:
+            yield async_sessionmaker(connection, expire_on_commit=False)
+        finally:
+            try:
+                await connection.execute(select(func.pg_advisory_unlock_all()))
+                await connection.commit()
+            except Exception:
+                # Never return a connection that may still hold the lock.
+                await connection.invalidate()
+                raise
+
+
+metrics.gauge(
+    "texet_reply_conversations_in_turn",
+    "Conversations with a reply running or waiting for its turn.",
+    lambda: len(_turns) if _turns else 0,
+)
@@ -0,0 +1,213 @@
+"""Reply pipeline: an ordered list of stages, each declaring where it runs.
+
+Stage kinds:
+
+- `inline`: a cheap sync function called on the event loop.
+- `async`: a coroutine function awaited on the event loop.
+- `thread`: a blocking sync function run on the default thread pool.
+- `process`: a CPU-bound sync function run on a shared `ProcessPoolExecutor`.
+  The function and its argument are pickled, so it must be importable at
+  module level.
+
+A stage either transforms the message (`func`) or runs independent `checks`
+concurrently and passes the message through unchanged. Any failure, including
+a timeout, is raised as `RuntimeError("pipeline:<stage> failed: ...")`.
+
+`run_streaming` swaps the `generate` stage for a token stream: the tokens are
+cut into SMS-sized segments and every later stage runs once per segment, so
+the first segment can be delivered while the model is still generating.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from app import metrics
+from app.config import get_pipeline_process_workers, get_pipeline_stage_timeout_seconds
+from app.services.segmenter import segment_stream
+from app.services.trace import ReplyTrace
+
+StageKind = Literal["inline", "async", "thread", "process"]
+
+GENERATE_STAGE = "generate"
+
+_stage_seconds = metrics.histogram(
+    "texet_pipeline_stage_seconds", "Reply pipeline stage latency.", ["stage"]
+)
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # Spawned workers do not inherit the event loop or open sockets.
+        _process_pool = ProcessPoolExecutor(
+            max_workers=get_pipeline_process_workers(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+@dataclass(frozen=True)
+class Check:
+    name: str
+    func: Callable[[str], Any]
+    kind: StageKind = "inline"
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    func: Callable[[str], Any] | None = None
+    kind: StageKind = "inline"
+    checks: tuple[Check, ...] = ()
+    # Overrides PIPELINE_<NAME>_TIMEOUT_SECONDS / PIPELINE_STAGE_TIMEOUT_SECONDS.
+    timeout_seconds: float | None = None
+
+    def __post_init__(self) -> None:
+        if (self.func is None) == (not self.checks):
+            raise ValueError(f"Stage {self.name!r} needs exactly one of func or checks.")
+
+
+async def _call(func: Callable[[str], Any], kind: StageKind, message: str) -> Any:
+    if kind == "async":
+        return await func(message)
+    if kind == "thread":
+        return await asyncio.to_thread(func, message)
+    if kind == "process":
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_process_pool(), func, message)
+    return func(message)
+
+
+async def _run_stage(stage: Stage, message: str) -> str:
+    if stage.func is not None:
+        result = await _call(stage.func, stage.kind, message)
+        if not isinstance(result, str):
+            raise TypeError(f"returned {type(result).__name__}, expected str")
+        return result
+    await asyncio.gather(*(_call(check.func, check.kind, message) for check in stage.checks))
+    return message
+
+
+def _stage_timeout(stage: Stage) -> float:
+    if stage.timeout_seconds is not None:
+        return stage.timeout_seconds
+    return get_pipeline_stage_timeout_seconds(stage.name)
+
+
+def _stage_error(stage: Stage, exc: Exception, timeout: float, expired: bool) -> RuntimeError:
+    if isinstance(exc, TimeoutError) and expired:
+        return RuntimeError(f"pipeline:{stage.name} failed: timed out after {timeout:g}s")
+    return RuntimeError(f"pipeline:{stage.name} failed: {exc}")
+
+
+async def _run_timed_stage(stage: Stage, message: str, trace: ReplyTrace) -> str:
+    timeout = _stage_timeout(stage)
+    try:
+        with trace.measure(f"{stage.name}_ms", _stage_seconds.labels(stage=stage.name)):
+            async with asyncio.timeout(timeout or None) as deadline:
+                return await _run_stage(stage, message)
+    except Exception as exc:
+        raise _stage_error(stage, exc, timeout, deadline.expired()) from exc
+
+
+async def _generated_segments(
+    stage: Stage, tokens: AsyncGenerator[str], max_chars: int
+) -> AsyncIterator[str]:
+    """Segments of `tokens`, with the stage's timeout bounding the whole stream."""
+    timeout = _stage_timeout(stage)
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + timeout if timeout else None
+    segments = segment_stream(tokens, max_chars)
+    try:
+        while True:
+            try:
+                async with asyncio.timeout_at(deadline_at) as deadline:
+                    segment = await anext(segments)
+            except StopAsyncIteration:
+                return
+            except Exception as exc:
+                raise _stage_error(stage, exc, timeout, deadline.expired()) from exc
+            yield segment
+    finally:
+        await segments.aclose()
+        await tokens.aclose()
+
+
+class ReplyPipeline:
+    def __init__(self, stages: Sequence[Stage]) -> None:
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate pipeline stage names: {names}")
+        self.stages = tuple(stages)
+
+    async def run(self, message: str, trace: ReplyTrace | None = None) -> str:
+        trace = trace or ReplyTrace()
+        for stage in self.stages:
+            message = await _run_timed_stage(stage, message, trace)
+        return message
+
+    async def run_streaming(
+        self,
+        message: str,
+        stream: Callable[[str], AsyncGenerator[str]],
+        deliver: Callable[[str], Awaitable[None]],
+        max_chars: int,
+        trace: ReplyTrace | None = None,
+    ) -> list[str]:
+        """Run with `stream` in place of the generate stage; return the delivered segments.
+
+        Segments are produced in a background task and delivered in order, so
+        generation keeps going while `deliver` waits on the SMS provider. On a
+        failure, segments already delivered stay delivered and the error is
+        raised.
+        """
+        trace = trace or ReplyTrace()
+        names = [stage.name for stage in self.stages]
+        if GENERATE_STAGE not in names:
+            raise ValueError(f"Pipeline has no {GENERATE_STAGE!r} stage to stream.")
+        index = names.index(GENERATE_STAGE)
+        generate, after = self.stages[index], self.stages[index + 1 :]
+
+        for stage in self.stages[:index]:
+            message = await _run_timed_stage(stage, message, trace)
+
+        ready: asyncio.Queue[str | None] = asyncio.Queue()
+
+        async def _produce() -> None:
+            try:
+                histogram = _stage_seconds.labels(stage=GENERATE_STAGE)
+                with trace.measure(f"{GENERATE_STAGE}_ms", histogram):
+                    async for segment in _generated_segments(generate, stream(message), max_chars):
+                        for stage in after:
+                            segment = await _run_timed_stage(stage, segment, trace)
+                        ready.put_nowait(segment)
+            finally:
+                ready.put_nowait(None)
+
+        producer = asyncio.create_task(_produce())
+        delivered: list[str] = []
+        try:
+            while (segment := await ready.get()) is not None:
+                await deliver(segment)
+                delivered.append(segment)
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+        return delivered
@@ -0,0 +1,232 @@
+"""Token-bucket rate limiting for `/chat` and `/chat/batch`, per user and across all users.
+
+Every message takes one token from its user's bucket and one from the global
+bucket; a bucket holds up to its burst and refills at its rate. A rate of 0
+turns that limit off. Messages without tokens are rejected before any chat
+data is written; a batch turns away only its messages that ran out.
+
+The buckets live in memory first. With `RATE_LIMIT_SHARED`, a request the
+local buckets allow also takes its tokens from the Postgres
+`rate_limit_buckets` table, in one statement, so the limits hold across API
+replicas. A local bucket only sees this process's share of the traffic and is
+lowered to the shared count after each lookup, so it never holds fewer tokens
+than the shared one: a local rejection is final and costs no query. A number
+stuck in a loop is turned away from memory after its first shared rejection.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import metrics
+from app.config import (
+    get_rate_limit_global_burst,
+    get_rate_limit_global_per_second,
+    get_rate_limit_max_tracked_users,
+    get_rate_limit_shared_enabled,
+    get_rate_limit_user_burst,
+    get_rate_limit_user_per_minute,
+)
+from app.db_ops import refund_rate_limit_tokens, take_rate_limit_tokens
+
+GLOBAL_KEY = "global"
+
+_rejected = metrics.counter(
+    "texet_chat_rate_limited_total",
+    "Requests to /chat rejected by the rate limit, by bucket scope and where it was decided.",
+    ["scope", "source"],
+)
+
+
+class RateLimitedError(Exception):
+    def __init__(self, scope: str, retry_after_seconds: int) -> None:
+        super().__init__(f"Rate limit exceeded ({scope}).")
+        self.scope = scope
+        self.retry_after_seconds = retry_after_seconds
+
+
+class TokenBuckets:
+    """In-memory token buckets sharing one rate and burst, at most `max_keys` of them.
+
+    The least recently used bucket is dropped past `max_keys`; a dropped
+    bucket comes back full.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        max_keys: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        # key -> (tokens, refilled_at)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def tokens(self, key: str) -> float:
+        now = self._clock()
+        tokens, refilled_at = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - refilled_at) * self.rate)
+
+    def take(self, key: str) -> float:
+        """Take a token; returns 0, or the seconds until one is available."""
+        tokens = self.tokens(key)
+        if tokens < 1:
+            self._set(key, tokens)
+            return (1 - tokens) / self.rate
+        self._set(key, tokens - 1)
+        return 0.0
+
+    def refund(self, key: str, count: int = 1) -> None:
+        self._set(key, min(self.burst, self.tokens(key) + count))
+
+    def lower(self, key: str, tokens: float) -> None:
+        """Bring the bucket down to `tokens` (e.g. what the shared bucket holds)."""
+        self._set(key, min(self.tokens(key), tokens))
+
+    def _set(self, key: str, tokens: float) -> None:
+        self._buckets[key] = (tokens, self._clock())
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        user: TokenBuckets | None,
+        everyone: TokenBuckets | None,
+        shared: bool,
+    ) -> None:
+        self.user = user
+        self.everyone = everyone
+        self.shared = shared
+
+    async def check(self, session: AsyncSession, user_id: str) -> None:
+        """Take the request's tokens or raise `RateLimitedError`."""
+        error = (await self.check_batch(session, [user_id]))[0]
+        if error is not None:
+            raise error
+
+    async def check_batch(
+        self, session: AsyncSession, user_ids: Sequence[str]
+    ) -> list[RateLimitedError | None]:
+        """Take each message's tokens, in order; returns the error of each one turned away.
+
+        The shared lookup takes every bucket's tokens in one statement, all of
+        a bucket's or none, and runs in its own short transaction on `session`,
+        so the hot global row is never locked for longer than two statements.
+        """
+        results: list[RateLimitedError | None] = []
+        taken: list[list[tuple[str, TokenBuckets, str]]] = []
+        for user_id in user_ids:
+            limits = self._limits(user_id)
+            error = None
+            for index, (scope, buckets, key) in enumerate(limits):
+                wait = buckets.take(key)
+                if wait:
+                    for _, taken_buckets, taken_key in limits[:index]:
+                        taken_buckets.refund(taken_key)
+                    _rejected.labels(scope=scope, source="memory").inc()
+                    error = RateLimitedError(scope, math.ceil(wait))
+                    break
+            results.append(error)
+            taken.append(limits if error is None else [])
+        if not self.shared:
+            return results
+
+        counts: dict[str, int] = {}
+        buckets_by_key: dict[str, TokenBuckets] = {}
+        for limits in taken:
+            for _, buckets, key in limits:
+                counts[key] = counts.get(key, 0) + 1
+                buckets_by_key[key] = buckets
+        if not counts:
+            return results
+        refunds: dict[str, int] = {}
+        async with session.begin():
+            left = await take_rate_limit_tokens(
+                session,
+                [
+                    (key, buckets_by_key[key].rate, buckets_by_key[key].burst, count)
+                    for key, count in counts.items()
+                ],
+            )
+            for index, limits in enumerate(taken):
+                denied = next((limit for limit in limits if limit[2] not in left), None)
+                if denied is None:
+                    continue
+                scope, buckets, _ = denied
+                _rejected.labels(scope=scope, source="shared").inc()
+                results[index] = RateLimitedError(scope, math.ceil(1 / buckets.rate))
+                for _, _, key in limits:
+                    if key in left:
+                        refunds[key] = refunds.get(key, 0) + 1
+            if refunds:
+                await refund_rate_limit_tokens(session, refunds)
+        for key, buckets in buckets_by_key.items():
+            if key not in left:
+                buckets.lower(key, 0.0)
+            else:
+                buckets.lower(key, left[key])
+                buckets.refund(key, refunds.get(key, 0))
+        return results
+
+    def _limits(self, user_id: str) -> list[tuple[str, TokenBuckets, str]]:
+        return [
+            (scope, buckets, key)
+            for scope, buckets, key in (
+                ("user", self.user, f"user:{user_id}"),
+                ("global", self.everyone, GLOBAL_KEY),
+            )
+            if buckets is not None
+        ]
+
+
+_limiter: RateLimiter | None = None
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    """The process-wide limiter, or None when both limits are off."""
+    global _limiter
+    user_rate = get_rate_limit_user_per_minute() / 60
+    global_rate = get_rate_limit_global_per_second()
+    if not user_rate and not global_rate:
+        return None
+    if _limiter is None:
+        _limiter = RateLimiter(
+            user=TokenBuckets(
+                user_rate, get_rate_limit_user_burst(), get_rate_limit_max_tracked_users()
+            )
+            if user_rate
+            else None,
+            everyone=TokenBuckets(global_rate, get_rate_limit_global_burst(), 1)
+            if global_rate
+            else None,
+            shared=get_rate_limit_shared_enabled(),
+        )
+    return _limiter
+
+
+def reset_rate_limiter() -> None:
+    """Drop the process-wide limiter so the next request rereads the settings."""
+    global _limiter
+    _limiter = None
+
+
+metrics.gauge(
+    "texet_chat_rate_limit_tracked_users",
+    "Per-user rate limit buckets held in memory.",
+    lambda: len(_limiter.user) if _limiter and _limiter.user else 0,
+)
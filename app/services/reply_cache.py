@@ -0,0 +1,255 @@
+"""Exact-match cache in front of the generate stage.
+
+Keys are a SHA-256 of `REPLY_CACHE_VERSION` and the ingested message,
+case-folded with whitespace collapsed, so "STOP" and " stop " share an entry.
+Lookups try the per-process LRU first, then the Postgres `reply_cache` table
+when `REPLY_CACHE_SHARED` is on; shared hits are copied into the LRU.
+
+Only the generated text is cached: contribute and QA still run on every
+reply. Callers whose generation depends on more than the message itself
+(conversation context, per-user state) wrap the call in
+`bypass_reply_cache()`.
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import metrics
+from app.config import (
+    get_reply_cache_enabled,
+    get_reply_cache_max_bytes,
+    get_reply_cache_max_entries,
+    get_reply_cache_shared_enabled,
+    get_reply_cache_ttl_seconds,
+    get_reply_cache_version,
+)
+from app.db_ops import delete_expired_cached_replies, get_cached_reply, put_cached_reply
+
+logger = logging.getLogger(__name__)
+
+_lookups = metrics.counter(
+    "texet_reply_cache_lookups_total",
+    "Reply cache lookups by result: memory_hit, shared_hit, miss or bypass.",
+    ["result"],
+)
+
+_bypass: ContextVar[bool] = ContextVar("texet_reply_cache_bypass", default=False)
+
+
+@contextmanager
+def bypass_reply_cache() -> Iterator[None]:
+    """Skip the cache, both lookup and store, for generation inside the block."""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def cache_bypassed() -> bool:
+    return _bypass.get()
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(message.casefold().split())
+
+
+def cache_key(message: str, version: str) -> str:
+    return hashlib.sha256(f"{version}\n{normalize_message(message)}".encode()).hexdigest()
+
+
+class MemoryReplyCache:
+    """LRU bounded by entry count and bytes, with a fixed TTL per entry."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        # key -> (expires_at, reply, size)
+        self._entries: OrderedDict[str, tuple[float, str, int]] = OrderedDict()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, reply, _ = entry
+        if expires_at <= self._clock():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return reply
+
+    def put(self, key: str, reply: str) -> None:
+        size = len(key) + len(reply.encode())
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, reply, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+
+class ReplyCache:
+    def __init__(self, memory: MemoryReplyCache, version: str, shared: bool) -> None:
+        self.memory = memory
+        self.version = version
+        self.shared = shared
+        self._last_purge = 0.0
+
+    async def get(
+        self, message: str, sessionmaker: async_sessionmaker[AsyncSession] | None = None
+    ) -> str | None:
+        key = cache_key(message, self.version)
+        reply = self.memory.get(key)
+        if reply is not None:
+            _lookups.labels(result="memory_hit").inc()
+            return reply
+        if self.shared and sessionmaker is not None:
+            try:
+                async with sessionmaker() as session:
+                    reply = await get_cached_reply(
+                        session, key, datetime.datetime.now(datetime.UTC)
+                    )
+            except Exception:
+                logger.warning("Shared reply cache lookup failed.", exc_info=True)
+                reply = None
+            if reply is not None:
+                self.memory.put(key, reply)
+                _lookups.labels(result="shared_hit").inc()
+                return reply
+        _lookups.labels(result="miss").inc()
+        return None
+
+    async def put(
+        self,
+        message: str,
+        reply: str,
+        sessionmaker: async_sessionmaker[AsyncSession] | None = None,
+    ) -> None:
+        key = cache_key(message, self.version)
+        self.memory.put(key, reply)
+        if not self.shared or sessionmaker is None:
+            return
+        now = datetime.datetime.now(datetime.UTC)
+        expires_at = now + datetime.timedelta(seconds=self.memory.ttl_seconds)
+        try:
+            async with sessionmaker() as session:
+                await put_cached_reply(session, key, reply, expires_at)
+                # Expired rows are never read; sweep them about once per TTL.
+                if time.monotonic() - self._last_purge >= self.memory.ttl_seconds:
+                    self._last_purge = time.monotonic()
+                    await delete_expired_cached_replies(session, now)
+                await session.commit()
+        except Exception:
+            logger.warning("Shared reply cache store failed.", exc_info=True)
+
+
+_cache: ReplyCache | None = None
+
+
+def get_reply_cache() -> ReplyCache | None:
+    """The process-wide cache, or None when `REPLY_CACHE_ENABLED` is off."""
+    global _cache
+    if not get_reply_cache_enabled():
+        return None
+    if _cache is None:
+        memory = MemoryReplyCache(
+            get_reply_cache_max_entries(),
+            get_reply_cache_max_bytes(),
+            get_reply_cache_ttl_seconds(),
+        )
+        _cache = ReplyCache(memory, get_reply_cache_version(), get_reply_cache_shared_enabled())
+    return _cache
+
+
+def reset_reply_cache() -> None:
+    """Drop the process-wide cache so the next lookup rereads the settings."""
+    global _cache
+    _cache = None
+
+
+async def cached_generate(
+    message: str,
+    generate: Callable[[str], Awaitable[str]],
+    sessionmaker: async_sessionmaker[AsyncSession] | None = None,
+) -> str:
+    cache = get_reply_cache()
+    if cache is None:
+        return await generate(message)
+    if _bypass.get():
+        _lookups.labels(result="bypass").inc()
+        return await generate(message)
+    reply = await cache.get(message, sessionmaker)
+    if reply is None:
+        reply = await generate(message)
+        await cache.put(message, reply, sessionmaker)
+    return reply
+
+
+async def cached_stream(
+    message: str,
+    stream: Callable[[str], AsyncGenerator[str]],
+    sessionmaker: async_sessionmaker[AsyncSession] | None = None,
+) -> AsyncGenerator[str]:
+    """Like `cached_generate` for token streams; only complete streams are stored."""
+    cache = get_reply_cache()
+    if cache is not None and _bypass.get():
+        _lookups.labels(result="bypass").inc()
+        cache = None
+    reply = await cache.get(message, sessionmaker) if cache is not None else None
+    if reply is not None:
+        yield reply
+        return
+    tokens: list[str] = []
+    source = stream(message)
+    try:
+        async for token in source:
+            tokens.append(token)
+            yield token
+    finally:
+        await source.aclose()
+    if cache is not None:
+        await cache.put(message, "".join(tokens), sessionmaker)
+
+
+def _entries() -> float:
+    return len(_cache.memory) if _cache else 0
+
+
+def _bytes() -> float:
+    return _cache.memory.bytes if _cache else 0
+
+
+metrics.gauge("texet_reply_cache_entries", "Replies in the per-process cache.", _entries)
+metrics.gauge("texet_reply_cache_bytes", "Bytes held by the per-process cache.", _bytes)
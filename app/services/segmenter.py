@@ -0,0 +1,57 @@
+"""Cut a token stream into SMS-sized segments, preferring sentence boundaries."""
+
+from __future__ import annotations
+
+import re
+from collections.abc import AsyncGenerator, AsyncIterable
+
+_SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*(?=\s)")
+
+
+def _find_cut(text: str, max_chars: int) -> int:
+    """Where to cut `text` so the head fits in `max_chars`.
+
+    Prefers the last sentence end that fits, then the last space, and only
+    splits a word when neither exists.
+    """
+    cut = 0
+    for match in _SENTENCE_END.finditer(text):
+        if match.end() > max_chars:
+            break
+        cut = match.end()
+    if cut:
+        return cut
+    space = text.rfind(" ", 0, max_chars + 1)
+    return space if space > 0 else max_chars
+
+
+def split_segments(text: str, max_chars: int) -> list[str]:
+    segments = []
+    text = text.strip()
+    while len(text) > max_chars:
+        cut = _find_cut(text, max_chars)
+        head, text = text[:cut].strip(), text[cut:].lstrip()
+        if head:
+            segments.append(head)
+    if text:
+        segments.append(text)
+    return segments
+
+
+async def segment_stream(tokens: AsyncIterable[str], max_chars: int) -> AsyncGenerator[str]:
+    """Yield each segment as soon as enough text has arrived to fill it.
+
+    A segment is emitted once the buffer grows past `max_chars`, so it holds
+    as many whole sentences as fit; the remainder is flushed when the stream
+    ends.
+    """
+    buffer = ""
+    async for token in tokens:
+        buffer += token
+        while len(buffer) > max_chars:
+            cut = _find_cut(buffer, max_chars)
+            head, buffer = buffer[:cut].strip(), buffer[cut:].lstrip()
+            if head:
+                yield head
+    for segment in split_segments(buffer, max_chars):
+        yield segment
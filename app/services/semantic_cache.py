@@ -0,0 +1,203 @@
+"""Near-duplicate reply cache: hashed character n-grams and a cosine scan in NumPy.
+
+Each message becomes a fixed-size vector of signed, hashed character 2- and
+3-grams (case-folded, punctuation dropped, repeated letters squeezed),
+L2-normalized so a dot product is the cosine similarity. Cached vectors live
+in one preallocated float32 matrix of `SEMANTIC_CACHE_MAX_ENTRIES` rows; a
+lookup is a single matrix-vector product over the filled rows. When the
+matrix is full, the least recently used row is overwritten, so memory stays
+fixed.
+
+The scan is exact, so its cost is linear in rows times dimensions. At the
+defaults (10k rows of 64 dimensions) it takes well under a millisecond;
+lookups and stores still run in a worker thread, so a larger matrix slows
+cache hits without stalling the event loop.
+
+NumPy is an optional dependency (`uv sync --extra semantic`); this module is
+only imported when `SEMANTIC_CACHE_ENABLED` is on.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+import time
+import zlib
+from collections.abc import Awaitable, Callable
+
+import numpy as np
+import numpy.typing as npt
+
+from app import metrics
+from app.config import (
+    get_reply_cache_ttl_seconds,
+    get_semantic_cache_dimensions,
+    get_semantic_cache_max_entries,
+    get_semantic_cache_threshold,
+)
+from app.services.reply_cache import cache_bypassed
+
+_NGRAM_SIZES = (2, 3)
+_NON_WORD = re.compile(r"[^\w\s]+")
+_REPEATS = re.compile(r"(\w)\1+")
+
+_lookups = metrics.counter(
+    "texet_semantic_cache_lookups_total",
+    "Semantic reply cache lookups by result: hit, miss or bypass.",
+    ["result"],
+)
+_lookup_seconds = metrics.histogram(
+    "texet_semantic_cache_lookup_seconds",
+    "Time to embed a message and scan the semantic cache.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025),
+)
+
+
+def embed(message: str, dimensions: int) -> npt.NDArray[np.float32]:
+    # "Hiii!!" and "hi" embed identically: punctuation dropped, letter runs squeezed.
+    text = " ".join(_REPEATS.sub(r"\1", _NON_WORD.sub("", message.casefold())).split())
+    padded = f" {text} "
+    grams = [
+        padded[start : start + size]
+        for size in _NGRAM_SIZES
+        for start in range(len(padded) - size + 1)
+    ]
+    vector = np.zeros(dimensions, dtype=np.float32)
+    if not text:
+        return vector
+    # crc32 rather than hash(): vectors must match across processes and restarts.
+    hashes = np.fromiter(
+        (zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint32, count=len(grams)
+    )
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, hashes % dimensions, signs)
+    norm = float(np.linalg.norm(vector))
+    if norm:
+        vector /= norm
+    return vector
+
+
+class SemanticReplyCache:
+    def __init__(
+        self,
+        max_entries: int,
+        dimensions: int,
+        threshold: float,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.dimensions = dimensions
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        # Rows [0, size) are filled; eviction overwrites a row in place.
+        self._vectors = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self._expires_at = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._replies: list[str] = []
+        self.size = 0
+        # `semantic_generate` runs lookups and stores on worker threads.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def lookup(self, message: str) -> tuple[str, float] | None:
+        """The live cached reply most similar to `message` and its score, if above threshold."""
+        vector = embed(message, self.dimensions)
+        with self._lock:
+            if not self.size:
+                return None
+            scores = self._vectors[: self.size] @ vector
+            now = self._clock()
+            expired = self._expires_at[: self.size] <= now
+            # Expired rows that would have matched are dropped as they are found.
+            stale = np.flatnonzero(expired & (scores >= self.threshold))
+            scores[expired] = -np.inf
+            row = int(np.argmax(scores))
+            score = float(scores[row])
+            hit = None
+            if score >= self.threshold:
+                self._last_used[row] = now
+                hit = self._replies[row], score
+            # Highest first: each removal only moves the last row, already checked.
+            for stale_row in stale[::-1]:
+                self._remove(int(stale_row))
+            return hit
+
+    def store(self, message: str, reply: str) -> None:
+        vector = embed(message, self.dimensions)
+        if not vector.any():
+            return
+        with self._lock:
+            self._store(vector, reply)
+
+    def _store(self, vector: npt.NDArray[np.float32], reply: str) -> None:
+        if self.size < self.max_entries:
+            row = self.size
+            self.size += 1
+            self._replies.append(reply)
+        else:
+            row = int(np.argmin(self._last_used[: self.size]))
+            self._replies[row] = reply
+        now = self._clock()
+        self._vectors[row] = vector
+        self._expires_at[row] = now + self.ttl_seconds
+        self._last_used[row] = now
+
+    def _remove(self, row: int) -> None:
+        # Move the last filled row into the hole to keep rows [0, size) dense.
+        last = self.size - 1
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+            self._expires_at[row] = self._expires_at[last]
+            self._last_used[row] = self._last_used[last]
+            self._replies[row] = self._replies[last]
+        self._vectors[last] = 0.0
+        self._replies.pop()
+        self.size = last
+
+
+_cache: SemanticReplyCache | None = None
+
+
+def get_semantic_cache() -> SemanticReplyCache:
+    global _cache
+    if _cache is None:
+        _cache = SemanticReplyCache(
+            get_semantic_cache_max_entries(),
+            get_semantic_cache_dimensions(),
+            get_semantic_cache_threshold(),
+            get_reply_cache_ttl_seconds(),
+        )
+    return _cache
+
+
+def reset_semantic_cache() -> None:
+    global _cache
+    _cache = None
+
+
+async def semantic_generate(message: str, generate: Callable[[str], Awaitable[str]]) -> str:
+    if cache_bypassed():
+        _lookups.labels(result="bypass").inc()
+        return await generate(message)
+    cache = get_semantic_cache()
+    with _lookup_seconds.time():
+        hit = await asyncio.to_thread(cache.lookup, message)
+    if hit is not None:
+        _lookups.labels(result="hit").inc()
+        return hit[0]
+    _lookups.labels(result="miss").inc()
+    reply = await generate(message)
+    await asyncio.to_thread(cache.store, message, reply)
+    return reply
+
+
+metrics.gauge(
+    "texet_semantic_cache_entries",
+    "Rows filled in the semantic cache matrix.",
+    lambda: _cache.size if _cache else 0,
+)
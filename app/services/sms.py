@@ -1,14 +1,414 @@
+import asyncio
+import logging
+import random
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
 import httpx
 
-from app.config import get_sms_outbound_url, get_sms_timeout_seconds
-from app.schemas import SmsOutboundRequest
+from app import metrics
+from app.config import (
+    get_sms_batch_linger_ms,
+    get_sms_batch_max_messages,
+    get_sms_bulk_url,
+    get_sms_circuit_failure_threshold,
+    get_sms_circuit_reset_seconds,
+    get_sms_http2_enabled,
+    get_sms_keepalive_expiry_seconds,
+    get_sms_max_connections,
+    get_sms_max_keepalive_connections,
+    get_sms_outbound_url,
+    get_sms_retry_attempts,
+    get_sms_retry_base_ms,
+    get_sms_retry_max_ms,
+    get_sms_timeout_seconds,
+)
+from app.schemas import SmsBulkOutboundRequest, SmsBulkOutboundResponse, SmsOutboundRequest
+
+logger = logging.getLogger(__name__)
+
+# Gateway answers worth another try; anything else is final for the message.
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+_PendingSms = tuple[SmsOutboundRequest, asyncio.Future[None]]
+
+_client: httpx.AsyncClient | None = None
+
+_send_seconds = metrics.histogram(
+    "texet_sms_send_seconds", "Time for send_sms to deliver one reply, including batching."
+)
+_request_seconds = metrics.histogram(
+    "texet_sms_request_seconds", "Outbound SMS webhook request latency.", ["endpoint"]
+)
+_responses = metrics.counter(
+    "texet_sms_responses_total",
+    "Outbound SMS webhook responses by status code (`error` for transport failures).",
+    ["endpoint", "code"],
+)
+_retries = metrics.counter(
+    "texet_sms_retries_total", "Outbound SMS tries repeated after a transient failure."
+)
+_short_circuited = metrics.counter(
+    "texet_sms_short_circuited_total",
+    "Outbound SMS not attempted because the gateway circuit was open.",
+)
+
+
+class SmsUnavailableError(RuntimeError):
+    """The gateway is down: the circuit is open or every retry failed.
+
+    `attempted` is False when the gateway was not called at all;
+    `retry_after_seconds` is when sending is worth trying again.
+    """
+
+    def __init__(self, message: str, retry_after_seconds: float, attempted: bool) -> None:
+        super().__init__(message)
+        self.retry_after_seconds = retry_after_seconds
+        self.attempted = attempted
+
+
+class SmsBulkResponseError(RuntimeError):
+    """The bulk endpoint answered 2xx with a body that does not match the batch."""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and rejects calls.
+
+    After `reset_seconds` it lets a single probe through (half-open): a
+    success closes it, a failure opens it again. A probe that never reports
+    back is replaced after another `reset_seconds`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self.failures = 0
+        self._opened_at: float | None = None
+        self._probe_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def retry_after(self) -> float:
+        """Seconds until a call would be let through; 0 when one would be now."""
+        state = self.state
+        if state == "closed":
+            return 0.0
+        since = self._opened_at if state == "open" else self._probe_at
+        if since is None:
+            return 0.0
+        return max(0.0, since + self.reset_seconds - self._clock())
+
+    def allow(self) -> bool:
+        state = self.state
+        if state != "half_open":
+            return state == "closed"
+        if self.retry_after():
+            return False
+        self._probe_at = self._clock()
+        return True
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("SMS gateway is back; circuit closed.")
+        self.failures = 0
+        self._opened_at = None
+        self._probe_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._opened_at is None and self.failures < self.failure_threshold:
+            return
+        if self._opened_at is None:
+            logger.warning("SMS circuit opened after %s failures.", self.failures)
+        self._opened_at = self._clock()
+        self._probe_at = None
+
+
+@dataclass
+class SmsDelivery:
+    """Tries made by `send_sms` calls inside `record_sms_delivery()`."""
+
+    attempts: int = 0
+    last_error: str | None = None
+
+
+_delivery: ContextVar[SmsDelivery | None] = ContextVar("texet_sms_delivery", default=None)
+
+
+@contextmanager
+def record_sms_delivery() -> Iterator[SmsDelivery]:
+    delivery = SmsDelivery()
+    token = _delivery.set(delivery)
+    try:
+        yield delivery
+    finally:
+        _delivery.reset(token)
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=get_sms_max_connections(),
+        max_keepalive_connections=get_sms_max_keepalive_connections(),
+        keepalive_expiry=get_sms_keepalive_expiry_seconds(),
+    )
+    try:
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=get_sms_timeout_seconds(),
+            http2=get_sms_http2_enabled(),
+        )
+    except ImportError as exc:
+        raise RuntimeError("SMS_HTTP2 requires the `httpx[http2]` extra.") from exc
+
+
+def get_sms_client() -> httpx.AsyncClient:
+    """Return the shared outbound client, creating it on first use.
+
+    The app lifespan and the worker open it at startup and close it on
+    shutdown; lazy creation only covers callers running outside either.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def _post(endpoint: str, url: str, body: dict[str, Any]) -> httpx.Response:
+    start = time.perf_counter()
+    code = "error"
+    try:
+        response = await get_sms_client().post(url, json=body, timeout=get_sms_timeout_seconds())
+        code = str(response.status_code)
+        return response
+    finally:
+        _request_seconds.labels(endpoint=endpoint).observe(time.perf_counter() - start)
+        _responses.labels(endpoint=endpoint, code=code).inc()
+
+
+class SmsBatcher:
+    """Collects replies for up to `max_messages` or `linger_seconds` per bulk POST.
+
+    Each `submit` call waits for its own entry in the bulk response, so callers
+    still see a per-message success or failure.
+    """
+
+    def __init__(self, url: str, max_messages: int, linger_seconds: float) -> None:
+        self._url = url
+        self._max_messages = max_messages
+        self._linger_seconds = linger_seconds
+        self._queue: asyncio.Queue[_PendingSms] = asyncio.Queue()
+        self._collector: asyncio.Task[None] | None = None
+        self._flushes: set[asyncio.Task[None]] = set()
+
+    async def submit(self, payload: SmsOutboundRequest) -> None:
+        if self._collector is None:
+            self._collector = asyncio.create_task(self._collect())
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((payload, future))
+        await future
+
+    async def close(self) -> None:
+        if self._collector is not None:
+            self._collector.cancel()
+            await asyncio.gather(self._collector, return_exceptions=True)
+            self._collector = None
+        while not self._queue.empty():
+            self._start_flush(self._take_batch())
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def _take_batch(self) -> list[_PendingSms]:
+        batch: list[_PendingSms] = []
+        while len(batch) < self._max_messages and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    def _start_flush(self, batch: list[_PendingSms]) -> None:
+        task = asyncio.create_task(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._linger_seconds
+            try:
+                while len(batch) < self._max_messages:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except TimeoutError:
+                        break
+            finally:
+                # Also on cancellation (`close`): the batch is already off the queue.
+                self._start_flush(batch)
+
+    async def _flush(self, batch: list[_PendingSms]) -> None:
+        request = SmsBulkOutboundRequest(messages=[payload for payload, _ in batch])
+        try:
+            response = await _post("bulk", self._url, request.model_dump())
+            response.raise_for_status()
+            try:
+                results = SmsBulkOutboundResponse.model_validate(response.json()).results
+            except ValueError as exc:
+                raise SmsBulkResponseError(f"SMS bulk response is malformed: {exc}") from exc
+            if len(results) != len(batch):
+                raise SmsBulkResponseError(
+                    f"SMS bulk response has {len(results)} results for {len(batch)} messages."
+                )
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results, strict=True):
+            if future.done():
+                continue
+            if result.status == "sent":
+                future.set_result(None)
+            else:
+                future.set_exception(
+                    RuntimeError(result.error or "SMS gateway rejected the message.")
+                )
+
+
+_batcher: SmsBatcher | None = None
+
+
+def _get_batcher(url: str) -> SmsBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = SmsBatcher(
+            url,
+            max_messages=get_sms_batch_max_messages(),
+            linger_seconds=get_sms_batch_linger_ms() / 1000,
+        )
+    return _batcher
+
+
+_circuit: CircuitBreaker | None = None
+
+
+def get_sms_circuit() -> CircuitBreaker:
+    """The process-wide circuit in front of the SMS gateway."""
+    global _circuit
+    if _circuit is None:
+        _circuit = CircuitBreaker(
+            get_sms_circuit_failure_threshold(), get_sms_circuit_reset_seconds()
+        )
+    return _circuit
+
+
+async def close_sms_client() -> None:
+    global _client, _batcher
+    batcher, _batcher = _batcher, None
+    if batcher is not None:
+        await batcher.close()
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    # A bulk body we cannot map to the batch says nothing about any one message.
+    return isinstance(exc, httpx.TransportError | SmsBulkResponseError)
+
+
+def _describe(exc: Exception) -> str:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"HTTP {exc.response.status_code}"
+    return str(exc).strip() or exc.__class__.__name__
+
+
+def _retry_delay(retry: int, exc: Exception) -> float:
+    """Full-jitter exponential backoff, raised to the gateway's Retry-After if longer."""
+    cap = get_sms_retry_max_ms() / 1000
+    delay = random.uniform(0, min(cap, get_sms_retry_base_ms() / 1000 * 2**retry))
+    if isinstance(exc, httpx.HTTPStatusError):
+        with suppress(ValueError):
+            delay = max(delay, float(exc.response.headers.get("Retry-After", 0)))
+    return min(delay, cap)
+
+
+async def _send_once(payload: SmsOutboundRequest) -> None:
+    bulk_url = get_sms_bulk_url()
+    if bulk_url:
+        await _get_batcher(bulk_url).submit(payload)
+        return
+    response = await _post("single", get_sms_outbound_url(), payload.model_dump())
+    response.raise_for_status()
 
 
 async def send_sms(payload: SmsOutboundRequest) -> None:
-    url = get_sms_outbound_url()
-    if not url:
+    """Deliver one reply, retrying transient failures with backoff.
+
+    Raises `SmsUnavailableError` without calling the gateway while the
+    circuit is open, and when the last try fails transiently. Other failures
+    (a 4xx, a message the gateway rejects) are raised as they are.
+    """
+    if not get_sms_bulk_url() and not get_sms_outbound_url():
         raise RuntimeError("SMS_OUTBOUND_URL is not set.")
-    timeout = get_sms_timeout_seconds()
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        response = await client.post(url, json=payload.model_dump())
-        response.raise_for_status()
+    circuit = get_sms_circuit()
+    delivery = _delivery.get()
+    tries = get_sms_retry_attempts()
+    with _send_seconds.time():
+        for attempt in range(tries):
+            if not circuit.allow():
+                _short_circuited.inc()
+                raise SmsUnavailableError(
+                    "SMS gateway unavailable (circuit open).",
+                    circuit.retry_after(),
+                    attempted=attempt > 0,
+                )
+            if delivery is not None:
+                delivery.attempts += 1
+            try:
+                await _send_once(payload)
+            except Exception as exc:
+                if delivery is not None:
+                    delivery.last_error = _describe(exc)
+                if not is_retryable(exc):
+                    # The gateway answered with a 4xx or rejected this message alone.
+                    circuit.record_success()
+                    raise
+                circuit.record_failure()
+                if attempt + 1 == tries:
+                    raise SmsUnavailableError(
+                        f"SMS gateway unavailable after {tries} tries: {_describe(exc)}",
+                        circuit.retry_after() or circuit.reset_seconds,
+                        attempted=True,
+                    ) from exc
+                _retries.inc()
+                await asyncio.sleep(_retry_delay(attempt, exc))
+            else:
+                circuit.record_success()
+                return
+
+
+metrics.gauge(
+    "texet_sms_circuit_open",
+    "1 while the SMS circuit is open or half-open, else 0.",
+    lambda: 1 if _circuit and _circuit.state != "closed" else 0,
+)
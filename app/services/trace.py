@@ -0,0 +1,51 @@
+"""Per-reply timing traces stored in `Utterance.meta["timing"]`."""
+
+from __future__ import annotations
+
+import datetime
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from app.metrics import Histogram
+
+
+class ReplyTrace:
+    """Millisecond durations for one reply attempt.
+
+    Durations are collected in memory and written with the status update that
+    ends the attempt, so tracing costs no extra round-trip.
+    """
+
+    def __init__(self) -> None:
+        self._start = time.perf_counter()
+        self.started_at = datetime.datetime.now(datetime.UTC)
+        self.durations: dict[str, float] = {}
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def record(self, key: str, seconds: float) -> None:
+        self.durations[key] = round(seconds * 1000, 3)
+
+    def record_queue_wait(self, enqueued_at: datetime.datetime) -> None:
+        self.record("queue_wait_ms", max((self.started_at - enqueued_at).total_seconds(), 0.0))
+
+    @contextmanager
+    def measure(self, key: str, histogram: Histogram | None = None) -> Iterator[None]:
+        """Time the block; repeated measurements of one key add up."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.durations[key] = round(self.durations.get(key, 0.0) + elapsed * 1000, 3)
+            if histogram is not None:
+                histogram.observe(elapsed)
+
+    def as_meta(self, meta: dict[str, Any] | None) -> dict[str, Any]:
+        """Return `meta` with this trace under `timing`, as a new dict."""
+        timing = {**self.durations}
+        timing["total_ms"] = round(self.elapsed() * 1000, 3)
+        return {**(meta or {}), "timing": timing}
@@ -0,0 +1,108 @@
+"""Standalone reply worker: `python -m app.worker`.
+
+Claims queued bot utterances from Postgres and runs the reply pipeline and
+SMS delivery for each, so API and worker replicas can scale independently.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import signal
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import (
+    get_reply_lease_seconds,
+    get_worker_concurrency,
+    get_worker_poll_interval_seconds,
+)
+from app.db import get_sessionmaker
+from app.db_ops import claim_reply_jobs
+from app.partitions import run_partition_maintenance
+from app.services.chat import run_reply_job
+from app.services.llm import close_llm_client
+from app.services.ordering import get_conversation_turns
+from app.services.pipeline import shutdown_process_pool
+from app.services.sms import close_sms_client, get_sms_client
+
+logger = logging.getLogger(__name__)
+
+
+async def _claim(
+    sessionmaker: async_sessionmaker[AsyncSession], limit: int
+) -> list[asyncio.Task[None]]:
+    async with sessionmaker() as session, session.begin():
+        jobs = await claim_reply_jobs(session, limit, get_reply_lease_seconds())
+    turns = get_conversation_turns()
+    for job in jobs:
+        turns.reserve(job.conversation_id, job.bot_utterance_id)
+    return [asyncio.create_task(run_reply_job(job, sessionmaker)) for job in jobs]
+
+
+async def run_worker(
+    stop: asyncio.Event,
+    sessionmaker: async_sessionmaker[AsyncSession] | None = None,
+    concurrency: int | None = None,
+) -> None:
+    sessionmaker = sessionmaker or get_sessionmaker()
+    concurrency = concurrency or get_worker_concurrency()
+    poll_interval = get_worker_poll_interval_seconds()
+    running: set[asyncio.Task[None]] = set()
+
+    while not stop.is_set():
+        claimed: list[asyncio.Task[None]] = []
+        free = concurrency - len(running)
+        if free > 0:
+            try:
+                claimed = await _claim(sessionmaker, free)
+            except Exception:
+                logger.exception("Failed to claim reply jobs.")
+            running.update(claimed)
+
+        # Poll again straight away after a full claim; otherwise wait for a
+        # slot to free up, the poll interval, or shutdown.
+        if claimed and len(claimed) == free:
+            continue
+        stop_waiter = asyncio.ensure_future(stop.wait())
+        waiters: set[asyncio.Future[Any]] = {stop_waiter, *running}
+        await asyncio.wait(waiters, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+        stop_waiter.cancel()
+        for task in [task for task in running if task.done()]:
+            running.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error("Reply job crashed.", exc_info=task.exception())
+
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+
+    async def _main() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(sig, stop.set)
+        get_sms_client()
+        maintenance = asyncio.create_task(run_partition_maintenance(stop))
+        logger.info("Reply worker started (concurrency=%s).", get_worker_concurrency())
+        try:
+            await run_worker(stop)
+        finally:
+            stop.set()
+            await maintenance
+            await close_sms_client()
+            await close_llm_client()
+            shutdown_process_pool()
+        logger.info("Reply worker stopped.")
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
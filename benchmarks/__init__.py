@@ -0,0 +1 @@
+# Local benchmarks; not part of the deployed app.
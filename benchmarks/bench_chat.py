@@ -0,0 +1,263 @@
+"""Load-test `/chat` end to end: API, Postgres, deferred reply and SMS delivery.
+
+Serves `app.main:app` with uvicorn and drives it with N concurrent synthetic
+users. Replies go to the local stub SMS webhook. `DATABASE_URL` must point at
+a migrated database; rows are tagged with a run id and never deleted.
+
+Usage:
+    uv run python -m benchmarks.bench_chat --users 50 --messages-per-user 20 \
+        --sms-latency-ms 50 --sms-error-rate 0.01 --output results/chat.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import subprocess
+import time
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+import httpx
+import uvicorn
+from sqlalchemy import event, func, select
+
+from app.config import UTTERANCE_STATUS_FAILED, UTTERANCE_STATUS_QUEUED
+from app.db import get_engine, get_sessionmaker
+from app.models import Utterance
+from benchmarks.stub_sms import StubSmsStats, serve_stub
+
+API_TOKEN = "bench-token"
+
+
+@dataclass(frozen=True)
+class ChatBenchConfig:
+    users: int = 20
+    messages_per_user: int = 10
+    sms_latency_ms: float = 0.0
+    sms_error_rate: float = 0.0
+    dispatch: str = "background"
+    drain_timeout_seconds: float = 60.0
+
+
+def percentiles(values: list[float]) -> dict[str, float | None]:
+    """Nearest-rank p50/p95/p99 in milliseconds; None when there are no samples."""
+    ordered = sorted(values)
+    result: dict[str, float | None] = {}
+    for name, quantile in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+        if not ordered:
+            result[name] = None
+            continue
+        index = min(len(ordered) - 1, max(0, round(quantile * len(ordered)) - 1))
+        result[name] = round(ordered[index] * 1000, 2)
+    return result
+
+
+@contextlib.contextmanager
+def _count_statements() -> Iterator[list[int]]:
+    counter = [0]
+
+    def _before_cursor_execute(*_: Any) -> None:
+        counter[0] += 1
+
+    sync_engine = get_engine().sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextlib.asynccontextmanager
+async def _serve_api() -> AsyncIterator[str]:
+    from app.main import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning")
+    )
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+@contextlib.asynccontextmanager
+async def _maybe_worker(dispatch: str) -> AsyncIterator[None]:
+    if dispatch != "worker":
+        yield
+        return
+    from app.worker import run_worker
+
+    stop = asyncio.Event()
+    task = asyncio.create_task(run_worker(stop))
+    try:
+        yield
+    finally:
+        stop.set()
+        await task
+
+
+async def _drain(reply_ids: list[str], timeout: float) -> tuple[dict[str, int], int]:
+    """Wait until no reply is still queued; return counts by status and polls made."""
+    deadline = time.perf_counter() + timeout
+    sessionmaker = get_sessionmaker()
+    polls = 0
+    while True:
+        polls += 1
+        async with sessionmaker() as session:
+            result = await session.execute(
+                select(Utterance.status, func.count())
+                .where(Utterance.id.in_(reply_ids))
+                .group_by(Utterance.status)
+            )
+            counts: dict[str, int] = dict(result.tuples().all())
+        if not counts.get(UTTERANCE_STATUS_QUEUED) or time.perf_counter() > deadline:
+            return counts, polls
+        await asyncio.sleep(0.1)
+
+
+def _git_commit() -> str | None:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def _time_to_sent(
+    stats: StubSmsStats, accepted_at: dict[str, float], run_id: str
+) -> list[float]:
+    """Request start to the stub receiving the reply, per delivered message."""
+    durations = []
+    for arrived_at, payload in stats.received:
+        message = str(payload.get("message", ""))
+        key = message.removeprefix("echo:")
+        if key.startswith(run_id) and key in accepted_at:
+            durations.append(arrived_at - accepted_at[key])
+    return durations
+
+
+async def run_chat_benchmark(config: ChatBenchConfig) -> dict[str, Any]:
+    run_id = f"bench-{uuid.uuid4().hex[:8]}"
+    os.environ["API_TOKEN"] = API_TOKEN
+    os.environ["REPLY_DISPATCH_MODE"] = config.dispatch
+
+    response_latencies: list[float] = []
+    sent_at: dict[str, float] = {}
+    reply_ids: list[str] = []
+    http_failures: dict[str, int] = {}
+
+    async def _user(client: httpx.AsyncClient, user_index: int) -> None:
+        user_id = f"{run_id}-u{user_index}"
+        for message_index in range(config.messages_per_user):
+            message = f"{run_id} {user_index} {message_index}"
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/chat",
+                    headers={"Authorization": f"Bearer {API_TOKEN}"},
+                    json={"user_id": user_id, "message": message},
+                )
+            except httpx.HTTPError as exc:
+                key = type(exc).__name__
+                http_failures[key] = http_failures.get(key, 0) + 1
+                continue
+            if response.status_code != 202:
+                key = str(response.status_code)
+                http_failures[key] = http_failures.get(key, 0) + 1
+                continue
+            response_latencies.append(time.perf_counter() - started)
+            sent_at[message] = started
+            reply_ids.append(response.json()["reply_utterance_id"])
+
+    async with serve_stub(
+        latency_ms=config.sms_latency_ms, error_rate=config.sms_error_rate
+    ) as (sms_url, stats):
+        os.environ["SMS_OUTBOUND_URL"] = sms_url
+        with _count_statements() as statements:
+            async with _serve_api() as base_url, _maybe_worker(config.dispatch):
+                limits = httpx.Limits(max_connections=config.users)
+                async with httpx.AsyncClient(
+                    base_url=base_url, limits=limits, timeout=30.0
+                ) as client:
+                    started = time.perf_counter()
+                    await asyncio.gather(*(_user(client, index) for index in range(config.users)))
+                    elapsed = time.perf_counter() - started
+                statuses, polls = await _drain(reply_ids, config.drain_timeout_seconds)
+        time_to_sent = _time_to_sent(stats, sent_at, run_id)
+
+    accepted = len(reply_ids)
+    app_statements = statements[0] - polls
+    total = config.users * config.messages_per_user
+    return {
+        "run_id": run_id,
+        "commit": _git_commit(),
+        "finished_at": datetime.datetime.now(datetime.UTC).isoformat(),
+        "config": asdict(config),
+        "requests": total,
+        "accepted": accepted,
+        "requests_per_second": round(total / elapsed, 1) if elapsed else None,
+        "accepted_latency": percentiles(response_latencies),
+        "time_to_sent": percentiles(time_to_sent),
+        # Ingest plus the deferred reply's reads and writes; drain polls excluded.
+        "db_statements_per_message": round(app_statements / accepted, 2) if accepted else None,
+        "failures": {
+            "http": http_failures,
+            "replies_failed": statuses.get(UTTERANCE_STATUS_FAILED, 0),
+            "replies_unsent": statuses.get(UTTERANCE_STATUS_QUEUED, 0),
+            "sms_errors_injected": stats.errors,
+        },
+    }
+
+
+async def main(config: ChatBenchConfig, output: Path | None) -> None:
+    try:
+        results = await run_chat_benchmark(config)
+    finally:
+        await get_engine().dispose()
+    rendered = json.dumps(results, indent=2)
+    print(rendered)
+    if output is not None:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(rendered + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--messages-per-user", type=int, default=10)
+    parser.add_argument("--sms-latency-ms", type=float, default=0.0)
+    parser.add_argument("--sms-error-rate", type=float, default=0.0)
+    parser.add_argument("--dispatch", choices=["background", "worker"], default="background")
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--output", type=Path, help="write the JSON results to this file")
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            ChatBenchConfig(
+                users=args.users,
+                messages_per_user=args.messages_per_user,
+                sms_latency_ms=args.sms_latency_ms,
+                sms_error_rate=args.sms_error_rate,
+                dispatch=args.dispatch,
+                drain_timeout_seconds=args.drain_timeout,
+            ),
+            args.output,
+        )
+    )
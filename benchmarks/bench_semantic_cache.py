@@ -0,0 +1,67 @@
+"""Semantic reply cache lookup latency at a given number of cached entries.
+
+Fills the cache with synthetic messages, then times `lookup` (embedding plus
+the cosine scan) for a mix of near-duplicate and unseen queries.
+
+Usage:
+    uv run --extra semantic python -m benchmarks.bench_semantic_cache \
+        --entries 100000 --dimensions 64 --lookups 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+
+from app.services.semantic_cache import SemanticReplyCache
+from benchmarks.bench_chat import percentiles
+
+_WORDS = [
+    *("hi", "hello", "yes", "no", "stop", "start", "help", "thanks", "ok", "sure", "when"),
+    *("where", "what", "time", "today", "tomorrow", "cancel", "confirm", "appointment"),
+    *("reminder", "call", "text", "please", "later", "now", "again", "sorry"),
+]
+
+
+def _message(rng: random.Random) -> str:
+    return " ".join(rng.choices(_WORDS, k=rng.randint(1, 6))) + f" {rng.randrange(10**6)}"
+
+
+def run(entries: int, dimensions: int, lookups: int, seed: int = 0) -> dict[str, object]:
+    rng = random.Random(seed)
+    cache = SemanticReplyCache(entries, dimensions, threshold=0.9, ttl_seconds=3600)
+    messages = [_message(rng) for _ in range(entries)]
+    started = time.perf_counter()
+    for message in messages:
+        cache.store(message, f"reply to {message}")
+    fill_seconds = time.perf_counter() - started
+
+    queries = [
+        rng.choice(messages) + "!" if index % 2 else _message(rng) for index in range(lookups)
+    ]
+    durations = []
+    hits = 0
+    for query in queries:
+        started = time.perf_counter()
+        hit = cache.lookup(query)
+        durations.append(time.perf_counter() - started)
+        hits += hit is not None
+    return {
+        "entries": len(cache),
+        "dimensions": dimensions,
+        "matrix_mb": round(entries * dimensions * 4 / 1e6, 1),
+        "fill_seconds": round(fill_seconds, 2),
+        "lookup": percentiles(durations),
+        "hit_rate": round(hits / lookups, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--dimensions", type=int, default=64)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.entries, args.dimensions, args.lookups), indent=2))
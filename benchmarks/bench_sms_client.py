@@ -0,0 +1,75 @@
+"""Compare a per-call httpx client against the shared pooled SMS client.
+
+Usage:
+    uv run python -m benchmarks.bench_sms_client --messages 2000 --concurrency 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from collections.abc import Awaitable, Callable
+
+import httpx
+
+from app.config import get_sms_outbound_url, get_sms_timeout_seconds
+from app.schemas import SmsOutboundRequest
+from app.services import sms as sms_service
+from benchmarks.stub_sms import serve_stub
+
+
+async def _send_per_call(payload: SmsOutboundRequest) -> None:
+    # Mirrors the original send_sms: a fresh client (and connection) per reply.
+    url = get_sms_outbound_url()
+    async with httpx.AsyncClient(timeout=get_sms_timeout_seconds()) as client:
+        response = await client.post(url, json=payload.model_dump())
+        response.raise_for_status()
+
+
+async def _run(
+    send: Callable[[SmsOutboundRequest], Awaitable[None]],
+    messages: int,
+    concurrency: int,
+) -> dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def _one(index: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await send(SmsOutboundRequest(user_id=f"u{index}", message="benchmark"))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(index) for index in range(messages)))
+    elapsed = time.perf_counter() - started
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "messages_per_second": round(messages / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+    }
+
+
+async def main(messages: int, concurrency: int, latency_ms: float) -> None:
+    async with serve_stub(latency_ms=latency_ms) as (url, _):
+        os.environ["SMS_OUTBOUND_URL"] = url
+        results = {
+            "per_call_client": await _run(_send_per_call, messages, concurrency),
+            "shared_client": await _run(sms_service.send_sms, messages, concurrency),
+        }
+        await sms_service.close_sms_client()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.concurrency, args.latency_ms))
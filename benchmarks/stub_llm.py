@@ -0,0 +1,87 @@
+"""Local fake streaming model for `LLM_STREAM_URL`.
+
+Answers `POST {"message": "..."}` with server-sent events, one
+`data: {"token": "..."}` per token and a final `data: [DONE]`. The reply is
+`reply_for(message)` split into word tokens, sent `token_delay_ms` apart.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+@dataclass
+class StubLlmStats:
+    requests: int = 0
+    # perf_counter() when each response finished streaming.
+    finished: list[float] = field(default_factory=list)
+
+
+def _echo(message: str) -> str:
+    return f"echo:{message}"
+
+
+def build_stub_app(
+    stats: StubLlmStats,
+    reply_for: Callable[[str], str] = _echo,
+    token_delay_ms: float = 0.0,
+) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/generate")
+    async def generate(request: Request) -> StreamingResponse:
+        payload = await request.json()
+        stats.requests += 1
+        tokens = re.findall(r"\S+\s*", reply_for(str(payload.get("message", ""))))
+
+        async def _events() -> AsyncIterator[str]:
+            for token in tokens:
+                if token_delay_ms:
+                    await asyncio.sleep(token_delay_ms / 1000)
+                yield f"data: {json.dumps({'token': token})}\n\n"
+            yield "data: [DONE]\n\n"
+            stats.finished.append(time.perf_counter())
+
+        return StreamingResponse(_events(), media_type="text/event-stream")
+
+    return app
+
+
+@asynccontextmanager
+async def serve_stub_llm(
+    reply_for: Callable[[str], str] = _echo,
+    token_delay_ms: float = 0.0,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> AsyncIterator[tuple[str, StubLlmStats]]:
+    """Run the fake model in the current event loop; yields (stream_url, stats)."""
+    stats = StubLlmStats()
+    config = uvicorn.Config(
+        build_stub_app(stats, reply_for, token_delay_ms),
+        host=host,
+        port=port,
+        log_level="warning",
+        lifespan="off",
+    )
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}/generate", stats
+    finally:
+        server.should_exit = True
+        await task
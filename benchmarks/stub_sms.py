@@ -0,0 +1,77 @@
+"""Local stub for the outbound SMS webhook.
+
+Accepts the same JSON payload as `SMS_OUTBOUND_URL`, with configurable
+latency and error injection, and records when each message arrived.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+
+@dataclass
+class StubSmsStats:
+    received: list[tuple[float, dict[str, Any]]] = field(default_factory=list)
+    errors: int = 0
+
+
+def build_stub_app(
+    stats: StubSmsStats,
+    latency_ms: float = 0.0,
+    error_rate: float = 0.0,
+    seed: int | None = None,
+) -> FastAPI:
+    rng = random.Random(seed)
+    app = FastAPI()
+
+    @app.post("/webhook")
+    async def webhook(request: Request) -> Response:
+        payload = await request.json()
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        if rng.random() < error_rate:
+            stats.errors += 1
+            return Response(status_code=502)
+        stats.received.append((time.perf_counter(), payload))
+        return Response(status_code=200)
+
+    return app
+
+
+@asynccontextmanager
+async def serve_stub(
+    latency_ms: float = 0.0,
+    error_rate: float = 0.0,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> AsyncIterator[tuple[str, StubSmsStats]]:
+    """Run the stub in the current event loop; yields (webhook_url, stats)."""
+    stats = StubSmsStats()
+    config = uvicorn.Config(
+        build_stub_app(stats, latency_ms, error_rate),
+        host=host,
+        port=port,
+        log_level="warning",
+        lifespan="off",
+    )
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}/webhook", stats
+    finally:
+        server.should_exit = True
+        await task
@@ -2,11 +2,13 @@ from __future__ import annotations
 
 import asyncio
 import os
+from collections.abc import AsyncGenerator
 from pathlib import Path
 
 import asyncpg
 import pytest
 from alembic.config import Config
+from httpx import ASGITransport, AsyncClient
 from sqlalchemy import text
 from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.asyncio import (
@@ -16,7 +18,10 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from alembic import command
+from app.db import get_async_session
+from app.main import app
 from app.models import Base
+from app.services import chat as chat_service
 
 
 def _load_env_file(path: Path) -> None:
@@ -68,7 +73,11 @@ async def _fetch_tables(database_url: str) -> set[str]:
     engine = create_async_engine(database_url, pool_pre_ping=True)
     async with engine.connect() as connection:
         result = await connection.execute(
-            text("SELECT tablename FROM pg_tables WHERE schemaname = 'public'")
+            text(
+                "SELECT relname FROM pg_class "
+                "WHERE relnamespace = 'public'::regnamespace "
+                "AND relkind IN ('r', 'p') AND NOT relispartition"
+            )
         )
         tables = set(result.scalars().all())
     await engine.dispose()
@@ -121,3 +130,30 @@ async def async_session() -> AsyncSession:
         yield session
 
     await engine.dispose()
+
+
+@pytest.fixture()
+async def async_client(
+    async_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> AsyncClient:
+    monkeypatch.setenv("API_TOKEN", "test-token")
+
+    async def _override_dependency() -> AsyncGenerator[AsyncSession, None]:
+        yield async_session
+
+    app.dependency_overrides[get_async_session] = _override_dependency
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture()
+def sms_outbox(monkeypatch: pytest.MonkeyPatch) -> list[dict[str, str]]:
+    outbox: list[dict[str, str]] = []
+
+    async def _fake_send_sms(payload: chat_service.SmsOutboundRequest) -> None:
+        outbox.append(payload.model_dump())
+
+    monkeypatch.setattr(chat_service, "send_sms", _fake_send_sms)
+    return outbox
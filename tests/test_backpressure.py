@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Utterance
+from app.services import chat as chat_service
+from app.services.backpressure import ReplyBacklogFullError, ReplyLimiter
+
+
+@pytest.mark.asyncio
+async def test_limiter_bounds_concurrency() -> None:
+    limiter = ReplyLimiter(max_concurrency=2, max_backlog=10)
+    release = asyncio.Event()
+    peak = 0
+
+    async def _reply() -> None:
+        nonlocal peak
+        peak = max(peak, limiter.in_flight)
+        await release.wait()
+
+    limiter.admit(5)
+    tasks = [asyncio.create_task(limiter.run(_reply)) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    assert (limiter.in_flight, limiter.pending) == (2, 3)
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert peak == 2
+    assert (limiter.in_flight, limiter.pending) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_beyond_backlog(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("REPLY_RETRY_AFTER_SECONDS", "7")
+    limiter = ReplyLimiter(max_concurrency=1, max_backlog=3)
+    limiter.admit(2)
+
+    with pytest.raises(ReplyBacklogFullError) as excinfo:
+        limiter.admit(2)
+    assert excinfo.value.retry_after_seconds == 7
+    assert limiter.pending == 2
+
+    limiter.release(2)
+    limiter.admit(3)
+    assert limiter.pending == 3
+
+
+@pytest.mark.asyncio
+async def test_limiter_cancelled_wait_releases_pending() -> None:
+    limiter = ReplyLimiter(max_concurrency=1, max_backlog=10)
+    release = asyncio.Event()
+
+    async def _reply() -> None:
+        await release.wait()
+
+    limiter.admit(2)
+    running = asyncio.create_task(limiter.run(_reply))
+    waiting = asyncio.create_task(limiter.run(_reply))
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert limiter.pending == 0
+
+    release.set()
+    await running
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_chat_sheds_load_when_backlog_full(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("REPLY_RETRY_AFTER_SECONDS", "3")
+    limiter = ReplyLimiter(max_concurrency=1, max_backlog=1)
+    limiter.admit()
+    monkeypatch.setattr(chat_service, "get_reply_limiter", lambda: limiter)
+
+    response = await async_client.post(
+        "/chat",
+        headers={"Authorization": "Bearer test-token"},
+        json={"user_id": "u1", "message": "hello"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+
+    batch = await async_client.post(
+        "/chat/batch",
+        headers={"Authorization": "Bearer test-token"},
+        json={"messages": [{"user_id": "u1", "message": "hello"}]},
+    )
+    assert batch.status_code == 503
+
+    count = await async_session.execute(select(func.count()).select_from(Utterance))
+    assert count.scalar_one() == 0
+
+
+@pytest.mark.asyncio
+async def test_metrics_exports_reply_gauges(async_client: AsyncClient) -> None:
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert "# TYPE texet_reply_in_flight gauge" in response.text
+    assert "# TYPE texet_reply_pending gauge" in response.text
+    assert "# TYPE texet_reply_rejected_total counter" in response.text
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from app.db import get_engine
+from benchmarks.bench_chat import ChatBenchConfig, percentiles, run_chat_benchmark
+
+
+def test_percentiles_use_nearest_rank() -> None:
+    values = [index / 1000 for index in range(1, 101)]
+    assert percentiles(values) == {"p50_ms": 50.0, "p95_ms": 95.0, "p99_ms": 99.0}
+    assert percentiles([]) == {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+
+@pytest.mark.asyncio
+async def test_chat_benchmark_smoke(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The harness sets these itself; register them so monkeypatch restores them.
+    for name in ("API_TOKEN", "REPLY_DISPATCH_MODE", "SMS_OUTBOUND_URL"):
+        monkeypatch.setenv(name, "")
+    monkeypatch.setenv("DATABASE_URL", os.environ["DATABASE_URL_TEST"])
+    get_engine.cache_clear()
+    try:
+        results = await run_chat_benchmark(
+            ChatBenchConfig(users=3, messages_per_user=2, drain_timeout_seconds=10)
+        )
+    finally:
+        await get_engine().dispose()
+        get_engine.cache_clear()
+
+    assert results["accepted"] == 6
+    assert results["failures"]["http"] == {}
+    assert results["failures"]["replies_unsent"] == 0
+    assert results["time_to_sent"]["p50_ms"] is not None
+    assert results["db_statements_per_message"] > 0
@@ -1,48 +1,18 @@
-from collections.abc import AsyncGenerator
-
 import pytest
-from httpx import ASGITransport, AsyncClient
+from httpx import AsyncClient
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import (
     UTTERANCE_STATUS_FAILED,
+    UTTERANCE_STATUS_QUEUED,
     UTTERANCE_STATUS_RECEIVED,
     UTTERANCE_STATUS_SENT,
 )
-from app.db import get_async_session
-from app.main import app
 from app.models import Conversation, Speaker, Utterance
 from app.services import chat as chat_service
 
 
-@pytest.fixture()
-async def async_client(
-    async_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
-) -> AsyncClient:
-    monkeypatch.setenv("API_TOKEN", "test-token")
-
-    async def _override_dependency() -> AsyncGenerator[AsyncSession, None]:
-        yield async_session
-
-    app.dependency_overrides[get_async_session] = _override_dependency
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as client:
-        yield client
-    app.dependency_overrides.clear()
-
-
-@pytest.fixture()
-def sms_outbox(monkeypatch: pytest.MonkeyPatch) -> list[dict[str, str]]:
-    outbox: list[dict[str, str]] = []
-
-    async def _fake_send_sms(payload: chat_service.SmsOutboundRequest) -> None:
-        outbox.append(payload.model_dump())
-
-    monkeypatch.setattr(chat_service, "send_sms", _fake_send_sms)
-    return outbox
-
-
 @pytest.mark.asyncio
 async def test_chat_requires_auth(async_client: AsyncClient) -> None:
     response = await async_client.post(
@@ -223,3 +193,93 @@ async def test_chat_marks_failed_on_sms_error(
     bot_utterance = result.scalar_one()
     assert bot_utterance.status == UTTERANCE_STATUS_FAILED
     assert bot_utterance.error is not None
+
+
+@pytest.mark.asyncio
+async def test_chat_worker_mode_leaves_reply_queued(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("REPLY_DISPATCH_MODE", "worker")
+
+    response = await async_client.post(
+        "/chat",
+        headers={"Authorization": "Bearer test-token"},
+        json={"user_id": "u1", "message": "hello"},
+    )
+    assert response.status_code == 202
+    assert sms_outbox == []
+
+    async_session.expire_all()
+    bot_utterance = await async_session.get(
+        Utterance, response.json()["reply_utterance_id"]
+    )
+    assert bot_utterance is not None
+    assert bot_utterance.status == UTTERANCE_STATUS_QUEUED
+    assert bot_utterance.available_at is None
+    assert bot_utterance.attempts == 0
+
+
+@pytest.mark.asyncio
+async def test_chat_batch_reports_per_item_results(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+) -> None:
+    messages = [
+        {"user_id": "u1", "message": "first"},
+        {"user_id": "u2", "message": ""},
+        {"user_id": "u2", "message": "hello"},
+        {"user_id": "u1", "message": "second"},
+        "not an object",
+        {"user_id": "u1", "message": "third"},
+    ]
+    response = await async_client.post(
+        "/chat/batch",
+        headers={"Authorization": "Bearer test-token"},
+        json={"messages": messages},
+    )
+    assert response.status_code == 202
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == [
+        "queued",
+        "invalid",
+        "queued",
+        "queued",
+        "invalid",
+        "queued",
+    ]
+    assert results[1]["errors"] == ["message: String should have at least 1 character"]
+    assert results[0]["conversation_id"] == results[3]["conversation_id"]
+    assert results[0]["conversation_id"] != results[2]["conversation_id"]
+
+    u1_replies = [entry["message"] for entry in sms_outbox if entry["user_id"] == "u1"]
+    assert u1_replies == ["echo:first", "echo:second", "echo:third"]
+    assert len(sms_outbox) == 4
+
+    async_session.expire_all()
+    user_messages = await async_session.execute(
+        select(Utterance.text)
+        .where(Utterance.speaker_id == "u1")
+        .order_by(Utterance.timestamp)
+    )
+    assert list(user_messages.scalars()) == ["first", "second", "third"]
+    status_counts = await async_session.execute(
+        select(Utterance.status, func.count()).group_by(Utterance.status)
+    )
+    assert dict(status_counts.all()) == {
+        UTTERANCE_STATUS_RECEIVED: 4,
+        UTTERANCE_STATUS_SENT: 4,
+    }
+
+
+@pytest.mark.asyncio
+async def test_chat_batch_rejects_empty_batch(async_client: AsyncClient) -> None:
+    response = await async_client.post(
+        "/chat/batch",
+        headers={"Authorization": "Bearer test-token"},
+        json={"messages": []},
+    )
+    assert response.status_code == 422
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from fastapi import BackgroundTasks
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import UTTERANCE_STATUS_SENT, UTTERANCE_STATUS_SUPERSEDED
+from app.models import Utterance
+from app.schemas import ChatRequest
+from app.services import chat as chat_service
+from app.services.ordering import get_conversation_turns
+
+
+@pytest.fixture()
+def generated(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    calls: list[str] = []
+
+    async def _generate(message: str) -> str:
+        calls.append(message)
+        return f"reply {len(calls)}"
+
+    monkeypatch.setattr(chat_service, "_generate_reply", _generate)
+    return calls
+
+
+async def _accept(session: AsyncSession, *messages: str) -> BackgroundTasks:
+    tasks = BackgroundTasks()
+    for message in messages:
+        payload = ChatRequest(user_id="u1", message=message)
+        await chat_service.process_chat(session, payload, tasks)
+    return tasks
+
+
+async def _bot_statuses(session: AsyncSession) -> list[str]:
+    result = await session.execute(
+        select(Utterance.status)
+        .where(Utterance.reply_to_id.is_not(None))
+        .order_by(Utterance.timestamp)
+    )
+    return list(result.scalars().all())
+
+
+@pytest.mark.asyncio
+async def test_burst_gets_one_reply(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    generated: list[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("REPLY_COALESCE_WINDOW_MS", "200")
+    tasks = await _accept(async_session, "hey", "so", "I have a question")
+    await asyncio.gather(*(task.func(*task.args) for task in tasks.tasks))
+
+    assert generated == ["hey\nso\nI have a question"]
+    assert [item["message"] for item in sms_outbox] == ["reply 1"]
+    assert await _bot_statuses(async_session) == [
+        UTTERANCE_STATUS_SUPERSEDED,
+        UTTERANCE_STATUS_SUPERSEDED,
+        UTTERANCE_STATUS_SENT,
+    ]
+    reply = (
+        await async_session.execute(
+            select(Utterance.meta).where(Utterance.status == UTTERANCE_STATUS_SENT)
+        )
+    ).scalar_one()
+    assert reply is not None and len(reply["coalesced"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_answered_messages_are_not_merged_again(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    generated: list[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("REPLY_COALESCE_WINDOW_MS", "1")
+    for message in ("first", "second"):
+        tasks = await _accept(async_session, message)
+        for task in tasks.tasks:
+            await task.func(*task.args)
+
+    assert generated == ["first", "second"]
+    assert len(sms_outbox) == 2
+
+
+@pytest.mark.asyncio
+async def test_latest_reply_running_first_takes_the_burst(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    generated: list[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("REPLY_COALESCE_WINDOW_MS", "1")
+    tasks = await _accept(async_session, "one", "two", "three")
+    # Bypass per-conversation turns, as replies retried by workers on other nodes would.
+    for task in reversed(tasks.tasks):
+        [job], sessionmaker, _ = task.args
+        get_conversation_turns().release(job.bot_utterance_id)
+        await chat_service._run_deferred_reply(
+            job.user_id, job.user_utterance_id, job.bot_utterance_id, sessionmaker
+        )
+
+    assert generated == ["one\ntwo\nthree"]
+    assert len(sms_outbox) == 1
+    assert (await _bot_statuses(async_session)).count(UTTERANCE_STATUS_SUPERSEDED) == 2
@@ -0,0 +1,181 @@
+import datetime
+from collections.abc import Iterator
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db_ops import (
+    CONTEXT_WRITES_KEY,
+    ContextTurn,
+    ContextWrite,
+    close_conversation,
+    ingest_chat_message,
+    list_recent_turns,
+)
+from app.models import Utterance
+from app.services import chat as chat_service
+from app.services import context
+from app.services.context import ContextBuffers, get_reply_context, load_reply_context
+from app.services.pipeline import ReplyPipeline, Stage
+
+AUTH = {"Authorization": "Bearer test-token"}
+T0 = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_buffers() -> Iterator[None]:
+    context.reset_context_buffers()
+    yield
+    context.reset_context_buffers()
+
+
+def _turn(index: int, text: str | None = None) -> ContextTurn:
+    timestamp = T0 + datetime.timedelta(seconds=index)
+    return ContextTurn(f"t{index}", "u1", text or f"turn {index}", timestamp)
+
+
+def _lookups(source: str) -> float:
+    return context._lookups.labels(source=source).value
+
+
+def test_buffers_keep_latest_turns_in_order() -> None:
+    buffers = ContextBuffers(max_turns=3, max_conversations=2)
+    buffers.apply(ContextWrite("c1", _turn(0)))
+    assert buffers.get("c1") is None
+
+    buffers.apply(ContextWrite("c1", _turn(0), created=True))
+    for index in (1, 3, 2, 3):
+        buffers.apply(ContextWrite("c1", _turn(index)))
+    assert [turn.utterance_id for turn in buffers.get("c1") or []] == ["t1", "t2", "t3"]
+
+    buffers.load("c2", [])
+    buffers.load("c3", [])
+    assert buffers.get("c1") is None
+    buffers.apply(ContextWrite("c2", closed=True))
+    assert buffers.get("c2") is None and len(buffers) == 1
+
+
+def test_buffering_can_be_disabled() -> None:
+    buffers = ContextBuffers(max_turns=3, max_conversations=0)
+    buffers.apply(ContextWrite("c1", _turn(0), created=True))
+    assert buffers.get("c1") is None
+
+
+@pytest.mark.asyncio
+async def test_replies_see_recent_turns_without_history_queries(
+    async_client: AsyncClient,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    seen: list[list[str]] = []
+
+    async def _generate(message: str) -> str:
+        seen.append([turn.text for turn in get_reply_context()])
+        return f"echo:{message}"
+
+    monkeypatch.setattr(chat_service, "_generate_reply", _generate)
+    buffered, queried = _lookups("buffer"), _lookups("query")
+
+    for message in ("one", "two", "three"):
+        response = await async_client.post(
+            "/chat", headers=AUTH, json={"user_id": "u1", "message": message}
+        )
+        assert response.status_code == 202
+
+    assert seen == [
+        ["one"],
+        ["one", "echo:one", "two"],
+        ["one", "echo:one", "two", "echo:two", "three"],
+    ]
+    assert (_lookups("buffer"), _lookups("query")) == (buffered + 3, queried)
+    assert len(sms_outbox) == 3
+
+
+@pytest.mark.asyncio
+async def test_cold_buffer_loads_window_once(
+    async_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("CONTEXT_MAX_TURNS", "3")
+    monkeypatch.setenv("CONTEXT_MAX_CHARS", "12")
+    async with async_session.begin():
+        for message in ("first", "second", "third", "fourth"):
+            ingest = await ingest_chat_message(async_session, "u1", message)
+    context.reset_context_buffers()
+    latest = await async_session.get(Utterance, ingest.user_utterance_id)
+    assert latest is not None
+
+    queried = _lookups("query")
+    turns = await load_reply_context(async_session, latest)
+    assert [turn.text for turn in turns] == ["third", "fourth"]
+    assert await load_reply_context(async_session, latest) == turns
+    assert _lookups("query") == queried + 1
+
+    recent = await list_recent_turns(async_session, ingest.conversation_id, 10)
+    assert [turn.text for turn in recent] == ["first", "second", "third", "fourth"]
+
+
+@pytest.mark.asyncio
+async def test_worker_replies_fetch_only_turns_newer_than_the_buffer(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    seen: list[list[str]] = []
+
+    async def _generate(message: str) -> str:
+        seen.append([turn.text for turn in get_reply_context()])
+        return f"echo:{message}"
+
+    monkeypatch.setattr(
+        chat_service,
+        "_custom_pipeline",
+        ReplyPipeline([Stage("generate", _generate, kind="async")]),
+    )
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    lookups = {source: _lookups(source) for source in ("buffer", "delta", "query")}
+
+    for message in ("one", "two", "three"):
+        # Ingested by the API process: this process's buffers never see it.
+        async with async_session.begin():
+            ingest = await ingest_chat_message(async_session, "u1", message)
+            async_session.info.pop(CONTEXT_WRITES_KEY)
+        await chat_service._run_deferred_reply(
+            "u1", ingest.user_utterance_id, ingest.bot_utterance_id, sessionmaker
+        )
+
+    assert seen == [
+        ["one"],
+        ["one", "echo:one", "two"],
+        ["one", "echo:one", "two", "echo:two", "three"],
+    ]
+    assert {source: _lookups(source) - lookups[source] for source in lookups} == {
+        "buffer": 0,
+        "delta": 2,
+        "query": 1,
+    }
+    assert len(sms_outbox) == 3
+
+
+@pytest.mark.asyncio
+async def test_closing_or_rolling_back_leaves_no_stale_turns(
+    async_session: AsyncSession,
+) -> None:
+    async with async_session.begin():
+        ingest = await ingest_chat_message(async_session, "u1", "hello")
+    buffers = context.get_context_buffers()
+    assert buffers.get(ingest.conversation_id) is not None
+
+    await async_session.begin()
+    await ingest_chat_message(async_session, "u1", "discarded")
+    await async_session.rollback()
+    assert [turn.text for turn in buffers.get(ingest.conversation_id) or []] == ["hello"]
+
+    async with async_session.begin():
+        assert await close_conversation(async_session, ingest.conversation_id)
+    assert buffers.get(ingest.conversation_id) is None
+    async with async_session.begin():
+        assert not await close_conversation(async_session, ingest.conversation_id)
+        reopened = await ingest_chat_message(async_session, "u1", "again")
+    assert reopened.conversation_id != ingest.conversation_id
+    assert [turn.text for turn in buffers.get(reopened.conversation_id) or []] == ["again"]
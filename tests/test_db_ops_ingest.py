@@ -0,0 +1,150 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import pytest
+from sqlalchemy import event, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import UTTERANCE_STATUS_QUEUED, UTTERANCE_STATUS_RECEIVED
+from app.db_ops import bot_speaker_id, ingest_chat_message, ingest_chat_messages
+from app.models import Conversation, Speaker, Utterance
+
+
+@contextmanager
+def _count_statements(session: AsyncSession) -> Iterator[list[str]]:
+    statements: list[str] = []
+    bind = session.bind
+    assert bind is not None
+    engine = bind.sync_engine
+
+    def _before_cursor_execute(*args: Any) -> None:
+        statements.append(args[2])
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@pytest.mark.asyncio
+async def test_ingest_chat_message_uses_two_statements(
+    async_session: AsyncSession,
+) -> None:
+    await async_session.execute(text("SELECT 1"))
+    await async_session.commit()
+
+    with _count_statements(async_session) as statements:
+        ingest = await ingest_chat_message(async_session, "user-1", "hello")
+        await async_session.commit()
+
+    assert len(statements) == 2
+
+    speakers = await async_session.execute(select(Speaker).order_by(Speaker.id))
+    assert [(s.id, s.meta) for s in speakers.scalars()] == [
+        (bot_speaker_id("user-1"), {"type": "bot"}),
+        ("user-1", {"type": "user"}),
+    ]
+
+    conversation = await async_session.get(Conversation, ingest.conversation_id)
+    assert conversation is not None
+    assert conversation.owner_speaker_id == "user-1"
+    assert conversation.status == "open"
+
+    user_utterance = await async_session.get(Utterance, ingest.user_utterance_id)
+    bot_utterance = await async_session.get(Utterance, ingest.bot_utterance_id)
+    assert user_utterance is not None
+    assert bot_utterance is not None
+    assert user_utterance.text == "hello"
+    assert user_utterance.status == UTTERANCE_STATUS_RECEIVED
+    assert bot_utterance.text is None
+    assert bot_utterance.status == UTTERANCE_STATUS_QUEUED
+    assert bot_utterance.reply_to_id == user_utterance.id
+    assert bot_utterance.speaker_id == bot_speaker_id("user-1")
+    assert bot_utterance.timestamp >= user_utterance.timestamp
+
+
+@pytest.mark.asyncio
+async def test_ingest_chat_message_reuses_open_conversation(
+    async_session: AsyncSession,
+) -> None:
+    first = await ingest_chat_message(async_session, "user-1", "hello")
+    await async_session.commit()
+    first_activity = (
+        await async_session.execute(
+            select(Conversation.last_activity_at).where(
+                Conversation.id == first.conversation_id
+            )
+        )
+    ).scalar_one()
+
+    second = await ingest_chat_message(async_session, "user-1", "again")
+    await async_session.commit()
+
+    assert second.conversation_id == first.conversation_id
+    conversation_count = await async_session.execute(
+        select(func.count()).select_from(Conversation)
+    )
+    speaker_count = await async_session.execute(select(func.count()).select_from(Speaker))
+    utterance_count = await async_session.execute(
+        select(func.count()).select_from(Utterance)
+    )
+    assert conversation_count.scalar_one() == 1
+    assert speaker_count.scalar_one() == 2
+    assert utterance_count.scalar_one() == 4
+
+    last_activity = (
+        await async_session.execute(
+            select(Conversation.last_activity_at).where(
+                Conversation.id == first.conversation_id
+            )
+        )
+    ).scalar_one()
+    assert last_activity >= first_activity
+
+
+@pytest.mark.asyncio
+async def test_ingest_chat_messages_batch_uses_two_statements(
+    async_session: AsyncSession,
+) -> None:
+    await ingest_chat_message(async_session, "user-0", "existing")
+    await async_session.commit()
+    messages = [(f"user-{index % 7}", f"message-{index}") for index in range(200)]
+
+    with _count_statements(async_session) as statements:
+        ingests = await ingest_chat_messages(async_session, messages)
+        await async_session.commit()
+
+    assert len(statements) == 2
+    assert len(ingests) == 200
+    conversation_count = await async_session.execute(
+        select(func.count()).select_from(Conversation)
+    )
+    assert conversation_count.scalar_one() == 7
+
+    ordered = await async_session.execute(
+        select(Utterance.text)
+        .where(Utterance.speaker_id == "user-3")
+        .order_by(Utterance.timestamp)
+    )
+    assert list(ordered.scalars()) == [
+        message for user_id, message in messages if user_id == "user-3"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_ingest_chat_messages_chunks_many_users(
+    async_session: AsyncSession,
+) -> None:
+    messages = [(f"user-{index}", f"message-{index}") for index in range(1001)]
+
+    with _count_statements(async_session) as statements:
+        ingests = await ingest_chat_messages(async_session, messages)
+        await async_session.commit()
+
+    # Three chunks of at most 500 users, then three of at most 1000 utterances.
+    assert len(statements) == 6
+    assert len({ingest.conversation_id for ingest in ingests}) == 1001
+    speaker_count = await async_session.execute(select(func.count()).select_from(Speaker))
+    assert speaker_count.scalar_one() == 2002
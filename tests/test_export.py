@@ -0,0 +1,137 @@
+import gzip
+import json
+import os
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import export as export_cli
+from app.config import UTTERANCE_STATUS_SUPERSEDED
+from app.db import get_engine, get_session_engine
+from app.db_ops import ingest_chat_messages
+from app.models import Utterance
+from app.services.export import UtteranceExportFilter, iter_utterance_ndjson
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+
+async def _seed(async_session: AsyncSession) -> None:
+    await ingest_chat_messages(
+        async_session, [("u1", "one"), ("u2", "two"), ("u1", "three")]
+    )
+    await async_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_export_streams_ndjson_in_chunks(
+    async_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("EXPORT_CHUNK_ROWS", "2")
+    await _seed(async_session)
+
+    chunks = [
+        chunk
+        async for chunk in iter_utterance_ndjson(
+            get_session_engine(async_session), UtteranceExportFilter()
+        )
+    ]
+    assert len(chunks) == 3
+    records = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert len(records) == 6
+    assert set(records[0]) == {
+        "id",
+        "conversation_id",
+        "speaker_id",
+        "reply_to_id",
+        "timestamp",
+        "status",
+        "text",
+        "error",
+        "meta",
+    }
+
+
+@pytest.mark.asyncio
+async def test_export_endpoint_filters(
+    async_client: AsyncClient, async_session: AsyncSession
+) -> None:
+    await _seed(async_session)
+
+    response = await async_client.get(
+        "/exports/utterances",
+        headers=AUTH,
+        params={"speaker_id": "u1", "status": "received"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(record["text"] for record in records) == ["one", "three"]
+
+
+@pytest.mark.asyncio
+async def test_export_endpoint_accepts_every_status(
+    async_client: AsyncClient, async_session: AsyncSession
+) -> None:
+    await _seed(async_session)
+    await async_session.execute(
+        update(Utterance)
+        .where(Utterance.text == "two")
+        .values(status=UTTERANCE_STATUS_SUPERSEDED)
+        .execution_options(synchronize_session=False)
+    )
+    await async_session.commit()
+
+    response = await async_client.get(
+        "/exports/utterances", headers=AUTH, params={"status": UTTERANCE_STATUS_SUPERSEDED}
+    )
+    assert response.status_code == 200
+    assert [json.loads(line)["text"] for line in response.text.splitlines()] == ["two"]
+
+    response = await async_client.get(
+        "/exports/utterances", headers=AUTH, params={"status": "lost"}
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_export_endpoint_gzip(
+    async_client: AsyncClient, async_session: AsyncSession
+) -> None:
+    await _seed(async_session)
+
+    response = await async_client.get(
+        "/exports/utterances", headers=AUTH, params={"gzip": "true", "status": "queued"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    records = [json.loads(line) for line in gzip.decompress(response.content).splitlines()]
+    assert len(records) == 3
+    assert all(record["text"] is None for record in records)
+
+
+@pytest.mark.asyncio
+async def test_export_requires_auth(async_client: AsyncClient) -> None:
+    response = await async_client.get("/exports/utterances")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_export_cli_writes_file(
+    async_session: AsyncSession, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    await _seed(async_session)
+    monkeypatch.setenv("DATABASE_URL", os.environ["DATABASE_URL_TEST"])
+    get_engine.cache_clear()
+
+    output = tmp_path / "utterances.ndjson"
+    with output.open("wb") as handle:
+        await export_cli.export_utterances(
+            handle, UtteranceExportFilter(speaker_id="u2"), gzip=False
+        )
+    get_engine.cache_clear()
+
+    records = [json.loads(line) for line in output.read_bytes().splitlines()]
+    assert [record["text"] for record in records] == ["two"]
@@ -0,0 +1,134 @@
+import datetime
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db_ops import ingest_chat_messages
+from app.services.history import decode_cursor, encode_cursor
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+
+async def _seed(async_session: AsyncSession, count: int) -> str:
+    ingests = await ingest_chat_messages(
+        async_session, [("u1", f"msg-{index}") for index in range(count)]
+    )
+    await async_session.commit()
+    return ingests[0].conversation_id
+
+
+@pytest.mark.asyncio
+async def test_history_requires_auth(async_client: AsyncClient) -> None:
+    response = await async_client.get("/conversations/abc/utterances")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_conversation_utterances_pages_by_cursor(
+    async_client: AsyncClient, async_session: AsyncSession
+) -> None:
+    conversation_id = await _seed(async_session, 5)
+
+    texts: list[str | None] = []
+    cursor = None
+    pages = 0
+    while True:
+        params: dict[str, str | int] = {"limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        response = await async_client.get(
+            f"/conversations/{conversation_id}/utterances", headers=AUTH, params=params
+        )
+        assert response.status_code == 200
+        body = response.json()
+        pages += 1
+        texts.extend(item["text"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert texts == [
+        text for index in range(5) for text in (f"msg-{index}", None)
+    ]
+    assert set(response.json()["items"][0]) == {
+        "id",
+        "speaker_id",
+        "reply_to_id",
+        "timestamp",
+        "status",
+        "text",
+        "error",
+    }
+
+
+@pytest.mark.asyncio
+async def test_conversation_utterances_descending(
+    async_client: AsyncClient, async_session: AsyncSession
+) -> None:
+    conversation_id = await _seed(async_session, 3)
+
+    first = await async_client.get(
+        f"/conversations/{conversation_id}/utterances",
+        headers=AUTH,
+        params={"limit": 2, "order": "desc"},
+    )
+    body = first.json()
+    assert [item["text"] for item in body["items"]] == [None, "msg-2"]
+
+    second = await async_client.get(
+        f"/conversations/{conversation_id}/utterances",
+        headers=AUTH,
+        params={"limit": 2, "order": "desc", "cursor": body["next_cursor"]},
+    )
+    assert [item["text"] for item in second.json()["items"]] == [None, "msg-1"]
+
+    # A descending cursor cannot continue an ascending listing.
+    mismatched = await async_client.get(
+        f"/conversations/{conversation_id}/utterances",
+        headers=AUTH,
+        params={"limit": 2, "cursor": body["next_cursor"]},
+    )
+    assert mismatched.status_code == 400
+    assert mismatched.json()["detail"] == "Cursor was issued for order=desc."
+
+
+@pytest.mark.asyncio
+async def test_conversation_utterances_errors(
+    async_client: AsyncClient, async_session: AsyncSession
+) -> None:
+    conversation_id = await _seed(async_session, 1)
+
+    missing = await async_client.get("/conversations/missing/utterances", headers=AUTH)
+    assert missing.status_code == 404
+
+    bad_cursor = await async_client.get(
+        f"/conversations/{conversation_id}/utterances",
+        headers=AUTH,
+        params={"cursor": "not-a-cursor"},
+    )
+    assert bad_cursor.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_speaker_conversations(
+    async_client: AsyncClient, async_session: AsyncSession
+) -> None:
+    conversation_id = await _seed(async_session, 1)
+
+    response = await async_client.get("/speakers/u1/conversations", headers=AUTH)
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == [conversation_id]
+    assert body["items"][0]["status"] == "open"
+    assert body["next_cursor"] is None
+
+    missing = await async_client.get("/speakers/nobody/conversations", headers=AUTH)
+    assert missing.status_code == 404
+
+
+def test_cursor_round_trip() -> None:
+    timestamp = datetime.datetime(2026, 1, 2, 3, 4, 5, 6, tzinfo=datetime.UTC)
+    assert decode_cursor(encode_cursor(timestamp, "abc")) == (timestamp, "abc")
+    assert decode_cursor(encode_cursor(timestamp, "abc", True), True) == (timestamp, "abc")
@@ -0,0 +1,133 @@
+import asyncio
+import datetime
+
+import pytest
+from fastapi import BackgroundTasks
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db import get_session_engine
+from app.db_ops import (
+    ChatIngest,
+    claim_chat_idempotency_key,
+    delete_expired_chat_idempotency_keys,
+)
+from app.models import ChatIdempotencyKey, Utterance
+from app.query_stats import assert_max_queries
+from app.schemas import ChatRequest
+from app.services import chat as chat_service
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+
+async def _utterance_count(session: AsyncSession) -> int:
+    return (await session.execute(select(func.count()).select_from(Utterance))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_retried_request_replays_first_response(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+) -> None:
+    replays = chat_service._idempotent_replays.value
+    headers = {**AUTH, "Idempotency-Key": "webhook-1"}
+    payload = {"user_id": "u1", "message": "hello"}
+
+    first = await async_client.post("/chat", headers=headers, json=payload)
+    retry = await async_client.post("/chat", headers=headers, json=payload)
+    other_user = await async_client.post(
+        "/chat", headers=headers, json={"user_id": "u2", "message": "hello"}
+    )
+
+    assert first.status_code == retry.status_code == 202
+    assert retry.json() == first.json()
+    assert other_user.json()["reply_utterance_id"] != first.json()["reply_utterance_id"]
+    assert await _utterance_count(async_session) == 4
+    assert len(sms_outbox) == 2
+    assert chat_service._idempotent_replays.value == replays + 1
+
+
+@pytest.mark.asyncio
+async def test_provider_message_id_is_a_key(
+    async_client: AsyncClient, sms_outbox: list[dict[str, str]]
+) -> None:
+    payload = {"user_id": "u1", "message": "hello", "provider_message_id": "SM123"}
+    first = await async_client.post("/chat", headers=AUTH, json=payload)
+    retry = await async_client.post("/chat", headers=AUTH, json=payload)
+    assert retry.json() == first.json()
+    assert len(sms_outbox) == 1
+
+    batch = await async_client.post("/chat/batch", headers=AUTH, json={"messages": [payload]})
+    assert batch.json()["results"][0]["status"] == "invalid"
+
+
+@pytest.mark.asyncio
+async def test_replay_is_one_lookup(async_session: AsyncSession) -> None:
+    payload = ChatRequest(user_id="u1", message="hello")
+    first = await chat_service.process_chat(async_session, payload, BackgroundTasks(), "k1")
+
+    tasks = BackgroundTasks()
+    with assert_max_queries(1):
+        replay = await chat_service.process_chat(async_session, payload, tasks, "k1")
+    assert replay == first
+    assert not tasks.tasks
+
+
+@pytest.mark.asyncio
+async def test_concurrent_retries_share_one_ingest(async_session: AsyncSession) -> None:
+    sessionmaker = async_sessionmaker(get_session_engine(async_session), expire_on_commit=False)
+    payload = ChatRequest(user_id="u1", message="hello")
+
+    async def _post() -> object:
+        async with sessionmaker() as session:
+            return await chat_service.process_chat(session, payload, BackgroundTasks(), "k1")
+
+    first, second = await asyncio.gather(_post(), _post())
+    assert first == second
+    assert await _utterance_count(async_session) == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_keys_are_reclaimed_and_purged(async_session: AsyncSession) -> None:
+    now = datetime.datetime.now(datetime.UTC)
+    past = now - datetime.timedelta(seconds=1)
+    async with async_session.begin():
+        for key in ("old-1", "old-2", "old-3"):
+            stale = ChatIngest("c" * 32, "", "b" * 32)
+            assert await claim_chat_idempotency_key(async_session, "u1", key, stale, past)
+
+    payload = ChatRequest(user_id="u1", message="hello")
+    fresh = await chat_service.process_chat(async_session, payload, BackgroundTasks(), "old-1")
+    assert fresh.reply_utterance_id != "b" * 32
+
+    async with async_session.begin():
+        assert await delete_expired_chat_idempotency_keys(async_session, now, limit=1) == 1
+        assert await delete_expired_chat_idempotency_keys(async_session, now, limit=10) == 1
+        keys = (await async_session.execute(select(ChatIdempotencyKey.key))).scalars().all()
+    assert keys == ["old-1"]
+
+
+@pytest.mark.asyncio
+async def test_purge_deletes_every_expired_key(
+    async_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(chat_service, "IDEMPOTENCY_PURGE_BATCH", 2)
+    now = datetime.datetime.now(datetime.UTC)
+    async with async_session.begin():
+        for index in range(5):
+            stale = ChatIngest("c" * 32, "", "b" * 32)
+            past = now - datetime.timedelta(seconds=1)
+            assert await claim_chat_idempotency_key(
+                async_session, "u1", f"old-{index}", stale, past
+            )
+        live = ChatIngest("c" * 32, "", "b" * 32)
+        future = now + datetime.timedelta(hours=1)
+        assert await claim_chat_idempotency_key(async_session, "u1", "live", live, future)
+
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    assert await chat_service._purge_idempotency_keys(sessionmaker) == 5
+
+    keys = (await async_session.execute(select(ChatIdempotencyKey.key))).scalars().all()
+    assert keys == ["live"]
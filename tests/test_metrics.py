@@ -0,0 +1,84 @@
+import os
+
+import pytest
+from httpx import AsyncClient
+
+from app import metrics
+from app.db import get_engine
+from app.services import chat as chat_service
+from app.services import pipeline as pipeline_service
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    histogram = metrics.Histogram("test_seconds", "Test.", ["stage"], buckets=(0.1, 1.0))
+    child = histogram.labels(stage="qa")
+    child.observe(0.05)
+    child.observe(0.1)
+    child.observe(3.0)
+
+    assert histogram.render() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="qa",le="0.1"} 2',
+        'test_seconds_bucket{stage="qa",le="1"} 2',
+        'test_seconds_bucket{stage="qa",le="+Inf"} 3',
+        'test_seconds_sum{stage="qa"} 3.15',
+        'test_seconds_count{stage="qa"} 3',
+    ]
+
+
+def test_labeled_counter_renders_each_child() -> None:
+    counter = metrics.Counter("test_total", "Test.", ["code"])
+    counter.labels(code=200).inc()
+    counter.labels(code="200").inc(2)
+    counter.labels(code=502).inc()
+
+    assert counter.render()[2:] == ['test_total{code="200"} 3', 'test_total{code="502"} 1']
+
+
+@pytest.mark.asyncio
+async def test_chat_reply_records_stage_and_transition_metrics(
+    async_client: AsyncClient, sms_outbox: list[dict[str, str]]
+) -> None:
+    stages = ("ingest", "generate", "contribute", "qa")
+    before = {
+        stage: pipeline_service._stage_seconds.labels(stage=stage).count for stage in stages
+    }
+    sent = chat_service._status_transitions.labels(from_status="queued", to_status="sent")
+    sent_before = sent.value
+    end_to_end_before = chat_service._reply_seconds.count
+
+    response = await async_client.post(
+        "/chat",
+        headers={"Authorization": "Bearer test-token"},
+        json={"user_id": "u1", "message": "hello"},
+    )
+    assert response.status_code == 202
+    assert len(sms_outbox) == 1
+
+    for stage in stages:
+        assert pipeline_service._stage_seconds.labels(stage=stage).count == before[stage] + 1
+    assert sent.value == sent_before + 1
+    assert chat_service._reply_seconds.count == end_to_end_before + 1
+
+    body = (await async_client.get("/metrics")).text
+    assert 'texet_pipeline_stage_seconds_bucket{stage="generate",le="+Inf"}' in body
+    received = 'from_status="new",to_status="received"'
+    assert f"texet_utterance_status_transitions_total{{{received}}}" in body
+    assert "# TYPE texet_reply_end_to_end_seconds histogram" in body
+
+
+@pytest.mark.asyncio
+async def test_engine_exports_pool_gauges(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("DATABASE_URL", os.environ["DATABASE_URL_TEST"])
+    get_engine.cache_clear()
+    engine = get_engine()
+    try:
+        async with engine.connect():
+            body = metrics.render_metrics()
+            assert "texet_db_pool_checked_out 1" in body
+            assert "texet_db_pool_overflow 0" in body
+            assert "texet_db_pool_wait_seconds_count" in body
+    finally:
+        await engine.dispose()
+        get_engine.cache_clear()
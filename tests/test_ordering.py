@@ -0,0 +1,128 @@
+import asyncio
+import random
+from collections import Counter
+
+import pytest
+from fastapi import BackgroundTasks
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_session_engine
+from app.schemas import ChatRequest
+from app.services import chat as chat_service
+from app.services.ordering import ADVISORY_LOCK_NAMESPACE, ConversationTurns
+
+
+@pytest.mark.asyncio
+async def test_turns_follow_reservation_order() -> None:
+    turns = ConversationTurns(stall_seconds=5)
+    for token in ("a1", "a2", "a3"):
+        turns.reserve("a", token)
+    ran: list[str] = []
+
+    async def _reply(token: str) -> None:
+        await turns.acquire(token[0], token)
+        ran.append(token)
+        await asyncio.sleep(0)
+        turns.release(token)
+
+    await asyncio.gather(_reply("a3"), _reply("b1"), _reply("a2"), _reply("a1"))
+    assert [token for token in ran if token.startswith("a")] == ["a1", "a2", "a3"]
+    assert ran[0] == "b1"
+    assert len(turns) == 0
+
+
+@pytest.mark.asyncio
+async def test_reply_that_never_starts_loses_its_turn() -> None:
+    turns = ConversationTurns(stall_seconds=0.05)
+    turns.reserve("a", "lost")
+    await asyncio.wait_for(turns.acquire("a", "next"), timeout=1)
+    turns.release("next")
+    assert len(turns) == 0
+
+
+async def _stress(
+    session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+    users: int,
+    messages: int,
+) -> int:
+    """Replies for every user at once in shuffled start order; returns peak concurrency."""
+    running: Counter[str] = Counter()
+    peak = 0
+    rng = random.Random(7)
+
+    async def _generate(message: str) -> str:
+        nonlocal peak
+        user = message.split(":")[0]
+        running[user] += 1
+        assert running[user] == 1, f"{user} has overlapping replies"
+        peak = max(peak, sum(running.values()))
+        await asyncio.sleep(rng.uniform(0, 0.01))
+        running[user] -= 1
+        return f"re {message}"
+
+    monkeypatch.setattr(chat_service, "_generate_reply", _generate)
+    tasks = BackgroundTasks()
+    for index in range(messages):
+        for user in range(users):
+            payload = ChatRequest(user_id=f"u{user}", message=f"u{user}:{index}")
+            await chat_service.process_chat(session, payload, tasks)
+
+    started = list(tasks.tasks)
+    rng.shuffle(started)
+    await asyncio.gather(*(task.func(*task.args) for task in started))
+
+    assert len(sms_outbox) == users * messages
+    for user in range(users):
+        sent = [item["message"] for item in sms_outbox if item["user_id"] == f"u{user}"]
+        assert sent == [f"re u{user}:{index}" for index in range(messages)]
+    return peak
+
+
+@pytest.mark.asyncio
+async def test_replies_stay_ordered_under_concurrency(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    peak = await _stress(async_session, sms_outbox, monkeypatch, users=25, messages=8)
+    assert peak > 1
+
+
+@pytest.mark.asyncio
+async def test_advisory_locks_serialize_across_processes(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("REPLY_ORDERING_ADVISORY_LOCKS", "true")
+    engine = get_session_engine(async_session)
+    held: list[int] = []
+
+    async def _generate(message: str) -> str:
+        async with engine.connect() as connection:
+            locks = await connection.execute(
+                select(func.count())
+                .select_from(text("pg_locks"))
+                .where(text(f"locktype = 'advisory' AND classid = {ADVISORY_LOCK_NAMESPACE}"))
+            )
+            held.append(locks.scalar_one())
+        return f"re {message}"
+
+    monkeypatch.setattr(chat_service, "_generate_reply", _generate)
+    tasks = BackgroundTasks()
+    for message in ("first", "second"):
+        await chat_service.process_chat(
+            async_session, ChatRequest(user_id="u1", message=message), tasks
+        )
+    await asyncio.gather(*(task.func(*task.args) for task in tasks.tasks))
+
+    assert held == [1, 1]
+    assert [item["message"] for item in sms_outbox] == ["re first", "re second"]
+    async with engine.connect() as connection:
+        remaining = await connection.execute(
+            text(f"SELECT count(*) FROM pg_locks WHERE classid = {ADVISORY_LOCK_NAMESPACE}")
+        )
+        assert remaining.scalar_one() == 0
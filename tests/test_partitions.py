@@ -0,0 +1,143 @@
+import datetime
+from collections.abc import AsyncIterator
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.db import get_session_engine
+from app.db_ops import ingest_chat_messages
+from app.models import Utterance
+from app.partitions import drop_expired_utterance_partitions, ensure_utterance_partitions
+
+FUTURE = datetime.datetime(2040, 11, 15, tzinfo=datetime.UTC)
+PAST = datetime.datetime(2000, 1, 15, tzinfo=datetime.UTC)
+
+
+@pytest.fixture()
+async def engine(async_session: AsyncSession) -> AsyncIterator[AsyncEngine]:
+    engine = get_session_engine(async_session)
+    yield engine
+    async with engine.begin() as connection:
+        names = await connection.execute(
+            text(
+                "SELECT relname FROM pg_class "
+                "WHERE relkind = 'r' AND relname ~ '^utterances_p(2000|204)'"
+            )
+        )
+        for name in names.scalars().all():
+            await connection.execute(text(f"DROP TABLE {name}"))
+
+
+async def _partitions(engine: AsyncEngine) -> set[str]:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text(
+                "SELECT inhrelid::regclass::text FROM pg_inherits "
+                "WHERE inhparent = 'utterances'::regclass"
+            )
+        )
+        return set(result.scalars().all())
+
+
+async def _insert_at(engine: AsyncEngine, timestamp: datetime.datetime) -> str:
+    async with engine.begin() as connection:
+        await connection.execute(
+            text(
+                "INSERT INTO speakers (id, created_at) VALUES ('u1', now()) "
+                "ON CONFLICT DO NOTHING"
+            )
+        )
+        await connection.execute(
+            text(
+                "INSERT INTO conversations (id, owner_speaker_id, status, created_at, "
+                "last_activity_at) VALUES ('c1', 'u1', 'open', now(), now()) "
+                "ON CONFLICT DO NOTHING"
+            )
+        )
+        await connection.execute(
+            text(
+                "INSERT INTO utterances (id, conversation_id, speaker_id, timestamp, "
+                "created_at, status) VALUES ('x1', 'c1', 'u1', :ts, now(), 'received')"
+            ),
+            {"ts": timestamp},
+        )
+    return "x1"
+
+
+async def _partition_of(engine: AsyncEngine, utterance_id: str) -> str:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text("SELECT tableoid::regclass::text FROM utterances WHERE id = :id"),
+            {"id": utterance_id},
+        )
+        return str(result.scalar_one())
+
+
+@pytest.mark.asyncio
+async def test_ensure_creates_future_partitions(engine: AsyncEngine) -> None:
+    async with engine.begin() as connection:
+        created = await ensure_utterance_partitions(connection, months_ahead=2, now=FUTURE)
+    assert created == ["utterances_p2040_11", "utterances_p2040_12", "utterances_p2041_01"]
+
+    async with engine.begin() as connection:
+        again = await ensure_utterance_partitions(connection, months_ahead=2, now=FUTURE)
+    assert again == []
+    assert set(created) <= await _partitions(engine)
+
+    utterance_id = await _insert_at(engine, FUTURE)
+    assert await _partition_of(engine, utterance_id) == "utterances_p2040_11"
+
+
+@pytest.mark.asyncio
+async def test_ensure_moves_rows_out_of_default_partition(engine: AsyncEngine) -> None:
+    utterance_id = await _insert_at(engine, FUTURE)
+    assert await _partition_of(engine, utterance_id) == "utterances_default"
+
+    async with engine.begin() as connection:
+        await ensure_utterance_partitions(connection, months_ahead=0, now=FUTURE)
+    assert await _partition_of(engine, utterance_id) == "utterances_p2040_11"
+
+
+@pytest.mark.asyncio
+async def test_prune_drops_or_detaches_expired_partitions(engine: AsyncEngine) -> None:
+    async with engine.begin() as connection:
+        await ensure_utterance_partitions(connection, months_ahead=2, now=PAST)
+
+    # Partitions of the real current months are newer than every cutoff here.
+    later = datetime.datetime(2000, 4, 1, tzinfo=datetime.UTC)
+    async with engine.begin() as connection:
+        detached = await drop_expired_utterance_partitions(
+            connection, retention_months=2, detach_only=True, now=later
+        )
+    assert detached == ["utterances_p2000_01"]
+
+    async with engine.begin() as connection:
+        dropped = await drop_expired_utterance_partitions(
+            connection, retention_months=1, now=later
+        )
+        assert await drop_expired_utterance_partitions(connection, retention_months=0) == []
+    assert dropped == ["utterances_p2000_02"]
+
+    partitions = await _partitions(engine)
+    assert "utterances_p2000_03" in partitions
+    assert "utterances_default" in partitions
+    assert not {"utterances_p2000_01", "utterances_p2000_02"} & partitions
+    async with engine.connect() as connection:
+        kept = await connection.execute(text("SELECT to_regclass('utterances_p2000_01')"))
+        assert kept.scalar_one() is not None
+
+
+@pytest.mark.asyncio
+async def test_orm_reads_utterances_by_id(async_session: AsyncSession) -> None:
+    [ingest] = await ingest_chat_messages(async_session, [("u1", "hello")])
+    await async_session.commit()
+    async_session.expunge_all()
+
+    utterance = await async_session.get(Utterance, ingest.bot_utterance_id)
+    assert utterance is not None
+    assert utterance.reply_to_id == ingest.user_utterance_id
+    user = await async_session.scalar(
+        select(Utterance).where(Utterance.id == utterance.reply_to_id)
+    )
+    assert user is not None and user.text == "hello"
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services import chat as chat_service
+from app.services.pipeline import (
+    Check,
+    ReplyPipeline,
+    Stage,
+    shutdown_process_pool,
+)
+from app.services.trace import ReplyTrace
+
+
+async def _slow_check(_: str) -> None:
+    await asyncio.sleep(0.1)
+
+
+@pytest.mark.asyncio
+async def test_thread_stage_runs_off_the_event_loop() -> None:
+    loop_thread = threading.get_ident()
+    seen: list[int] = []
+
+    def _blocking(message: str) -> str:
+        seen.append(threading.get_ident())
+        return message + "!"
+
+    pipeline = ReplyPipeline([Stage("ingest", _blocking, kind="thread")])
+    assert await pipeline.run("hi") == "hi!"
+    assert seen and seen[0] != loop_thread
+
+
+@pytest.mark.asyncio
+async def test_process_stage_runs_in_process_pool() -> None:
+    pipeline = ReplyPipeline([Stage("ingest", str.upper, kind="process")])
+    try:
+        assert await pipeline.run("hello") == "HELLO"
+    finally:
+        shutdown_process_pool()
+
+
+@pytest.mark.asyncio
+async def test_checks_run_concurrently_and_pass_message_through() -> None:
+    pipeline = ReplyPipeline(
+        [
+            Stage(
+                "qa",
+                checks=(
+                    Check("first", _slow_check, kind="async"),
+                    Check("second", _slow_check, kind="async"),
+                    Check("third", str.strip),
+                ),
+            )
+        ]
+    )
+    trace = ReplyTrace()
+    started = time.perf_counter()
+    assert await pipeline.run("hello", trace) == "hello"
+    assert time.perf_counter() - started < 0.18
+    assert "qa_ms" in trace.durations
+
+
+@pytest.mark.asyncio
+async def test_failing_check_keeps_error_contract() -> None:
+    def _reject(_: str) -> None:
+        raise ValueError("flagged")
+
+    pipeline = ReplyPipeline(
+        [Stage("qa", checks=(Check("ok", _slow_check, kind="async"), Check("bad", _reject)))]
+    )
+    with pytest.raises(RuntimeError, match="^pipeline:qa failed: flagged$"):
+        await pipeline.run("hello")
+
+
+@pytest.mark.asyncio
+async def test_stage_timeout(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def _hang(message: str) -> str:
+        await asyncio.sleep(5)
+        return message
+
+    pipeline = ReplyPipeline([Stage("generate", _hang, kind="async", timeout_seconds=0.05)])
+    with pytest.raises(RuntimeError, match="^pipeline:generate failed: timed out after 0.05s$"):
+        await pipeline.run("hello")
+
+    monkeypatch.setenv("PIPELINE_GENERATE_TIMEOUT_SECONDS", "0.02")
+    pipeline = ReplyPipeline([Stage("generate", _hang, kind="async")])
+    with pytest.raises(RuntimeError, match="timed out after 0.02s"):
+        await pipeline.run("hello")
+
+
+@pytest.mark.asyncio
+async def test_custom_pipeline_replaces_default() -> None:
+    chat_service.set_reply_pipeline(ReplyPipeline([Stage("ingest", str.title)]))
+    try:
+        assert await chat_service._run_pipeline("hello there") == "Hello There"
+    finally:
+        chat_service.set_reply_pipeline(None)
+    assert await chat_service._run_pipeline("hello") == "echo:hello"
+
+
+def test_stage_requires_func_or_checks() -> None:
+    with pytest.raises(ValueError):
+        Stage("empty")
+    with pytest.raises(ValueError):
+        ReplyPipeline([Stage("a", str.strip), Stage("a", str.strip)])
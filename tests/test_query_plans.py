@@ -0,0 +1,143 @@
+import datetime
+import json
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_session_engine
+from app.db_ops import (
+    claim_reply_jobs,
+    list_conversation_utterances,
+    list_recent_turns,
+    list_speaker_conversations,
+)
+from app.services.export import UtteranceExportFilter, _export_query
+
+T0 = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+
+Query = Callable[[AsyncSession], Awaitable[object]]
+
+# Each entry runs the app's own query; the plan of every statement it sends
+# is checked, so these follow the code rather than a copy of its SQL.
+HOT_QUERIES: list[tuple[str, str, Query]] = [
+    (
+        "ix_utterances_conversation_timestamp",
+        "reply context",
+        lambda session: list_recent_turns(session, "c1", 20),
+    ),
+    (
+        "ix_utterances_conversation_timestamp",
+        "history page",
+        lambda session: list_conversation_utterances(session, "c1", 50, after=(T0, "u1")),
+    ),
+    (
+        "ix_conversations_owner_created",
+        "conversation page",
+        lambda session: list_speaker_conversations(session, "u1", 50, after=(T0, "c1")),
+    ),
+    (
+        "ix_utterances_speaker_timestamp",
+        "export by speaker",
+        lambda session: session.execute(_export_query(UtteranceExportFilter(speaker_id="u1"))),
+    ),
+    (
+        "ix_utterances_pending",
+        "export failed",
+        lambda session: session.execute(_export_query(UtteranceExportFilter(status="failed"))),
+    ),
+    (
+        "ix_utterances_pending",
+        "worker claim",
+        lambda session: claim_reply_jobs(session, 10, 300),
+    ),
+    (
+        "ix_utterances_pending",
+        "parked drain",
+        lambda session: claim_reply_jobs(session, 10, 300, parked=True),
+    ),
+    (
+        "ix_utterances_pending",
+        "stuck reply sweep",
+        lambda session: claim_reply_jobs(
+            session, 100, 300, parked=False, received_before=T0, exclude_ids=["b1"]
+        ),
+    ),
+]
+
+
+def _index_names(plan: dict[str, Any]) -> set[str]:
+    names = set()
+    if "Index Name" in plan:
+        names.add(str(plan["Index Name"]))
+    for child in plan.get("Plans", []):
+        names |= _index_names(child)
+    return names
+
+
+async def _parent_index_names(session: AsyncSession, names: set[str]) -> set[str]:
+    # Scans of a partitioned table name each partition's index; map those back
+    # to the index declared on the parent table.
+    result = await session.execute(
+        text(
+            "SELECT coalesce(parent.relname, child.relname) FROM pg_class child "
+            "LEFT JOIN pg_inherits ON pg_inherits.inhrelid = child.oid "
+            "LEFT JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE child.relname = ANY(:names)"
+        ),
+        {"names": list(names)},
+    )
+    return set(result.scalars().all())
+
+
+@contextmanager
+def _captured_statements(session: AsyncSession) -> Iterator[list[tuple[str, Any]]]:
+    statements: list[tuple[str, Any]] = []
+    engine = get_session_engine(session).sync_engine
+
+    def _capture(
+        conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+    ) -> None:
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _capture)
+
+
+async def _plan_index_names(session: AsyncSession, query: Query) -> set[str]:
+    """The indexes the planner picks for the statements `query` sends."""
+    with _captured_statements(session) as statements:
+        async with session.begin():
+            await query(session)
+    assert statements
+    names: set[str] = set()
+    # The test tables are nearly empty, so take sequential scans off the table
+    # and check that the planner has a matching index to fall back on.
+    async with session.begin():
+        await session.execute(text("SET LOCAL enable_seqscan = off"))
+        connection = await session.connection()
+        for statement, parameters in statements:
+            result = await connection.exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {statement}", parameters
+            )
+            raw = result.scalar_one()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            names |= _index_names(plan)
+        return await _parent_index_names(session, names)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("index_name", "query"),
+    [pytest.param(index_name, query, id=name) for index_name, name, query in HOT_QUERIES],
+)
+async def test_hot_queries_use_indexes(
+    async_session: AsyncSession, index_name: str, query: Query
+) -> None:
+    assert index_name in await _plan_index_names(async_session, query)
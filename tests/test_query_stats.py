@@ -0,0 +1,135 @@
+import logging
+
+import pytest
+from fastapi import BackgroundTasks, FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db_ops import ingest_chat_message
+from app.models import Utterance
+from app.query_stats import (
+    QueryStatsMiddleware,
+    assert_max_queries,
+    log_query_stats,
+    track_queries,
+)
+from app.schemas import ChatRequest
+from app.services import chat as chat_service
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+
+@pytest.mark.asyncio
+async def test_process_chat_statement_count(async_session: AsyncSession) -> None:
+    with assert_max_queries(2) as stats:
+        await chat_service.process_chat(
+            async_session, ChatRequest(user_id="u1", message="hello"), BackgroundTasks()
+        )
+    assert stats.count == 2
+
+
+@pytest.mark.asyncio
+async def test_deferred_reply_statement_count(
+    async_session: AsyncSession, sms_outbox: list[dict[str, str]]
+) -> None:
+    async with async_session.begin():
+        ingest = await ingest_chat_message(async_session, "u1", "hello")
+
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    # Load user and bot utterances, then the queued and sent updates.
+    with assert_max_queries(4):
+        await chat_service._deliver_reply(
+            "u1", ingest.user_utterance_id, ingest.bot_utterance_id, sessionmaker
+        )
+    assert len(sms_outbox) == 1
+
+
+@pytest.mark.asyncio
+async def test_assert_max_queries_lists_statements(async_session: AsyncSession) -> None:
+    with (
+        pytest.raises(AssertionError, match="at most 1 SQL statements, ran 2") as excinfo,
+        assert_max_queries(1),
+    ):
+        await async_session.execute(select(Utterance.id))
+        await async_session.execute(text("SELECT 1"))
+    assert "SELECT 1" in str(excinfo.value)
+
+
+@pytest.mark.asyncio
+async def test_scopes_do_not_nest(async_session: AsyncSession) -> None:
+    with track_queries("outer") as outer:
+        await async_session.execute(text("SELECT 1"))
+        with track_queries("inner") as inner:
+            await async_session.execute(text("SELECT 2"))
+    assert (outer.count, inner.count) == (1, 1)
+    assert outer.seconds > 0
+
+
+@pytest.mark.asyncio
+async def test_repeated_statements_are_logged(
+    async_session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setenv("DB_QUERY_WARN_REPEATS", "3")
+    with track_queries("loop") as stats:
+        for utterance_id in ("a", "b", "c"):
+            await async_session.get(Utterance, utterance_id)
+
+    with caplog.at_level(logging.WARNING, logger="app.query_stats"):
+        log_query_stats(stats)
+    assert "loop ran the same SQL statement 3 times (possible N+1)" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_debug_headers_report_request_statements(
+    async_client: AsyncClient,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    response = await async_client.post(
+        "/chat", headers=AUTH, json={"user_id": "u1", "message": "hello"}
+    )
+    assert "x-db-statements" not in response.headers
+
+    monkeypatch.setenv("DB_QUERY_DEBUG_HEADERS", "true")
+    response = await async_client.post(
+        "/chat", headers=AUTH, json={"user_id": "u1", "message": "again"}
+    )
+    assert response.headers["x-db-statements"] == "2"
+    assert float(response.headers["x-db-time-ms"]) > 0
+
+
+@pytest.mark.asyncio
+async def test_background_tasks_are_not_counted_in_the_request(
+    async_session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setenv("DB_QUERY_DEBUG_HEADERS", "true")
+    monkeypatch.setenv("DB_QUERY_WARN_STATEMENTS", "1")
+    purged = []
+
+    async def _purge() -> None:
+        for _ in range(3):
+            await async_session.execute(text("SELECT 1"))
+        purged.append(True)
+
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware)
+
+    @app.get("/work")
+    async def _work(background_tasks: BackgroundTasks) -> dict[str, str]:
+        await async_session.execute(text("SELECT 1"))
+        background_tasks.add_task(_purge)
+        return {}
+
+    transport = ASGITransport(app=app)
+    with caplog.at_level(logging.WARNING, logger="app.query_stats"):
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/work")
+
+    assert response.headers["x-db-statements"] == "1"
+    assert purged
+    assert "GET /work issued" not in caplog.text
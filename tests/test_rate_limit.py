@@ -0,0 +1,162 @@
+from collections.abc import Iterator
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import RateLimitBucket, Utterance
+from app.query_stats import assert_max_queries
+from app.services import rate_limit
+from app.services.rate_limit import RateLimitedError, RateLimiter, TokenBuckets
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+
+@pytest.fixture(autouse=True)
+def _fresh_limiter() -> Iterator[None]:
+    rate_limit.reset_rate_limiter()
+    yield
+    rate_limit.reset_rate_limiter()
+
+
+def _rejections(scope: str, source: str) -> float:
+    return rate_limit._rejected.labels(scope=scope, source=source).value
+
+
+def test_buckets_refill_at_rate_up_to_burst() -> None:
+    now = [0.0]
+    buckets = TokenBuckets(rate=2, burst=3, max_keys=2, clock=lambda: now[0])
+    assert [buckets.take("a") for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("a") == pytest.approx(0.5)
+
+    now[0] = 0.5
+    assert buckets.take("a") == 0
+    now[0] = 100
+    assert buckets.tokens("a") == 3
+
+    buckets.take("b")
+    buckets.take("c")
+    assert len(buckets) == 2 and buckets.tokens("a") == 3
+
+
+@pytest.mark.asyncio
+async def test_flooding_user_is_rejected_before_any_write(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("RATE_LIMIT_USER_PER_MINUTE", "6")
+    monkeypatch.setenv("RATE_LIMIT_USER_BURST", "2")
+    rejected = _rejections("user", "memory")
+
+    statuses = []
+    for user_id in ("u1", "u1", "u1", "u2"):
+        response = await async_client.post(
+            "/chat", headers=AUTH, json={"user_id": user_id, "message": "hello"}
+        )
+        statuses.append(response.status_code)
+        if response.status_code == 429:
+            assert response.headers["Retry-After"] == "10"
+
+    assert statuses == [202, 202, 429, 202]
+    assert _rejections("user", "memory") == rejected + 1
+    utterances = await async_session.execute(select(func.count()).select_from(Utterance))
+    assert utterances.scalar_one() == 6
+    assert len(sms_outbox) == 3
+
+
+@pytest.mark.asyncio
+async def test_global_limit_applies_across_users(
+    async_client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("RATE_LIMIT_GLOBAL_PER_SECOND", "0.1")
+    monkeypatch.setenv("RATE_LIMIT_GLOBAL_BURST", "2")
+    statuses = [
+        (
+            await async_client.post(
+                "/chat", headers=AUTH, json={"user_id": user_id, "message": "hello"}
+            )
+        ).status_code
+        for user_id in ("u1", "u2", "u3")
+    ]
+    assert statuses == [202, 202, 429]
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_only_the_user_over_the_limit(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("RATE_LIMIT_USER_PER_MINUTE", "6")
+    monkeypatch.setenv("RATE_LIMIT_USER_BURST", "1")
+    response = await async_client.post(
+        "/chat/batch",
+        headers=AUTH,
+        json={
+            "messages": [
+                {"user_id": "u1", "message": "one"},
+                {"user_id": "u1", "message": "two"},
+                {"user_id": "u2", "message": "hi"},
+            ]
+        },
+    )
+
+    assert response.status_code == 202
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["queued", "rate_limited", "queued"]
+    assert results[1]["retry_after_seconds"] == 10
+    utterances = await async_session.execute(select(func.count()).select_from(Utterance))
+    assert utterances.scalar_one() == 4
+    assert sorted(sms["user_id"] for sms in sms_outbox) == ["u1", "u2"]
+
+
+def _replica() -> RateLimiter:
+    return RateLimiter(
+        user=TokenBuckets(rate=0.01, burst=3, max_keys=10),
+        everyone=TokenBuckets(rate=0.01, burst=100, max_keys=1),
+        shared=True,
+    )
+
+
+@pytest.mark.asyncio
+async def test_shared_buckets_hold_across_replicas(async_session: AsyncSession) -> None:
+    first, second = _replica(), _replica()
+    for replica in (first, second, first):
+        await replica.check(async_session, "u1")
+
+    shared = _rejections("user", "shared")
+    with pytest.raises(RateLimitedError) as excinfo:
+        await second.check(async_session, "u1")
+    assert excinfo.value.scope == "user"
+    assert _rejections("user", "shared") == shared + 1
+
+    # The replica now knows the bucket is empty and answers from memory.
+    with assert_max_queries(0), pytest.raises(RateLimitedError):
+        await second.check(async_session, "u1")
+
+    # The global token taken by the rejected request was given back.
+    rows = await async_session.execute(select(RateLimitBucket.key, RateLimitBucket.tokens))
+    tokens = dict(rows.all())
+    assert tokens["user:u1"] == pytest.approx(0, abs=0.01)
+    assert tokens[rate_limit.GLOBAL_KEY] == pytest.approx(97, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_shared_batch_takes_a_bucket_whole_or_not_at_all(
+    async_session: AsyncSession,
+) -> None:
+    first, second = _replica(), _replica()
+    await first.check_batch(async_session, ["u1", "u1"])
+
+    errors = await second.check_batch(async_session, ["u1", "u1", "u2"])
+    assert [error.scope if error else None for error in errors] == ["user", "user", None]
+
+    rows = await async_session.execute(select(RateLimitBucket.key, RateLimitBucket.tokens))
+    tokens = dict(rows.all())
+    assert tokens["user:u1"] == pytest.approx(1, abs=0.01)
+    assert tokens["user:u2"] == pytest.approx(2, abs=0.01)
+    assert tokens[rate_limit.GLOBAL_KEY] == pytest.approx(97, abs=0.1)
@@ -0,0 +1,180 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import UTTERANCE_STATUS_QUEUED, UTTERANCE_STATUS_SENT
+from app.db_ops import ReplyJob, claim_reply_jobs, ingest_chat_message
+from app.models import Utterance
+from app.services import chat as chat_service
+
+
+@pytest.fixture()
+def generated(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    calls: list[str] = []
+
+    async def _generate(message: str) -> str:
+        calls.append(message)
+        return f"echo:{message}"
+
+    monkeypatch.setattr(chat_service, "_generate_reply", _generate)
+    return calls
+
+
+async def _ingest(
+    session: AsyncSession,
+    user_id: str,
+    lease_seconds: float = -1,
+    age_seconds: float = 3600,
+    **bot_values: object,
+) -> str:
+    """A reply left behind by a dead process: its lease and age as given."""
+    now = datetime.datetime.now(datetime.UTC)
+    async with session.begin():
+        ingest = await ingest_chat_message(
+            session,
+            user_id,
+            f"from {user_id}",
+            reply_lease_until=now + datetime.timedelta(seconds=lease_seconds),
+        )
+        await session.execute(
+            update(Utterance)
+            .where(Utterance.conversation_id == ingest.conversation_id)
+            .values(timestamp=Utterance.timestamp - datetime.timedelta(seconds=age_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        if bot_values:
+            await session.execute(
+                update(Utterance)
+                .where(Utterance.id == ingest.bot_utterance_id)
+                .values(**bot_values)
+                .execution_options(synchronize_session=False)
+            )
+    return ingest.bot_utterance_id
+
+
+async def _statuses(session: AsyncSession) -> dict[str, str]:
+    session.expunge_all()
+    result = await session.execute(
+        select(Utterance.id, Utterance.status).where(Utterance.reply_to_id.is_not(None))
+    )
+    return dict(result.tuples().all())
+
+
+@pytest.mark.asyncio
+async def test_reaper_reruns_only_abandoned_replies(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    generated: list[str],
+) -> None:
+    ungenerated = await _ingest(async_session, "u1")
+    undelivered = await _ingest(async_session, "u2", text="stored reply")
+    running = await _ingest(async_session, "u3", lease_seconds=300)
+    young = await _ingest(async_session, "u4", age_seconds=0)
+    parked = await _ingest(async_session, "u5", text="parked", meta={"sms": {"parked": True}})
+    before = {
+        kind: chat_service._reaped.labels(kind=kind).value
+        for kind in ("ungenerated", "undelivered")
+    }
+
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    assert await chat_service.reap_stuck_replies(sessionmaker) == 2
+
+    assert generated == ["from u1"]
+    assert sorted(item["message"] for item in sms_outbox) == ["echo:from u1", "stored reply"]
+    statuses = await _statuses(async_session)
+    assert statuses[ungenerated] == statuses[undelivered] == UTTERANCE_STATUS_SENT
+    assert {statuses[running], statuses[young], statuses[parked]} == {UTTERANCE_STATUS_QUEUED}
+    assert chat_service._reaped.labels(kind="ungenerated").value == before["ungenerated"] + 1
+    assert chat_service._reaped.labels(kind="undelivered").value == before["undelivered"] + 1
+
+
+@pytest.mark.asyncio
+async def test_reply_in_flight_is_never_sent_twice(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    started, finish = asyncio.Event(), asyncio.Event()
+
+    async def _generate(message: str) -> str:
+        started.set()
+        await finish.wait()
+        return f"echo:{message}"
+
+    monkeypatch.setattr(chat_service, "_generate_reply", _generate)
+    # Old enough to look stuck, with its lease run out while it generates.
+    bot_utterance_id = await _ingest(async_session, "u1")
+    bot_utterance = await async_session.get(Utterance, bot_utterance_id)
+    assert bot_utterance is not None and bot_utterance.reply_to_id is not None
+    job = ReplyJob(
+        user_id="u1",
+        conversation_id=bot_utterance.conversation_id,
+        user_utterance_id=bot_utterance.reply_to_id,
+        bot_utterance_id=bot_utterance_id,
+        attempts=1,
+    )
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    running = asyncio.create_task(chat_service.run_reply_job(job, sessionmaker))
+    await started.wait()
+
+    # This process knows the reply is still running.
+    assert await chat_service.reap_stuck_replies(sessionmaker) == 0
+
+    # Another replica does not, and claims it anyway: only one run may send.
+    async with sessionmaker() as session, session.begin():
+        (claimed,) = await claim_reply_jobs(session, 1, 300, parked=False)
+    assert claimed.attempts == 2
+    started.clear()
+    rerun = asyncio.create_task(chat_service._run_reply_job(claimed, sessionmaker))
+    await started.wait()
+    finish.set()
+    await asyncio.gather(running, rerun)
+
+    assert [item["message"] for item in sms_outbox] == ["echo:from u1"]
+    assert (await _statuses(async_session))[bot_utterance_id] == UTTERANCE_STATUS_SENT
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reapers_split_the_work(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    generated: list[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("REPLY_REAPER_BATCH_SIZE", "3")
+    for index in range(6):
+        await _ingest(async_session, f"u{index}")
+
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    claimed = await asyncio.gather(
+        chat_service.reap_stuck_replies(sessionmaker),
+        chat_service.reap_stuck_replies(sessionmaker),
+    )
+
+    assert sorted(claimed) == [3, 3]
+    assert sorted(item["user_id"] for item in sms_outbox) == [f"u{index}" for index in range(6)]
+    assert await chat_service.reap_stuck_replies(sessionmaker) == 0
+
+
+@pytest.mark.asyncio
+async def test_reaper_gives_up_after_max_attempts(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    generated: list[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("REPLY_MAX_ATTEMPTS", "2")
+    poisoned = await _ingest(async_session, "u1", attempts=2)
+
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    assert await chat_service.reap_stuck_replies(sessionmaker) == 1
+
+    assert not sms_outbox and not generated
+    async with async_session.begin():
+        error = await async_session.scalar(
+            text("SELECT error FROM utterances WHERE id = :id"), {"id": poisoned}
+        )
+    assert error == "Reply abandoned after 2 attempts."
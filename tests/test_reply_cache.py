@@ -0,0 +1,131 @@
+import datetime
+from collections.abc import Iterator
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db import get_session_engine
+from app.db_ops import put_cached_reply
+from app.models import ReplyCacheEntry
+from app.services import chat as chat_service
+from app.services import reply_cache
+from app.services.reply_cache import (
+    MemoryReplyCache,
+    ReplyCache,
+    bypass_reply_cache,
+    cache_key,
+)
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache() -> Iterator[None]:
+    reply_cache.reset_reply_cache()
+    yield
+    reply_cache.reset_reply_cache()
+
+
+def _lookups(result: str) -> float:
+    return reply_cache._lookups.labels(result=result).value
+
+
+def test_cache_key_normalizes_case_and_whitespace() -> None:
+    assert cache_key("STOP", "1") == cache_key("  stop\n", "1")
+    assert cache_key("Hi  there", "1") == cache_key("hi there", "1")
+    assert cache_key("stop", "1") != cache_key("stop", "2")
+
+
+def test_memory_cache_evicts_by_entries_bytes_and_ttl() -> None:
+    now = [0.0]
+    cache = MemoryReplyCache(max_entries=2, max_bytes=100, ttl_seconds=10, clock=lambda: now[0])
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+
+    cache.put("big", "x" * 96)
+    assert len(cache) == 1 and cache.bytes == 99
+    cache.put("huge", "x" * 200)
+    assert cache.get("huge") is None
+
+    now[0] = 11.0
+    assert cache.get("big") is None
+    assert len(cache) == 0 and cache.bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_identical_messages_generate_once(
+    async_client: AsyncClient,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    calls: list[str] = []
+
+    async def _generate(message: str) -> str:
+        calls.append(message)
+        return f"reply to {message}"
+
+    monkeypatch.setattr(chat_service, "_generate_reply", _generate)
+    monkeypatch.setenv("REPLY_CACHE_ENABLED", "true")
+    hits_before = _lookups("memory_hit")
+
+    for index, message in enumerate(["STOP", " stop ", "Stop"]):
+        response = await async_client.post(
+            "/chat", headers=AUTH, json={"user_id": f"u{index}", "message": message}
+        )
+        assert response.status_code == 202
+
+    assert calls == ["STOP"]
+    assert [item["message"] for item in sms_outbox] == ["reply to STOP"] * 3
+    assert _lookups("memory_hit") == hits_before + 2
+
+
+@pytest.mark.asyncio
+async def test_bypass_skips_lookup_and_store(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("REPLY_CACHE_ENABLED", "true")
+    calls: list[str] = []
+
+    async def _generate(message: str) -> str:
+        calls.append(message)
+        return f"reply {len(calls)}"
+
+    with bypass_reply_cache():
+        assert await reply_cache.cached_generate("hi", _generate) == "reply 1"
+    assert await reply_cache.cached_generate("hi", _generate) == "reply 2"
+    with bypass_reply_cache():
+        assert await reply_cache.cached_generate("hi", _generate) == "reply 3"
+    assert await reply_cache.cached_generate("hi", _generate) == "reply 2"
+
+
+@pytest.mark.asyncio
+async def test_shared_tier_serves_other_processes(async_session: AsyncSession) -> None:
+    sessionmaker = async_sessionmaker(get_session_engine(async_session), expire_on_commit=False)
+
+    def _new_cache() -> ReplyCache:
+        return ReplyCache(MemoryReplyCache(10, 10_000, 60), version="1", shared=True)
+
+    writer, reader = _new_cache(), _new_cache()
+    await writer.put("Hello", "echo:Hello", sessionmaker)
+    shared_hits = _lookups("shared_hit")
+    assert await reader.get("hello", sessionmaker) == "echo:Hello"
+    assert _lookups("shared_hit") == shared_hits + 1
+    assert len(reader.memory) == 1
+
+    now = datetime.datetime.now(datetime.UTC)
+    async with sessionmaker() as session:
+        await put_cached_reply(
+            session, cache_key("old", "1"), "stale", now - datetime.timedelta(seconds=1)
+        )
+        await session.commit()
+    assert await reader.get("old", sessionmaker) is None
+
+    # The next store sweeps expired rows.
+    writer._last_purge = 0.0
+    await writer.put("new", "fresh", sessionmaker)
+    keys = (await async_session.execute(select(ReplyCacheEntry.key))).scalars().all()
+    assert set(keys) == {cache_key("hello", "1"), cache_key("new", "1")}
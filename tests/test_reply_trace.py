@@ -0,0 +1,81 @@
+import datetime
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db_ops import REPLY_TIMING_KEYS, list_slowest_replies
+from app.models import Utterance
+from app.services import chat as chat_service
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+
+@pytest.mark.asyncio
+async def test_sent_reply_stores_timing_trace(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+) -> None:
+    response = await async_client.post(
+        "/chat", headers=AUTH, json={"user_id": "u1", "message": "hello"}
+    )
+    assert response.status_code == 202
+
+    utterance = await async_session.get(
+        Utterance, response.json()["reply_utterance_id"], populate_existing=True
+    )
+    assert utterance is not None and utterance.status == "sent"
+    assert utterance.meta is not None
+    timing = utterance.meta["timing"]
+    assert set(timing) == set(REPLY_TIMING_KEYS) - {"first_segment_ms"}
+    assert all(value >= 0 for value in timing.values())
+    assert timing["total_ms"] >= timing["sms_ms"]
+
+
+@pytest.mark.asyncio
+async def test_failed_reply_stores_partial_trace(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def _boom(message: str) -> str:
+        raise RuntimeError("model down")
+
+    monkeypatch.setattr(chat_service, "_generate_reply", _boom)
+    response = await async_client.post(
+        "/chat", headers=AUTH, json={"user_id": "u1", "message": "hello"}
+    )
+
+    utterance = await async_session.get(
+        Utterance, response.json()["reply_utterance_id"], populate_existing=True
+    )
+    assert utterance is not None and utterance.status == "failed"
+    assert utterance.meta is not None
+    assert {"queue_wait_ms", "ingest_ms", "generate_ms", "total_ms"} == set(
+        utterance.meta["timing"]
+    )
+
+
+@pytest.mark.asyncio
+async def test_list_slowest_replies_by_stage(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+) -> None:
+    for message in ("one", "two", "three"):
+        await async_client.post("/chat", headers=AUTH, json={"user_id": "u1", "message": message})
+
+    since = datetime.datetime.now(datetime.UTC) - datetime.timedelta(hours=1)
+    rows = await list_slowest_replies(async_session, "sms_ms", since, limit=2)
+    assert len(rows) == 2
+    assert rows[0].duration_ms >= rows[1].duration_ms
+    assert rows[0].timing["sms_ms"] == rows[0].duration_ms
+
+    with pytest.raises(ValueError):
+        await list_slowest_replies(async_session, "nope", since, limit=2)
+    with pytest.raises(ValueError):
+        await list_slowest_replies(
+            async_session, "sms_ms", since - datetime.timedelta(days=1), limit=2
+        )
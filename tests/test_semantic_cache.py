@@ -0,0 +1,120 @@
+from collections.abc import Iterator
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from httpx import AsyncClient  # noqa: E402
+
+from app.config import (  # noqa: E402
+    get_semantic_cache_dimensions,
+    get_semantic_cache_max_entries,
+)
+from app.services import chat as chat_service  # noqa: E402
+from app.services import reply_cache, semantic_cache  # noqa: E402
+from app.services.semantic_cache import SemanticReplyCache, embed  # noqa: E402
+from benchmarks import bench_semantic_cache  # noqa: E402
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+
+@pytest.fixture(autouse=True)
+def _fresh_caches() -> Iterator[None]:
+    semantic_cache.reset_semantic_cache()
+    reply_cache.reset_reply_cache()
+    yield
+    semantic_cache.reset_semantic_cache()
+    reply_cache.reset_reply_cache()
+
+
+def _similarity(first: str, second: str) -> float:
+    return float(embed(first, 128) @ embed(second, 128))
+
+
+def test_embedding_treats_spelling_variants_as_duplicates() -> None:
+    assert _similarity("hi", "Hiii!!") == pytest.approx(1.0)
+    assert _similarity("cancel my appointment", "cancel my appointment pls") > 0.9
+    assert _similarity("yes", "no") < 0.5
+    assert not embed("?!", 128).any()
+
+
+def test_lookup_respects_threshold_and_ttl() -> None:
+    now = [0.0]
+    cache = SemanticReplyCache(10, 128, threshold=0.9, ttl_seconds=5, clock=lambda: now[0])
+    cache.store("hello", "echo:hello")
+    hit = cache.lookup("Hellooo!")
+    assert hit is not None and hit[0] == "echo:hello"
+    assert cache.lookup("goodbye") is None
+
+    now[0] = 6.0
+    assert cache.lookup("hello") is None
+    assert len(cache) == 0
+
+
+def test_expired_best_match_does_not_hide_a_live_one() -> None:
+    now = [0.0]
+    cache = SemanticReplyCache(10, 128, threshold=0.9, ttl_seconds=5, clock=lambda: now[0])
+    cache.store("hello", "first")
+    now[0] = 4.0
+    cache.store("Hello!", "second")
+
+    now[0] = 6.0
+    hit = cache.lookup("hello")
+    assert hit is not None and hit[0] == "second"
+    assert len(cache) == 1
+
+
+def test_default_lookup_is_sub_millisecond() -> None:
+    results = bench_semantic_cache.run(
+        get_semantic_cache_max_entries(), get_semantic_cache_dimensions(), lookups=500
+    )
+    assert results["entries"] == get_semantic_cache_max_entries()
+    lookup = results["lookup"]
+    assert isinstance(lookup, dict) and lookup["p99_ms"] < 1.0
+
+
+def test_full_matrix_replaces_least_recently_used_row() -> None:
+    now = [0.0]
+    cache = SemanticReplyCache(2, 128, threshold=0.9, ttl_seconds=60, clock=lambda: now[0])
+    cache.store("alpha", "A")
+    now[0] = 1.0
+    cache.store("bravo", "B")
+    now[0] = 2.0
+    assert cache.lookup("alpha") is not None
+    now[0] = 3.0
+    cache.store("charlie", "C")
+
+    assert len(cache) == 2
+    assert cache.lookup("bravo") is None
+    hits = [cache.lookup(text) for text in ("alpha", "charlie")]
+    assert [hit[0] if hit else None for hit in hits] == ["A", "C"]
+
+
+@pytest.mark.asyncio
+async def test_near_duplicates_reuse_the_reply(
+    async_client: AsyncClient,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    calls: list[str] = []
+
+    async def _generate(message: str) -> str:
+        calls.append(message)
+        return f"reply to {message}"
+
+    monkeypatch.setattr(chat_service, "_generate_reply", _generate)
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "true")
+
+    for index, message in enumerate(["hi", "hii", "Hi!", "what time is it"]):
+        response = await async_client.post(
+            "/chat", headers=AUTH, json={"user_id": f"u{index}", "message": message}
+        )
+        assert response.status_code == 202
+
+    assert calls == ["hi", "what time is it"]
+    assert [item["message"] for item in sms_outbox] == [
+        "reply to hi",
+        "reply to hi",
+        "reply to hi",
+        "reply to what time is it",
+    ]
@@ -0,0 +1,320 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import BackgroundTasks
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import UTTERANCE_STATUS_QUEUED, UTTERANCE_STATUS_SENT
+from app.models import Utterance
+from app.schemas import ChatRequest, SmsOutboundRequest
+from app.services import chat as chat_service
+from app.services import sms as sms_service
+from app.services.sms import CircuitBreaker, SmsUnavailableError, record_sms_delivery
+
+
+@pytest.fixture(autouse=True)
+def _fast_retries(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("SMS_RETRY_BASE_MS", "1")
+    monkeypatch.setenv("SMS_RETRY_MAX_MS", "5")
+    monkeypatch.setattr(sms_service, "_circuit", None)
+
+
+@pytest.fixture()
+def sms_requests(monkeypatch: pytest.MonkeyPatch) -> list[httpx.Request]:
+    requests: list[httpx.Request] = []
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if b"fail" in request.content:
+            return httpx.Response(400)
+        return httpx.Response(200)
+
+    def _build_client() -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+
+    monkeypatch.setenv("SMS_OUTBOUND_URL", "https://sms.test/webhook")
+    monkeypatch.setattr(sms_service, "_build_client", _build_client)
+    monkeypatch.setattr(sms_service, "_client", None)
+    return requests
+
+
+@pytest.mark.asyncio
+async def test_send_sms_reuses_shared_client(sms_requests: list[httpx.Request]) -> None:
+    await sms_service.send_sms(SmsOutboundRequest(user_id="u1", message="one"))
+    client = sms_service.get_sms_client()
+    await sms_service.send_sms(SmsOutboundRequest(user_id="u1", message="two"))
+
+    assert sms_service.get_sms_client() is client
+    assert [request.url for request in sms_requests] == [
+        httpx.URL("https://sms.test/webhook"),
+        httpx.URL("https://sms.test/webhook"),
+    ]
+    assert sms_requests[1].read() == b'{"user_id":"u1","message":"two"}'
+
+    await sms_service.close_sms_client()
+    assert client.is_closed
+    assert sms_service.get_sms_client() is not client
+    await sms_service.close_sms_client()
+
+
+@pytest.mark.asyncio
+async def test_send_sms_counts_responses_by_status(sms_requests: list[httpx.Request]) -> None:
+    ok = sms_service._responses.labels(endpoint="single", code="200")
+    failed = sms_service._responses.labels(endpoint="single", code="400")
+    ok_before, failed_before = ok.value, failed.value
+
+    await sms_service.send_sms(SmsOutboundRequest(user_id="u1", message="hi"))
+    with pytest.raises(httpx.HTTPStatusError):
+        await sms_service.send_sms(SmsOutboundRequest(user_id="u1", message="fail"))
+
+    assert (ok.value, failed.value) == (ok_before + 1, failed_before + 1)
+
+
+@pytest.mark.asyncio
+async def test_send_sms_raises_on_error_status(sms_requests: list[httpx.Request]) -> None:
+    with pytest.raises(httpx.HTTPStatusError):
+        await sms_service.send_sms(SmsOutboundRequest(user_id="u1", message="fail"))
+    await sms_service.close_sms_client()
+
+
+def test_build_client_applies_pool_limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("SMS_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("SMS_MAX_KEEPALIVE_CONNECTIONS", "3")
+    monkeypatch.setenv("SMS_KEEPALIVE_EXPIRY_SECONDS", "12.5")
+
+    client = sms_service._build_client()
+    pool = client._transport._pool
+    assert pool._max_connections == 7
+    assert pool._max_keepalive_connections == 3
+    assert pool._keepalive_expiry == 12.5
+
+
+@pytest.fixture()
+def bulk_requests(monkeypatch: pytest.MonkeyPatch) -> list[list[dict[str, str]]]:
+    batches: list[list[dict[str, str]]] = []
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        messages = json.loads(request.content)["messages"]
+        batches.append(messages)
+        results = [
+            {"status": "failed", "error": "unknown number"}
+            if message["user_id"] == "bad"
+            else {"status": "sent"}
+            for message in messages
+        ]
+        return httpx.Response(200, json={"results": results})
+
+    def _build_client() -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+
+    monkeypatch.setenv("SMS_BULK_URL", "https://sms.test/bulk")
+    monkeypatch.setenv("SMS_BATCH_MAX_MESSAGES", "3")
+    monkeypatch.setenv("SMS_BATCH_LINGER_MS", "20")
+    monkeypatch.setattr(sms_service, "_build_client", _build_client)
+    monkeypatch.setattr(sms_service, "_client", None)
+    monkeypatch.setattr(sms_service, "_batcher", None)
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_send_sms_batches_and_maps_results(
+    bulk_requests: list[list[dict[str, str]]],
+) -> None:
+    user_ids = ["u1", "bad", "u2", "u3"]
+    results = await asyncio.gather(
+        *(
+            sms_service.send_sms(SmsOutboundRequest(user_id=user_id, message="hi"))
+            for user_id in user_ids
+        ),
+        return_exceptions=True,
+    )
+    await sms_service.close_sms_client()
+
+    assert [len(batch) for batch in bulk_requests] == [3, 1]
+    assert [message["user_id"] for batch in bulk_requests for message in batch] == user_ids
+    assert results[0] is None
+    assert isinstance(results[1], RuntimeError)
+    assert str(results[1]) == "unknown number"
+    assert results[2:] == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_close_sends_the_batch_still_lingering(
+    bulk_requests: list[list[dict[str, str]]], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("SMS_BATCH_LINGER_MS", "60000")
+    sends = [
+        asyncio.create_task(
+            sms_service.send_sms(SmsOutboundRequest(user_id=user_id, message="hi"))
+        )
+        for user_id in ("u1", "u2")
+    ]
+    await asyncio.sleep(0.01)
+    assert not bulk_requests
+
+    await sms_service.close_sms_client()
+
+    assert await asyncio.wait_for(asyncio.gather(*sends), 1) == [None, None]
+    assert [[message["user_id"] for message in batch] for batch in bulk_requests] == [
+        ["u1", "u2"]
+    ]
+
+
+@pytest.mark.asyncio
+async def test_send_sms_batch_malformed_response_opens_the_circuit(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def _handler(_: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"results": []})
+
+    def _build_client() -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+
+    monkeypatch.setenv("SMS_BULK_URL", "https://sms.test/bulk")
+    monkeypatch.setenv("SMS_RETRY_ATTEMPTS", "2")
+    monkeypatch.setenv("SMS_CIRCUIT_FAILURE_THRESHOLD", "4")
+    monkeypatch.setattr(sms_service, "_build_client", _build_client)
+    monkeypatch.setattr(sms_service, "_client", None)
+    monkeypatch.setattr(sms_service, "_batcher", None)
+
+    results = await asyncio.gather(
+        sms_service.send_sms(SmsOutboundRequest(user_id="u1", message="a")),
+        sms_service.send_sms(SmsOutboundRequest(user_id="u2", message="b")),
+        return_exceptions=True,
+    )
+    await sms_service.close_sms_client()
+
+    # Two tries of two messages, each counted against the gateway.
+    assert all(isinstance(result, SmsUnavailableError) for result in results)
+    assert "0 results for" in str(results[0])
+    assert sms_service.get_sms_circuit().state == "open"
+
+
+@pytest.fixture()
+def gateway(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    """Status codes the fake gateway answers with, in order; 200 once used up."""
+    codes: list[int] = []
+
+    def _handler(_: httpx.Request) -> httpx.Response:
+        return httpx.Response(codes.pop(0) if codes else 200)
+
+    def _build_client() -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+
+    monkeypatch.setenv("SMS_OUTBOUND_URL", "https://sms.test/webhook")
+    monkeypatch.setattr(sms_service, "_build_client", _build_client)
+    monkeypatch.setattr(sms_service, "_client", None)
+    return codes
+
+
+@pytest.mark.asyncio
+async def test_send_sms_retries_transient_failures(gateway: list[int]) -> None:
+    gateway.extend([502, 503])
+    retries = sms_service._retries.value
+    with record_sms_delivery() as delivery:
+        await sms_service.send_sms(SmsOutboundRequest(user_id="u1", message="hi"))
+    await sms_service.close_sms_client()
+
+    assert (delivery.attempts, delivery.last_error) == (3, "HTTP 503")
+    assert sms_service._retries.value == retries + 2
+
+
+@pytest.mark.asyncio
+async def test_send_sms_gives_up_then_short_circuits(
+    gateway: list[int], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("SMS_RETRY_ATTEMPTS", "2")
+    monkeypatch.setenv("SMS_CIRCUIT_FAILURE_THRESHOLD", "3")
+    gateway.extend([504, 504, 504])
+
+    with pytest.raises(SmsUnavailableError) as exhausted:
+        await sms_service.send_sms(SmsOutboundRequest(user_id="u1", message="hi"))
+    assert exhausted.value.attempted
+    with pytest.raises(SmsUnavailableError) as short_circuited:
+        await sms_service.send_sms(SmsOutboundRequest(user_id="u1", message="hi"))
+    await sms_service.close_sms_client()
+
+    # The third failure opened the circuit, so the fourth try never went out.
+    assert short_circuited.value.attempted
+    assert gateway == []
+    assert sms_service.get_sms_circuit().state == "open"
+
+
+def test_circuit_breaker_probes_once_after_reset() -> None:
+    now = [0.0]
+    circuit = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+    circuit.record_failure()
+    assert circuit.allow()
+    circuit.record_failure()
+    assert not circuit.allow() and circuit.retry_after() == 10
+
+    now[0] = 10
+    assert circuit.allow()
+    assert not circuit.allow()
+    circuit.record_failure()
+    assert circuit.state == "open"
+
+    now[0] = 20
+    assert circuit.allow()
+    circuit.record_success()
+    assert circuit.state == "closed" and circuit.allow()
+
+
+async def _replies(session: AsyncSession) -> list[Utterance]:
+    session.expunge_all()
+    result = await session.execute(
+        select(Utterance).where(Utterance.reply_to_id.is_not(None)).order_by(Utterance.timestamp)
+    )
+    return list(result.scalars().all())
+
+
+@pytest.mark.asyncio
+async def test_replies_park_while_gateway_is_down_and_drain_in_order(
+    async_session: AsyncSession,
+    gateway: list[int],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("SMS_RETRY_ATTEMPTS", "1")
+    monkeypatch.setenv("SMS_CIRCUIT_FAILURE_THRESHOLD", "1")
+    monkeypatch.setenv("SMS_CIRCUIT_RESET_SECONDS", "0.1")
+    generated: list[str] = []
+
+    async def _generate(message: str) -> str:
+        generated.append(message)
+        return f"echo:{message}"
+
+    monkeypatch.setattr(chat_service, "_generate_reply", _generate)
+    gateway.append(502)
+    for message in ("one", "two"):
+        tasks = BackgroundTasks()
+        payload = ChatRequest(user_id="u1", message=message)
+        await chat_service.process_chat(async_session, payload, tasks)
+        await tasks()
+
+    replies = await _replies(async_session)
+    assert [reply.status for reply in replies] == [UTTERANCE_STATUS_QUEUED] * 2
+    assert [reply.text for reply in replies] == ["echo:one", "echo:two"]
+    assert [reply.meta and reply.meta["sms"] for reply in replies] == [
+        {"attempts": 1, "last_error": "HTTP 502", "parked": True},
+        {"parked": True},
+    ]
+    # Only the reply that reached the gateway used up an attempt.
+    assert [reply.attempts for reply in replies] == [1, 0]
+
+    await asyncio.sleep(0.15)
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    assert await chat_service.drain_parked_replies(sessionmaker) == 1  # the probe
+    assert await chat_service.drain_parked_replies(sessionmaker) == 1
+    assert await chat_service.drain_parked_replies(sessionmaker) == 0
+    await sms_service.close_sms_client()
+
+    replies = await _replies(async_session)
+    assert [reply.status for reply in replies] == [UTTERANCE_STATUS_SENT] * 2
+    assert [reply.meta and reply.meta["sms"] for reply in replies] == [
+        {"attempts": 2, "last_error": "HTTP 502"},
+        {"attempts": 1},
+    ]
+    assert generated == ["one", "two"]
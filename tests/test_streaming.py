@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections.abc import AsyncGenerator
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Utterance
+from app.services import chat as chat_service
+from app.services.llm import close_llm_client
+from app.services.pipeline import Check, ReplyPipeline, Stage
+from app.services.segmenter import segment_stream, split_segments
+from benchmarks.stub_llm import serve_stub_llm
+
+AUTH = {"Authorization": "Bearer test-token"}
+
+SENTENCES = [f"Sentence number {index} says something useful." for index in range(12)]
+
+
+def _long_reply(_: str) -> str:
+    return " ".join(SENTENCES)
+
+
+def test_split_segments_prefers_sentence_boundaries() -> None:
+    segments = split_segments(" ".join(SENTENCES), 160)
+    assert len(segments) > 1
+    assert all(len(segment) <= 160 for segment in segments)
+    assert all(segment.endswith(".") for segment in segments)
+    assert " ".join(segments) == " ".join(SENTENCES)
+
+
+def test_split_segments_falls_back_to_words_then_characters() -> None:
+    assert split_segments("aaaa bbbb cccc", 9) == ["aaaa bbbb", "cccc"]
+    assert split_segments("x" * 25, 10) == ["x" * 10, "x" * 10, "x" * 5]
+
+
+@pytest.mark.asyncio
+async def test_segment_stream_yields_before_the_stream_ends() -> None:
+    finished = asyncio.Event()
+
+    async def _tokens() -> AsyncGenerator[str]:
+        for sentence in SENTENCES:
+            yield sentence + " "
+        finished.set()
+
+    segments = segment_stream(_tokens(), 100)
+    first = await anext(segments)
+    assert not finished.is_set()
+    assert first == " ".join(SENTENCES[:2])
+    rest = [segment async for segment in segments]
+    assert " ".join([first, *rest]) == " ".join(SENTENCES)
+
+
+@pytest.mark.asyncio
+async def test_streamed_reply_sends_first_segment_while_generating(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    sent: list[tuple[float, str]] = []
+
+    async def _send(payload: chat_service.SmsOutboundRequest) -> None:
+        sent.append((time.perf_counter(), payload.message))
+
+    monkeypatch.setattr(chat_service, "send_sms", _send)
+    async with serve_stub_llm(reply_for=_long_reply, token_delay_ms=2) as (url, stats):
+        monkeypatch.setenv("LLM_STREAM_URL", url)
+        try:
+            response = await async_client.post(
+                "/chat", headers=AUTH, json={"user_id": "u1", "message": "hello"}
+            )
+        finally:
+            await close_llm_client()
+    assert response.status_code == 202
+
+    messages = [message for _, message in sent]
+    assert len(messages) > 1
+    assert all(len(message) <= 160 for message in messages)
+    assert " ".join(messages) == _long_reply("hello")
+    assert sent[0][0] < stats.finished[0]
+
+    utterance = await async_session.get(
+        Utterance, response.json()["reply_utterance_id"], populate_existing=True
+    )
+    assert utterance is not None and utterance.status == "sent"
+    assert utterance.text == "\n".join(messages)
+    assert utterance.meta is not None
+    assert utterance.meta["segments_sent"] == len(messages)
+    assert utterance.meta["timing"]["first_segment_ms"] < utterance.meta["timing"]["total_ms"]
+
+
+@pytest.mark.asyncio
+async def test_streamed_segment_failing_qa_stops_delivery(
+    async_client: AsyncClient,
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def _reject_third(segment: str) -> None:
+        if "number 3" in segment:
+            raise ValueError("flagged")
+
+    chat_service.set_reply_pipeline(
+        ReplyPipeline(
+            [
+                Stage("generate", chat_service._generate_reply, kind="async"),
+                Stage(
+                    "qa",
+                    checks=(Check("length", chat_service._qa_reply), Check("flag", _reject_third)),
+                ),
+            ]
+        )
+    )
+    async with serve_stub_llm(reply_for=_long_reply) as (url, _):
+        monkeypatch.setenv("LLM_STREAM_URL", url)
+        monkeypatch.setenv("SMS_SEGMENT_MAX_CHARS", "100")
+        try:
+            response = await async_client.post(
+                "/chat", headers=AUTH, json={"user_id": "u1", "message": "hello"}
+            )
+        finally:
+            chat_service.set_reply_pipeline(None)
+            await close_llm_client()
+
+    assert [item["message"] for item in sms_outbox] == [" ".join(SENTENCES[:2])]
+    utterance = await async_session.get(
+        Utterance, response.json()["reply_utterance_id"], populate_existing=True
+    )
+    assert utterance is not None and utterance.status == "failed"
+    assert utterance.error == "pipeline:qa failed: flagged"
+    assert utterance.text == " ".join(SENTENCES[:2])
+    assert utterance.meta is not None and utterance.meta["segments_sent"] == 1
+
+
+@pytest.mark.asyncio
+async def test_run_streaming_requires_generate_stage() -> None:
+    async def _deliver(_: str) -> None:
+        return None
+
+    async def _tokens(_: str) -> AsyncGenerator[str]:
+        yield "hi"
+
+    with pytest.raises(ValueError):
+        await ReplyPipeline([Stage("ingest", str.strip)]).run_streaming(
+            "hello", _tokens, _deliver, 160
+        )
@@ -0,0 +1,112 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import worker
+from app.config import UTTERANCE_STATUS_FAILED, UTTERANCE_STATUS_SENT
+from app.db_ops import claim_reply_jobs, ingest_chat_message
+from app.models import Utterance
+from app.services import chat as chat_service
+
+
+@pytest.mark.asyncio
+async def test_claim_reply_jobs_leases_oldest_first(async_session: AsyncSession) -> None:
+    first = await ingest_chat_message(async_session, "u1", "one")
+    second = await ingest_chat_message(async_session, "u2", "two")
+    leased = await ingest_chat_message(
+        async_session,
+        "u3",
+        "three",
+        reply_lease_until=datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=5),
+    )
+    await async_session.commit()
+
+    jobs = await claim_reply_jobs(async_session, 10, lease_seconds=60)
+    await async_session.commit()
+
+    assert [job.bot_utterance_id for job in jobs] == [
+        first.bot_utterance_id,
+        second.bot_utterance_id,
+    ]
+    assert [job.user_id for job in jobs] == ["u1", "u2"]
+    assert jobs[0].user_utterance_id == first.user_utterance_id
+    assert all(job.attempts == 1 for job in jobs)
+    assert leased.bot_utterance_id not in {job.bot_utterance_id for job in jobs}
+
+    assert await claim_reply_jobs(async_session, 10, lease_seconds=60) == []
+
+
+@pytest.mark.asyncio
+async def test_claim_reply_jobs_skips_locked_rows(async_session: AsyncSession) -> None:
+    for index in range(4):
+        await ingest_chat_message(async_session, f"u{index}", "hello")
+    await async_session.commit()
+
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    async with sessionmaker() as first, sessionmaker() as second:
+        first_jobs = await claim_reply_jobs(first, 2, lease_seconds=60)
+        second_jobs = await claim_reply_jobs(second, 4, lease_seconds=60)
+        await first.commit()
+        await second.commit()
+
+    first_ids = {job.bot_utterance_id for job in first_jobs}
+    second_ids = {job.bot_utterance_id for job in second_jobs}
+    assert len(first_ids) == 2
+    assert len(second_ids) == 2
+    assert first_ids.isdisjoint(second_ids)
+
+
+@pytest.mark.asyncio
+async def test_worker_delivers_queued_replies(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+) -> None:
+    for message in ("hello", "again"):
+        await ingest_chat_message(async_session, "u1", message)
+    await async_session.commit()
+
+    stop = asyncio.Event()
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    task = asyncio.create_task(worker.run_worker(stop, sessionmaker, concurrency=1))
+    async with asyncio.timeout(5):
+        while len(sms_outbox) < 2:
+            await asyncio.sleep(0.01)
+    stop.set()
+    await task
+
+    assert sms_outbox == [
+        {"user_id": "u1", "message": "echo:hello"},
+        {"user_id": "u1", "message": "echo:again"},
+    ]
+    async_session.expire_all()
+    statuses = await async_session.execute(
+        select(Utterance.status).where(Utterance.speaker_id == "bot:u1")
+    )
+    assert set(statuses.scalars()) == {UTTERANCE_STATUS_SENT}
+
+
+@pytest.mark.asyncio
+async def test_run_reply_job_abandons_after_max_attempts(
+    async_session: AsyncSession,
+    sms_outbox: list[dict[str, str]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("REPLY_MAX_ATTEMPTS", "1")
+    ingest = await ingest_chat_message(async_session, "u1", "hello")
+    await async_session.commit()
+
+    sessionmaker = chat_service._background_sessionmaker(async_session)
+    for _ in range(2):
+        [job] = await claim_reply_jobs(async_session, 1, lease_seconds=0)
+        await async_session.commit()
+    await chat_service.run_reply_job(job, sessionmaker)
+
+    assert sms_outbox == []
+    async_session.expire_all()
+    utterance = await async_session.get(Utterance, ingest.bot_utterance_id)
+    assert utterance is not None
+    assert utterance.status == UTTERANCE_STATUS_FAILED
+    assert utterance.attempts == 2